@@ -0,0 +1,44 @@
+"""Compare PspTrain.psp_train_func against the original per-PSP implementation
+for trains of 1 to 64 PSPs on a 100k-sample trace.
+"""
+import timeit
+import numpy as np
+from neuroanalysis.fitting import Psp, PspTrain
+
+
+def reference_psp_train_func(n_psp, x, xoffset, yoffset, rise_time, decay_tau, rise_power, **kwds):
+    # original implementation: one full-length Psp.psp_func evaluation per psp
+    for i in range(n_psp):
+        xoffi = kwds['xoffset%d'%i]
+        amp = kwds['amp%d'%i]
+        tauf = kwds.get('decay_tau_factor%d'%i, 1)
+        psp = Psp.psp_func(x, xoffset+xoffi, 0, rise_time, decay_tau*tauf, amp, rise_power)
+        if i == 0:
+            tot = psp
+        else:
+            tot += psp
+    return tot + yoffset
+
+
+x = np.arange(100000) * 2e-5
+print("n_psp   reference (ms)   vectorized (ms)   speedup   max abs diff")
+for n_psp in [1, 2, 4, 8, 12, 16, 32, 64]:
+    params = dict(xoffset=10e-3, yoffset=-65e-3, rise_time=2e-3, decay_tau=15e-3, rise_power=2)
+    for i in range(n_psp):
+        params['xoffset%d'%i] = i * 1.8 / n_psp
+        params['amp%d'%i] = 1e-3 * (1 + i % 3)
+
+    # clear the rise tau cache before each call so both versions pay for the solve
+    def ref():
+        Psp.clear_rise_tau_cache()
+        return reference_psp_train_func(n_psp, x, **params)
+
+    def vec():
+        Psp.clear_rise_tau_cache()
+        return PspTrain.psp_train_func(n_psp, x, **params)
+
+    n = 10
+    t_ref = min(timeit.repeat(ref, number=n, repeat=3)) / n
+    t_vec = min(timeit.repeat(vec, number=n, repeat=3)) / n
+    diff = np.abs(ref() - vec()).max()
+    print("%5d   %14.2f   %15.2f   %7.1fx   %g" % (n_psp, t_ref*1e3, t_vec*1e3, t_ref/t_vec, diff))
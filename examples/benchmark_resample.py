@@ -0,0 +1,56 @@
+"""Compare the resampling methods used by TSeries.resample against the original Bessel
+filter + interpolation implementation, for conversions between common patch-clamp sample
+rates.
+
+For each conversion, the time to resample a batch of 50 two-second traces is reported
+(the reference resamples one trace at a time, as TSeries.resample used to), along with the
+amplitude of a unit tone at 1.2x the new Nyquist frequency that leaks into the output
+(downsampling only; lower is better).
+"""
+import timeit
+import numpy as np
+from neuroanalysis.data.dataset import TSeriesBatch
+from neuroanalysis.filter import resample
+
+
+def reference_resample(data, sample_rate, new_sample_rate):
+    # original implementation: bessel filter + linear interpolation
+    return resample(data, sample_rate, new_sample_rate, method='interp')
+
+
+def alias_leak(sample_rate, new_sample_rate, method):
+    t = np.arange(int(sample_rate)) / sample_rate
+    tone = np.sin(2 * np.pi * 0.6 * new_sample_rate * t)
+    out = resample(tone, sample_rate, new_sample_rate, method=method)
+    edge = len(out) // 10
+    return np.abs(out[edge:-edge]).max()
+
+
+def best_time(fn):
+    return min(timeit.repeat(fn, number=1, repeat=3))
+
+
+rates = [10000., 20000., 50000., 100000.]
+n_traces = 50
+duration = 2.0
+
+print("conversion (Hz)       interp (ms)  polyphase (ms)  average (ms)   leak: interp  polyphase  average")
+for sr in rates:
+    data = np.random.normal(size=(n_traces, int(duration * sr))).cumsum(axis=1)
+    batch = TSeriesBatch(data, sample_rate=sr)
+    for new_sr in rates:
+        if new_sr == sr:
+            continue
+        integer_factor = new_sr < sr and (sr / new_sr) % 1 == 0
+
+        t_ref = best_time(lambda: [reference_resample(d, sr, new_sr) for d in data])
+        t_poly = best_time(lambda: batch.resample(new_sr))
+        t_avg = best_time(lambda: batch.resample(new_sr, method='average')) if integer_factor else None
+
+        if new_sr < sr:
+            leak = "%.3f      %.3f" % (alias_leak(sr, new_sr, 'interp'), alias_leak(sr, new_sr, 'polyphase'))
+            leak += "      %.3f" % alias_leak(sr, new_sr, 'average') if integer_factor else "          -"
+        else:
+            leak = "    -          -          -"
+        print("%6d -> %6d     %11.1f  %14.1f  %12s   %s" % (
+            sr, new_sr, t_ref*1e3, t_poly*1e3, "-" if t_avg is None else "%.1f" % (t_avg*1e3), leak))
@@ -21,9 +21,11 @@ import numpy as np
 import scipy.signal
 from .. import util
 from collections import OrderedDict
-from ..stats import ragged_mean
+from collections.abc import MutableMapping
+from ..stats import ragged_mean, ragged_stack
 from ..baseline import float_mode
 from ..filter import downsample
+from .loaders.loaders import filter_mask
 
 
 class Container(object):
@@ -31,6 +33,9 @@ class Container(object):
     
     This class is the basis for most other classes in the DAL.
     """
+    # subclasses that don't define __slots__ still get a __dict__
+    __slots__ = ['_meta', '_key', '_parent', '_loader', '__weakref__']
+
     def __init__(self, loader=None):
         self._meta = OrderedDict()
         self._key = None
@@ -72,10 +77,22 @@ class Container(object):
 
     @property
     def all_children(self):
-        allch = [self]
+        return list(self.iter_all_children())
+
+    def iter_all_children(self):
+        """Generator yielding this object followed by all of its descendants (depth-first).
+
+        The children of each object are only requested (and possibly loaded) when the
+        generator reaches that object.
+        """
+        yield self
         for ch in self.children:
-            allch.extend(ch.all_children)
-        return allch
+            yield from ch.iter_all_children()
+
+    def find(self, type):
+        """Return a list of this object and all descendants that are instances of *type*.
+        """
+        return [c for c in self.iter_all_children() if isinstance(c, type)]
 
     @property
     def all_meta(self):
@@ -128,6 +145,8 @@ class Dataset(Container):
         Container.__init__(self, loader=loader)
         self._data = data
         self._name = name
+        self._child_index = None  # descendants of each sync recording, filled in as they are walked
+        self._find_cache = {}  # type: list of matching objects
         if meta is not None:
             self._meta.update(OrderedDict(meta))
 
@@ -160,7 +179,37 @@ class Dataset(Container):
         return "<%s %s>" % (self.__class__.__name__, self.name)
 
     def find(self, type):
-        return [c for c in self.all_children if isinstance(c, type)]
+        """Return a list of all objects in this dataset (including the dataset itself) that are
+        instances of *type*, in depth-first order.
+
+        Results are cached per type, so repeated calls cost O(matches).
+        """
+        found = self._find_cache.get(type)
+        if found is None:
+            found = list(self.iter_find(type))
+            self._find_cache[type] = found
+        return found[:]
+
+    def iter_find(self, type):
+        """Generator yielding the same objects as find(*type*).
+
+        Sync recordings are loaded and indexed one at a time as the generator advances, so
+        stopping early avoids loading the rest of the dataset. Sync recordings that were
+        already walked are read from the index rather than walked again.
+        """
+        if isinstance(self, type):
+            yield self
+        contents = self.contents
+        if self._child_index is None:
+            self._child_index = [None] * len(contents)
+        for i, srec in enumerate(contents):
+            children = self._child_index[i]
+            if children is None:
+                children = srec.all_children
+                self._child_index[i] = children
+            for ch in children:
+                if isinstance(ch, type):
+                    yield ch
 
     @property
     def all_traces(self):
@@ -172,31 +221,49 @@ class Dataset(Container):
 
     @property
     def all_sync_recordings(self):
-        return self.find(SyncRecording)
+        # sync recordings are the direct contents; don't load their recordings to find them
+        return [srec for srec in self.contents if isinstance(srec, SyncRecording)]
+
+    def meta_table(self, objs=None, columns=None, **filters):
+        """Return a pandas DataFrame of metadata.
+
+        If *objs* is None, the table has one row per patch clamp recording and is built by
+        the loader's get_patch_clamp_meta() from columnar metadata, without creating Recording
+        objects where the loader supports it. *columns* selects columns (default is
+        loaders.patch_clamp_meta_columns) and keyword arguments filter rows before the
+        remaining columns are read (see loaders.filter_mask)::
+
+            dataset.meta_table(columns=['sweep_id', 'device_id', 'holding_current'], clamp_mode='ic')
+
+        Otherwise, the table has one row of ``all_meta`` per object in *objs*, including only
+        the fields present in every object unless *columns* is given.
+        """
+        import pandas
+        if objs is None:
+            meta = self.loader.get_patch_clamp_meta(self, columns=columns, filters=filters)
+            return pandas.DataFrame(meta, columns=list(meta.keys()))
 
-    def meta_table(self, objs):
         # collect all metadata
-        meta = []
-        for i,o in enumerate(objs):
-            meta.append(o.all_meta)
-            
-        # generate a list of common fields (in the correct order)
-        fields = set(meta[0].keys())
-        for m in meta[1:]:
-            fields &= set(m.keys())
-        order = list(meta[0].keys())
-        for k in order[:]:
-            if k not in fields:
-                order.remove(k)
-        
+        meta = [o.all_meta for o in objs]
+
+        if columns is None:
+            # fields common to all objects, in the order of the first object
+            columns = list(meta[0].keys()) if len(meta) > 0 else []
+            for m in meta[1:]:
+                columns = [k for k in columns if k in m]
+
+        for k, cond in filters.items():
+            values = np.empty(len(meta), dtype=object)
+            values[:] = [m[k] for m in meta]
+            meta = [m for m, keep in zip(meta, filter_mask(values, cond)) if keep]
+
         # transpose
         tr = OrderedDict()
-        for k in order:
+        for k in columns:
             tr[k] = [m[k] for m in meta]
         
         # create a table
-        import pandas
-        return pandas.DataFrame(tr)
+        return pandas.DataFrame(tr, columns=columns)
 
     @property
     def trace_table(self):
@@ -509,6 +576,7 @@ class RecordingView(Recording):
     def __init__(self, rec, start, stop):
         self._parent_rec = rec
         self._view_slice = (start, stop)
+        self._channel_views = {}
         chans = OrderedDict([(k, rec[k]) for k in rec.channels])
         meta = rec.meta.copy()
         Recording.__init__(self, channels=chans, sync_recording=rec.sync_recording, **meta)
@@ -517,7 +585,12 @@ class RecordingView(Recording):
         return getattr(self._parent_rec, attr)
 
     def __getitem__(self, item):
-        return self._parent_rec[item].time_slice(*self._view_slice)
+        # views are lazy; data for the time window is only read when requested
+        view = self._channel_views.get(item)
+        if view is None:
+            view = self._parent_rec[item].time_slice(*self._view_slice)
+            self._channel_views[item] = view
+        return view
 
     @property
     def parent(self):
@@ -794,11 +867,23 @@ class TSeries(Container):
     loader : a class | None
         A class containing functions for loading data. Required methods:
             get_tseries_data(self) - return a numpy array of values
+        Optional methods:
+            get_tseries_data_chunk(self, start, stop) - return a numpy array of values between two sample indices
+        Optional attributes:
+            data_cache - a TSeriesDataCache that holds loaded data (see ``TSeries.data``)
     meta : 
         Any extra keyword arguments are interpreted as custom metadata and added to ``self.meta``.
     """
+    # TSeries are created in very large numbers (every slice is a TSeriesView), so they use
+    # slots, keep standard metadata in attributes, and only allocate a dict for extra metadata.
+    __slots__ = ['_data', '_time_values', '_start_time', '_dt', '_t0', '_sample_rate', '_units',
+                 '_channel_id', '_extra_meta', '_regularly_sampled', '_recording', '_shared_time_values']
+
     def __init__(self, data=None, dt=None, t0=None, sample_rate=None, start_time=None, time_values=None, units=None, channel_id=None, recording=None, loader=None, **meta):
-        Container.__init__(self, loader=loader)
+        # Container.__init__ is not called; its _meta dict is replaced by the _meta property
+        self._key = None
+        self._parent = None
+        self._loader = loader
         
         #if data is not None and data.ndim != 1:
         #    raise ValueError("data must be a 1-dimensional array.")
@@ -817,27 +902,75 @@ class TSeries(Container):
             raise TypeError("Cannot specify both sample_rate and dt.")
             
         self._data = data
-        self._meta = OrderedDict([
-            ('start_time', start_time),
-            ('dt', dt),
-            ('t0', t0),
-            ('sample_rate', sample_rate),
-            ('units', units),
-            ('channel_id', channel_id),
-        ])
-        self._meta.update(meta)
+        self._start_time = start_time
+        self._dt = dt
+        self._t0 = t0
+        self._sample_rate = sample_rate
+        self._units = units
+        self._channel_id = channel_id
+        self._extra_meta = dict(meta) if len(meta) > 0 else None
         self._time_values = time_values
-        self._generated_time_values = None
+        self._shared_time_values = False  # time values belong to another TSeries (see copy)
         self._regularly_sampled = None
         self._recording = recording
-        
+
+    @property
+    def _meta(self):
+        return TSeriesMeta(self)
+
+    def __getstate__(self):
+        # The inherited Container._meta slot is shadowed by the _meta property, so the default
+        # slot state (which would try to set that property on unpickling) can't be used.
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name in ('_meta', '__weakref__') or name in state:
+                    continue
+                try:
+                    state[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     @property
     def data(self):
         """The array of sample values.
+
+        If the loader has a ``data_cache`` (see loaders.TSeriesDataCache), loaded data are
+        held by the cache rather than by this TSeries, and reloaded if they have been evicted.
         """
         if self._data is None:
+            cache = getattr(self.loader, 'data_cache', None)
+            if cache is not None:
+                return cache.get(self, self.loader.get_tseries_data)
             self._data = self.loader.get_tseries_data(self)
         return self._data
+
+    def _loaded_data(self):
+        """Return the data array if it is already in memory (or in the loader's data cache), otherwise None.
+        """
+        if self._data is None:
+            cache = getattr(self._loader, 'data_cache', None)
+            if cache is not None:
+                return cache.peek(self)
+        return self._data
+
+    def _read_window(self, start, stop):
+        """Return data between sample indices *start* and *stop*. If the data have not been
+        loaded, only this range is requested from the loader.
+        """
+        data = self._loaded_data()
+        if data is not None:
+            return data[start:stop]
+        # the window is not part of this TSeries' data, so writes to it would be lost
+        data = self.loader.get_tseries_data_chunk(self, start, stop).view()
+        data.setflags(write=False)
+        return data
         
     @property
     def start_time(self):
@@ -847,7 +980,7 @@ class TSeries(Container):
         If self.t0 is equal to 0, then start_time is the clock time of the
         first sample.
         """
-        return self._meta['start_time']
+        return self._start_time
     
     @property
     def sample_rate(self):
@@ -856,7 +989,7 @@ class TSeries(Container):
         If no sample rate was specified, then this value is calculated from
         self.dt.
         """
-        rate = self._meta['sample_rate']
+        rate = self._sample_rate
         if rate is not None:
             return rate
         else:
@@ -878,15 +1011,15 @@ class TSeries(Container):
         """
         # need to be very careful about how we calculate dt and sample rate
         # to avoid fp errors.
-        dt = self._meta['dt']
+        dt = self._dt
         if dt is not None:
             return dt
         
-        rate = self._meta['sample_rate']
+        rate = self._sample_rate
         if rate is not None:
             return 1.0 / rate
         
-        t = self.time_values
+        t = self._time_values
         if t is not None:
             # assume regular sampling.
             # don't cache this value; we want to remember whether the user 
@@ -901,7 +1034,7 @@ class TSeries(Container):
         
         Setting this property causes the entire array of time values to shift.
         """
-        t0 = self._meta['t0']
+        t0 = self._t0
         if t0 is not None:
             return t0
         if self._time_values is not None:
@@ -914,9 +1047,9 @@ class TSeries(Container):
             return
         if self.has_time_values:
             self._time_values = self._time_values + (t0 - self._time_values[0])
+            self._shared_time_values = False
         else:
-            self._meta['t0'] = t0
-            self._generated_time_values = None
+            self._t0 = t0
 
     @property
     def t_end(self):
@@ -939,11 +1072,11 @@ class TSeries(Container):
             index = np.asarray(index)
 
         if self.has_time_values:
-            return self.time_values[index]
+            return self._time_values[index]
         else:
             # Be careful to minimize fp precision errors -- 
             #   time * dt != time / sample_rate != time * (1 / sample_rate)
-            sample_rate = self._meta.get('sample_rate')
+            sample_rate = self._sample_rate
             if sample_rate is None:
                 return (index * self.dt) + self.t0
             else:
@@ -967,22 +1100,18 @@ class TSeries(Container):
             t = np.asarray(t)
 
         if self.has_time_values:
-            inds1 = np.searchsorted(self.time_values, t)
+            tvals = self._time_values
+            inds1 = np.searchsorted(tvals, t)
             inds0 = inds1 - 1
             # select closest sample
-            dif1 = abs(self.time_values[np.clip(inds1, 0, len(self)-1)] - t)
-            dif0 = abs(self.time_values[inds0] - t)
+            dif1 = abs(tvals[np.clip(inds1, 0, len(self)-1)] - t)
+            dif0 = abs(tvals[inds0] - t)
             inds = np.where(dif0 < dif1, inds0, inds1)
             if np.isscalar(t):
                 inds = int(inds)
             return inds
         else:
-            # Be careful to avoid fp precision errors when converting back to integer index
-            sample_rate = self._meta.get('sample_rate')
-            if sample_rate is None:
-                inds = (t - self.t0) * (1.0 / self.dt)
-            else:
-                inds = (t - self.t0) * sample_rate
+            inds = self._fractional_index(t)
             
             if index_mode is None or index_mode == 'round':
                 inds = np.round(inds)
@@ -998,6 +1127,17 @@ class TSeries(Container):
             else:
                 return inds.astype(int)
 
+    def _fractional_index(self, t):
+        """Return (non-integer) sample indices corresponding to time(s) *t* for regularly sampled 
+        data without time values.
+        """
+        # Be careful to avoid fp precision errors when converting back to integer index
+        sample_rate = self._sample_rate
+        if sample_rate is None:
+            return (t - self.t0) * (1.0 / self.dt)
+        else:
+            return (t - self.t0) * sample_rate
+
     @property
     def time_values(self):
         """An array of sample time values.
@@ -1006,7 +1146,9 @@ class TSeries(Container):
         
         If no sample time values were provided for this TSeries, then the array
         is automatically generated based on other timing metadata (t0, dt,
-        sample_rate).
+        sample_rate). This array is generated each time it is requested and is not
+        stored; methods such as time_at, index_at, value_at, and time_slice compute
+        their results directly from t0 and dt instead.
         
         If no timing information at all was specified for this TSeries, then
         accessing this property raises TypeError.
@@ -1015,12 +1157,13 @@ class TSeries(Container):
             raise TypeError("No sample timing is specified for this trace.")
 
         if self.has_time_values:
+            if self._shared_time_values:
+                # time values were shared by copy(); give this TSeries its own array
+                self._time_values = self._time_values.copy()
+                self._shared_time_values = False
             return self._time_values
         
-        if self._generated_time_values is None:
-            self._generated_time_values = self.time_at(np.arange(len(self.data)))
-        
-        return self._generated_time_values
+        return self.time_at(np.arange(len(self)))
 
     @property
     def regularly_sampled(self):
@@ -1041,7 +1184,7 @@ class TSeries(Container):
             return True
         
         if self._regularly_sampled is None:
-            tvals = self.time_values
+            tvals = self._time_values
             dt = np.diff(tvals)
             avg_dt = dt.mean()
             self._regularly_sampled = bool(np.all(np.abs(dt - avg_dt) < (avg_dt * 0.01)))
@@ -1052,9 +1195,9 @@ class TSeries(Container):
         """Boolean indicating whether any timing information was specified for
         this TSeries.
         """
-        return (self.has_time_values or 
-                self._meta['dt'] is not None or 
-                self._meta['sample_rate'] is not None)
+        return (self._time_values is not None or 
+                self._dt is not None or 
+                self._sample_rate is not None)
 
     @property
     def has_time_values(self):
@@ -1100,24 +1243,56 @@ class TSeries(Container):
             t = np.asarray(t)
 
         if interp == 'linear':
-            return np.interp(t, self.time_values, self.data)
+            if self.has_time_values or not self.has_timing:
+                return np.interp(t, self.time_values, self.data)
+            return self._interp_regular(t)
         elif interp == 'nearest':
             inds = self.index_at(t)
             return self.data[inds]
         else:
             raise ValueError('unknown interpolation mode "%s"' % interp)
 
+    def _interp_regular(self, t):
+        """Linear interpolation at time(s) *t* for regularly sampled data, without generating
+        time values. Like numpy.interp, times outside the data return the first / last value.
+        """
+        data = self.data
+        if np.isscalar(t):
+            x = min(max(float(self._fractional_index(t)), 0), len(data) - 1)
+            # snap times that fall on a sample (up to fp error) so that they return exact values
+            if abs(x - round(x)) < 1e-6:
+                return data[int(round(x))]
+            i0 = int(x)
+            return data[i0] + (data[i0 + 1] - data[i0]) * (x - i0)
+
+        x = np.clip(self._fractional_index(t), 0, len(data) - 1)
+        r = np.round(x)
+        x = np.where(np.abs(x - r) < 1e-6, r, x)
+        i0 = np.floor(x).astype(int)
+        i1 = np.minimum(i0 + 1, len(data) - 1)
+        y = data[i0] + (data[i1] - data[i0]) * (x - i0)
+        return y if np.ndim(y) > 0 else y[()]
+
     @property
     def units(self):
         """Units string for the data in this TSeries.
         """
-        return self._meta['units']
+        return self._units
 
     @property
     def shape(self):
         """The shape of the array stored in this TSeries.
+
+        If the data have not been loaded yet, the shape is requested from the loader
+        (if it supports ``get_tseries_shape``) instead.
         """
-        return self.data.shape
+        data = self._loaded_data()
+        if data is None:
+            get_shape = getattr(self.loader, 'get_tseries_shape', None)
+            if get_shape is not None:
+                return tuple(get_shape(self))
+            data = self.data
+        return data.shape
     
     def __len__(self):
         return self.shape[0]
@@ -1153,7 +1328,7 @@ class TSeries(Container):
             trace.recording   # returns my_recording
             trace.channel_id  # returns 'primary'
         """
-        return self._meta['channel_id']
+        return self._channel_id
     
     @property
     def recording(self):
@@ -1161,11 +1336,16 @@ class TSeries(Container):
         """
         return self._recording
 
-    def copy(self, data=None, time_values=None, **kwds):
+    def copy(self, data=None, time_values=None, share=False, **kwds):
         """Return a copy of this TSeries.
         
         The new TSeries will have the same data, timing information, and metadata
         unless otherwise specified in the arguments.
+
+        By default the copy gets its own, writable data and time value arrays. When a new
+        *data* array is given (as filters and operators do), the time values of this TSeries
+        are not duplicated until ``copy.time_values`` is first accessed, so chains of
+        derived traces share a single time value array.
         
         Parameters
         ----------
@@ -1173,25 +1353,36 @@ class TSeries(Container):
             If specified, sets the data array for the new TSeries.
         time_values : array | None
             If specified, sets the time_values array for the new TSeries.
+        share : bool
+            If True, the copy shares the data and time values of this TSeries through
+            read-only views (no arrays are duplicated). Writing to ``copy.data`` then raises
+            ValueError; in-place operators (``+=``, ``*=``, ...) first give the copy its own
+            data array.
         kwds :
             All extra keyword arguments will overwrite metadata properties.
             These include dt, sample_rate, t0, start_time, units, and
             others.
         """
+        defer_tvals = False
         if data is None:
-            data = self.data.copy()
+            data = _readonly_view(self.data) if share else self.data.copy()
+        else:
+            defer_tvals = not share
         
         if time_values is None:
             tval = self._time_values
-            if tval is not None:
-                tval = tval.copy()
+            if tval is not None and not defer_tvals:
+                tval = _readonly_view(tval) if share else tval.copy()
         else:
             tval = time_values
+            defer_tvals = False
         
         meta = self._meta.copy()
         meta.update(kwds)
         
-        return TSeries(data, time_values=tval, recording=self.recording, **meta)
+        ts = TSeries(data, time_values=tval, recording=self.recording, **meta)
+        ts._shared_time_values = defer_tvals and tval is not None
+        return ts
 
     @property
     def parent(self):
@@ -1203,6 +1394,35 @@ class TSeries(Container):
         else:
             raise TypeError("Invalid TSeries slice: %r" % item)
 
+    def iter_chunks(self, chunk_size):
+        """Generate consecutive TSeries chunks of at most *chunk_size* samples that together
+        cover this TSeries.
+
+        If the data for this TSeries has not been loaded yet, each chunk is read separately
+        using ``loader.get_tseries_data_chunk``, so the complete data array is never held in
+        memory.
+        """
+        chunk_size = int(chunk_size)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1; got %r" % chunk_size)
+        start = 0
+        while True:
+            stop = start + chunk_size
+            data = self._read_window(start, stop)
+            if len(data) == 0:
+                break
+
+            if self.has_time_values:
+                yield self.copy(data=data, time_values=self._time_values[start:start+len(data)])
+            elif self.has_timing:
+                yield self.copy(data=data, t0=self.time_at(start))
+            else:
+                yield self.copy(data=data)
+
+            if len(data) < chunk_size:
+                break
+            start = stop
+
     def downsample(self, n=None, f=None):
         """Return a downsampled copy of this trace.
         
@@ -1237,69 +1457,137 @@ class TSeries(Container):
         tvals = self._time_values
         if tvals is not None:
             tvals = tvals[::n]
-        dt = self._meta['dt']
+        dt = self._dt
         if dt is not None:
             dt = dt * n
-        sr = self._meta['sample_rate']
+        sr = self._sample_rate
         if sr is not None:
             sr = float(sr) / n
         
         return self.copy(data=data, time_values=tvals, dt=dt, sample_rate=sr)
 
-    def resample(self, sample_rate):
+    def resample(self, sample_rate, method='auto'):
         """Return a resampled copy of this trace.
         
         Parameters
         ----------
         sample_rate : float
             The new sample rate of the returned TSeries
+        method : str
+            "auto", "average", "polyphase", or "interp"; see filter.resample.
 
         Notes
         -----
-        Lowpass filter followed by linear interpolation to extract new samples.
-
-        Uses a bessel filter to avoid ringing artifacts, with cutoff=sample_rate
-        and order=2 chosen to yield decent antialiasing and minimal blurring.
-
-        scipy.resample was avoided due to ringing and edge artifacts.
+        By default, rational rate ratios (such as 50kHz -> 20kHz) use polyphase filtering
+        (scipy.signal.resample_poly) and arbitrary ratios use a lowpass Bessel filter
+        followed by linear interpolation. Use method="average" for faster integer-factor
+        downsampling by averaging groups of samples (as in downsample).
+
+        The Bessel filter (cutoff=sample_rate, order=2) gives decent antialiasing with
+        no ringing or edge artifacts; scipy.resample was avoided due to ringing and edge
+        artifacts.
         """
         if self.sample_rate == sample_rate:
             return self
         if not self.regularly_sampled:
             raise TypeError("resample requires regularly-sampled data.")
-        
-        ns = int(np.round(len(self) * sample_rate / self.sample_rate))
 
-        # scipy.resample causes ringing and edge artifacts (freq-domain windowing
-        # did not seem to help)
-        # data = scipy.signal.resample(self.data, ns)
+        from ..filter import resample
+        data = resample(self.data, self.sample_rate, sample_rate, method=method)
 
-        # bessel filter gives reasonably good antialiasing with no ringing or edge
-        # artifacts
-        from ..filter import bessel_filter
-        filt = bessel_filter(self, cutoff=sample_rate, order=2)
-        t1 = self.time_values
-        t2 = np.arange(t1[0], t1[-1], 1.0/sample_rate)
-
-        data = np.interp(t2, t1, filt.data)
-        
-        if self._meta['sample_rate'] is not None:
+        if self._sample_rate is not None:
             return self.copy(data=data, sample_rate=sample_rate)
-        elif self._meta['dt'] is not None:
-            dt = self.dt * self.sample_rate / sample_rate
-            return self.copy(data=data, dt=dt)
+        elif self._dt is not None:
+            return self.copy(data=data, dt=1.0 / sample_rate)
+        else:
+            tvals = self.t0 + np.arange(len(data)) / sample_rate
+            return self.copy(data=data, time_values=tvals)
+
+    def _writable_data(self):
+        """Return this TSeries' data array for modification in place.
+
+        If the data are shared read-only (see copy) or held by the loader's data cache, 
+        this TSeries is first given its own copy.
+        """
+        if self._data is None:
+            self.data  # TSeries without a data cache keep their data once loaded
+        data = self._data
+        if data is None or not data.flags.writeable:
+            data = np.array(self.data)
+            self._data = data
+        return data
+
+    def _arith(self, op, x, out):
+        if isinstance(x, TSeries):
+            x = x.data
+        if out is None:
+            return self.copy(data=op(self.data, x))
+        if isinstance(out, TSeries):
+            op(self.data, x, out=out._writable_data())
+            return out
+        op(self.data, x, out=out)
+        return self.copy(data=out)
+
+    def _iarith(self, op, x):
+        if isinstance(x, TSeries):
+            x = x.data
+        data = self._writable_data()
+        if np.result_type(data, x) == data.dtype:
+            op(data, x, out=data)
+        else:
+            # result does not fit in the current dtype (e.g. int += float)
+            self._data = op(data, x)
+        return self
+
+    def add(self, x, out=None):
+        """Return a TSeries with *x* added to the data of this TSeries.
+
+        *x* may be a scalar, array, or TSeries. If *out* is given, the result is written to
+        it instead of a new array: *out* may be an array (wrapped in the returned TSeries)
+        or a TSeries (which is returned). ``ts.add(x, out=ts)`` is equivalent to ``ts += x``.
+        """
+        return self._arith(np.add, x, out)
+
+    def subtract(self, x, out=None):
+        """Return a TSeries with *x* subtracted from the data of this TSeries. See add().
+        """
+        return self._arith(np.subtract, x, out)
+
+    def multiply(self, x, out=None):
+        """Return a TSeries with the data of this TSeries multiplied by *x*. See add().
+        """
+        return self._arith(np.multiply, x, out)
+
+    def divide(self, x, out=None):
+        """Return a TSeries with the data of this TSeries divided by *x*. See add().
+        """
+        return self._arith(np.true_divide, x, out)
 
     def __mul__(self, x):
-        return self.copy(data=self.data * x)
+        return self.multiply(x)
 
     def __truediv__(self, x):
-        return self.copy(data=self.data / x)
+        return self.divide(x)
 
     def __add__(self, x):
-        return self.copy(data=self.data + x)
+        return self.add(x)
 
     def __sub__(self, x):
-        return self.copy(data=self.data - x)
+        return self.subtract(x)
+
+    # In-place operators modify the data array of this TSeries (and therefore any views
+    # that share it), except that shared read-only data are copied first.
+    def __imul__(self, x):
+        return self._iarith(np.multiply, x)
+
+    def __itruediv__(self, x):
+        return self._iarith(np.true_divide, x)
+
+    def __iadd__(self, x):
+        return self._iarith(np.add, x)
+
+    def __isub__(self, x):
+        return self._iarith(np.subtract, x)
 
     def mean(self):
         """Return the mean value of the data in this TSeries.
@@ -1337,15 +1625,14 @@ class TSeries(Container):
         else:
             t0 = self.t0 + (0.5*self.dt)
             dvdt = diff / self.dt
-            return TSeries(data=dvdt, t0=t0, dt=self.meta['dt'], sample_rate=self.meta['sample_rate'])
+            return TSeries(data=dvdt, t0=t0, dt=self._dt, sample_rate=self._sample_rate)
     
     def __repr__(self):
         if self.has_timing:
             if self.has_time_values:
                 timing = "[has time values]"
             else:
-                sample_rate = self._meta.get('sample_rate')
-                if sample_rate is None:
+                if self._sample_rate is None:
                     timing = "t0=%g dt=%g" % (self.t0, self.dt)
                 else:
                     timing = "t0=%g sample_rate=%g" % (self.t0, self.sample_rate)
@@ -1366,19 +1653,118 @@ class TSeries(Container):
 Trace = TSeries
 
 
+def _readonly_view(arr):
+    """Return a read-only view of *arr* (no data are copied).
+    """
+    view = arr.view()
+    view.flags.writeable = False
+    return view
+
+
+class TSeriesMeta(MutableMapping):
+    """Dict-like view of the metadata of a TSeries (``TSeries.meta``).
+
+    The standard fields are stored as attributes of the TSeries; any other keys are stored
+    in a dict that is only created when the first extra key is set.
+    """
+    __slots__ = ['_tseries']
+    fields = ('start_time', 'dt', 't0', 'sample_rate', 'units', 'channel_id')
+
+    def __init__(self, tseries):
+        self._tseries = tseries
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self._tseries, '_' + key)
+        extra = self._tseries._extra_meta
+        if extra is None:
+            raise KeyError(key)
+        return extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self.fields:
+            setattr(self._tseries, '_' + key, value)
+            return
+        if self._tseries._extra_meta is None:
+            self._tseries._extra_meta = {}
+        self._tseries._extra_meta[key] = value
+
+    def __delitem__(self, key):
+        if key in self.fields:
+            setattr(self._tseries, '_' + key, None)
+            return
+        extra = self._tseries._extra_meta
+        if extra is None:
+            raise KeyError(key)
+        del extra[key]
+
+    def __iter__(self):
+        yield from self.fields
+        if self._tseries._extra_meta is not None:
+            yield from self._tseries._extra_meta
+
+    def __len__(self):
+        extra = self._tseries._extra_meta
+        return len(self.fields) + (0 if extra is None else len(extra))
+
+    def copy(self):
+        return OrderedDict(self)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
 class TSeriesView(TSeries):
+    """A slice of another TSeries.
+
+    If the data of the sliced TSeries have been loaded, the view's data are a slice of
+    that array and writes to them change the sliced TSeries. Otherwise the view stays lazy:
+    its data are read (only the sliced samples) from the original loader when first
+    accessed, and are read-only. In-place operators (``view += x``, ...) give the view its
+    own copy of the data in either case.
+    """
+    __slots__ = ['_parent_trace', '_view_slice', '_view_indices']
+
     def __init__(self, trace, sl):
         self._parent_trace = trace
         self._view_slice = sl
         inds = sl.indices(len(trace))
         self._view_indices = inds
-        data = trace.data[sl]
-        meta = trace.meta.copy()
+        data = trace._loaded_data()
+        if data is not None:
+            data = data[sl]
+        time_values = None
+        t0 = trace._t0
         if trace.has_time_values:
-            meta['time_values'] = trace.time_values[sl].copy()
+            time_values = trace._time_values[sl]
         elif trace.has_timing:
-            meta['t0'] = trace.time_at(inds[0])
-        TSeries.__init__(self, data, recording=trace.recording, **meta)
+            t0 = trace.time_at(inds[0])
+        extra = trace._extra_meta or {}
+        TSeries.__init__(self, data, dt=trace._dt, t0=t0, sample_rate=trace._sample_rate, start_time=trace._start_time,
+                         time_values=time_values, units=trace._units, channel_id=trace._channel_id,
+                         recording=trace.recording, **extra)
+        self._shared_time_values = trace._shared_time_values
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._read_window(0, len(self))
+        return self._data
+
+    @property
+    def shape(self):
+        if self._data is not None:
+            return self._data.shape
+        return (len(range(*self._view_indices)),) + self._parent_trace.shape[1:]
+
+    def _read_window(self, start, stop):
+        if self._data is not None:
+            return self._data[start:stop]
+        i0, i1, step = self._view_indices
+        if step != 1:
+            return self._parent_trace.data[self._view_slice][start:stop]
+        n = len(self)
+        return self._parent_trace._read_window(i0 + min(start, n), i0 + min(stop, n))
 
     @property
     def parent(self):
@@ -1408,7 +1794,7 @@ class TSeriesView(TSeries):
         v = self
         start = 0
         while True:
-            start += self._view_slice.start
+            start += v._view_indices[0]
             v = v._parent_trace
             if not isinstance(v, TSeriesView):
                 break
@@ -1442,31 +1828,198 @@ class TSeriesList(object):
         Downsamples to the minimum rate and clips ragged edges. All traces are aligned
         based on their _time values_ before being clipped and averaged. 
         """
-        # Downsample all traces to the minimum sample rate
-        min_sr = min([trace.sample_rate for trace in self.traces])
-        downsampled = [trace.resample(min_sr) for trace in self.traces]
-        
-        # left-clip all traces to start at the same time
-        start_t = max([trace.t0 for trace in downsampled])
-        start_inds = [(trace, trace.index_at(start_t)) for trace in downsampled]
-        
-        # right-clip all traces to the same length
-        clip_len = min([len(trace) - start_ind for trace, start_ind in start_inds])
-        
-        # stack together all cropped arrays
-        clipped_data = [trace.data[start_ind:start_ind+clip_len] for trace, start_ind in start_inds]
-        
-        # average all traces together
-        avg = np.nanmean(np.vstack(clipped_data), axis=0)
-        
-        # return a trace with the average data and all other properties taken from the
-        # first downsampled trace
-        ds = downsampled[0].copy(data=avg, t0=start_t, sample_rate=min_sr, dt=None)
-        
-        # Add metadata
-        ds.meta['mean_of_n'] = len(clipped_data)
-        
-        return ds
+        avg = self.to_batch(align='clip').mean()
+
+        # return a trace with the average data and timing, and all other properties taken 
+        # from the first trace (whose time values, if any, do not match the clipped average)
+        first = self.traces[0]
+        meta = first._meta.copy()
+        meta.update(t0=avg.t0, sample_rate=avg.sample_rate, dt=None, mean_of_n=avg.meta['mean_of_n'])
+        return TSeries(avg.data, recording=first.recording, **meta)
+
+    def to_batch(self, align='pad', sample_rate=None):
+        """Return a TSeriesBatch holding the traces in this list in a single 2D array.
+
+        See TSeriesBatch.from_traces.
+        """
+        return TSeriesBatch.from_traces(self.traces, align=align, sample_rate=sample_rate)
+
+
+class TSeriesBatch(object):
+    """A batch of 1D traces with shared, regular timing, stored as a single (traces, samples) array.
+
+    Samples where a trace has no data (see *align* in from_traces) are NaN, and all
+    statistics ignore NaN values. Filter functions that accept a TSeries (such as
+    filter.bessel_filter) also accept a TSeriesBatch and filter all traces in a single
+    call; note that IIR filters will spread NaN padding across a trace.
+
+    Parameters
+    ----------
+    data : array
+        Array of shape (n_traces, n_samples).
+    dt : float | None
+        Time step between samples (see TSeries.dt).
+    t0 : float
+        Time of the first sample.
+    sample_rate : float | None
+        Sampling rate; inverse of *dt*.
+    units : str | None
+        Units of the data.
+    """
+    def __init__(self, data, dt=None, t0=0, sample_rate=None, units=None):
+        data = np.asarray(data)
+        if data.ndim != 2:
+            raise ValueError("data must be a 2-dimensional array (traces, samples).")
+        if (dt is None) == (sample_rate is None):
+            raise TypeError("Must specify exactly one of dt or sample_rate.")
+        self.data = data
+        self.t0 = t0
+        self.units = units
+        self._dt = dt
+        self._sample_rate = sample_rate
+
+    @classmethod
+    def from_traces(cls, traces, align='pad', sample_rate=None):
+        """Create a batch from a list of regularly sampled 1D TSeries.
+
+        Traces are resampled to *sample_rate* (default is the lowest sample rate of all
+        traces) if needed, then aligned by their time values.
+
+        Parameters
+        ----------
+        traces : list of TSeries
+            The traces to include in the batch.
+        align : "pad" | "clip"
+            If "pad", the batch covers the time range of all traces and samples outside
+            each trace are NaN. If "clip", the batch covers only the time range where all
+            traces have data.
+        sample_rate : float | None
+            Sample rate of the batch.
+        """
+        if len(traces) == 0:
+            raise ValueError("Cannot create a TSeriesBatch with no traces.")
+        for trace in traces:
+            if not trace.regularly_sampled:
+                raise TypeError("TSeriesBatch requires regularly-sampled traces.")
+        if sample_rate is None:
+            sample_rate = min([trace.sample_rate for trace in traces])
+        traces = [trace.resample(sample_rate) for trace in traces]
+
+        if align == 'pad':
+            t0 = min([trace.t0 for trace in traces])
+        elif align == 'clip':
+            t0 = max([trace.t0 for trace in traces])
+        else:
+            raise ValueError("align must be 'pad' or 'clip'")
+
+        # position of each trace's first sample relative to t0
+        offsets = [-trace.index_at(t0) for trace in traces]
+        data = ragged_stack([trace.data for trace in traces], method=align, offsets=offsets)
+        return cls(data, t0=t0, sample_rate=sample_rate, units=traces[0].units)
+
+    @property
+    def dt(self):
+        if self._dt is not None:
+            return self._dt
+        return 1.0 / self._sample_rate
+
+    @property
+    def sample_rate(self):
+        if self._sample_rate is not None:
+            return self._sample_rate
+        return 1.0 / self._dt
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def n_samples(self):
+        return self.data.shape[1]
+
+    @property
+    def time_values(self):
+        return self._trace(self.data[0]).time_values
+
+    def __getitem__(self, item):
+        """Return a TSeries for a single trace, or a TSeriesBatch for a slice or index array.
+        """
+        if np.isscalar(item):
+            return self._trace(self.data[item])
+        return self.copy(data=self.data[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self):
+        """Return a TSeriesList containing one TSeries per trace in this batch.
+        """
+        return TSeriesList(list(self))
+
+    def copy(self, data=None, **kwds):
+        """Return a batch with the same timing as this one and *data* (default is to share this batch's data).
+        """
+        opts = dict(dt=self._dt, t0=self.t0, sample_rate=self._sample_rate, units=self.units)
+        opts.update(kwds)
+        return TSeriesBatch(self.data if data is None else data, **opts)
+
+    def resample(self, sample_rate, method='auto'):
+        """Return a copy of this batch with all traces resampled to *sample_rate* (see TSeries.resample).
+        """
+        if self.sample_rate == sample_rate:
+            return self
+        from ..filter import resample
+        data = resample(self.data, self.sample_rate, sample_rate, method=method)
+        if self._sample_rate is not None:
+            return self.copy(data=data, sample_rate=sample_rate)
+        return self.copy(data=data, dt=1.0 / sample_rate)
+
+    def apply(self, fn, *args, **kwds):
+        """Return a batch with ``fn(self.data, *args, **kwds)`` as its data.
+
+        *fn* must operate along the last axis of a 2D array and return an array of the same shape.
+        """
+        return self.copy(data=fn(self.data, *args, **kwds))
+
+    def _trace(self, data, **meta):
+        return TSeries(data, t0=self.t0, dt=self._dt, sample_rate=self._sample_rate, units=self.units, **meta)
+
+    def mean(self):
+        """Return a TSeries with the NaN-ignoring mean of all traces at each sample.
+        """
+        return self._trace(np.nanmean(self.data, axis=0), mean_of_n=len(self))
+
+    def median(self):
+        """Return a TSeries with the NaN-ignoring median of all traces at each sample.
+        """
+        return self._trace(np.nanmedian(self.data, axis=0))
+
+    def std(self, ddof=0):
+        """Return a TSeries with the NaN-ignoring standard deviation of all traces at each sample.
+        """
+        return self._trace(np.nanstd(self.data, axis=0, ddof=ddof))
+
+    def percentile(self, q):
+        """Return a TSeries with the NaN-ignoring *q*-th percentile of all traces at each sample,
+        or a TSeriesList with one TSeries per percentile if *q* is a sequence.
+        """
+        result = np.nanpercentile(self.data, q, axis=0)
+        if np.ndim(q) == 0:
+            return self._trace(result)
+        return TSeriesList([self._trace(r) for r in result])
+
+    def count(self):
+        """Return an array giving the number of traces that have (non-NaN) data at each sample.
+        """
+        return np.sum(~np.isnan(self.data), axis=0)
+
+    def __repr__(self):
+        return "<%s n_traces=%d n_samples=%d t0=%g sample_rate=%g>" % (
+            self.__class__.__name__, len(self), self.n_samples, self.t0, self.sample_rate)
 
 
 class DAQRecording(Recording):
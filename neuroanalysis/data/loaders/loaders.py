@@ -1,7 +1,19 @@
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+
+# default columns returned by DatasetLoader.get_patch_clamp_meta
+patch_clamp_meta_columns = ['sweep_id', 'device_id', 'sweep_name', 'start_time', 'device_type', 'clamp_mode',
+                            'holding_potential', 'holding_current', 'bridge_balance', 'lpf_cutoff', 'pipette_offset']
 
 
 class DatasetLoader():
     """An abstract base class for Dataset loaders."""
+
+    # optional TSeriesDataCache used by TSeries.data; if None, each TSeries keeps
+    # its data in memory once loaded
+    data_cache = None
     
     def get_dataset_name(self):
         """Return a string with the name of this dataset."""
@@ -19,6 +31,24 @@ class DatasetLoader():
         """Return a numpy array of the data in the tseries."""
         raise NotImplementedError("Must be implemented in subclass.")
 
+    def get_tseries_data_chunk(self, tseries, start, stop):
+        """Return a numpy array of the data in the tseries from sample index *start* up to
+        (but not including) *stop*. The returned array is shorter than requested if
+        *stop* is past the end of the data.
+
+        The default implementation loads the entire array (keeping it in the tseries); loaders 
+        that can read partial data from disk should override this method.
+        """
+        return tseries.data[start:stop]
+
+    def get_tseries_shape(self, tseries):
+        """Return the shape of the data in the tseries.
+
+        The default implementation loads the data; loaders that can determine the shape
+        without reading data should override this method.
+        """
+        return tseries.data.shape
+
     def load_stimulus(self, recording):
         """Return an instance of stimuli.Stimulus"""
         raise NotImplementedError("Must be implemented in subclass.")
@@ -38,4 +68,195 @@ class DatasetLoader():
     def get_baseline_regions(self, recording):
         raise NotImplementedError("Must be implemented in subclass.")
 
+    def get_patch_clamp_meta(self, dataset, columns=None, filters=None):
+        """Return metadata for all patch clamp recordings in *dataset* in columnar form.
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The dataset to describe.
+        columns : list | None
+            Names of the columns to return (default is ``patch_clamp_meta_columns``).
+        filters : dict | None
+            ``{column: condition}``; only rows matching all conditions are returned
+            (see filter_mask).
+
+        Returns
+        -------
+        meta : OrderedDict
+            ``{column: array}`` with one element per recording.
+
+        The default implementation builds every Recording in the dataset; loaders that
+        can read this metadata directly from their source should override this method.
+        """
+        from ..dataset import PatchClampRecording
+        recs = dataset.find(PatchClampRecording)
+
+        def get_column(col, recs):
+            if col == 'sweep_id':
+                vals = [rec.sync_recording.key for rec in recs]
+            else:
+                vals = [rec.meta.get(col) for rec in recs]
+            arr = np.empty(len(vals), dtype=object)
+            arr[:] = vals
+            return arr
+
+        for col, cond in (filters or {}).items():
+            mask = filter_mask(get_column(col, recs), cond)
+            recs = [rec for rec, keep in zip(recs, mask) if keep]
+        columns = patch_clamp_meta_columns if columns is None else columns
+        return OrderedDict([(col, get_column(col, recs)) for col in columns])
+
+
+def filter_mask(values, condition):
+    """Return a boolean mask selecting elements of the array *values* that match *condition*.
+
+    *condition* may be a callable (called with the array; must return a mask), a list, tuple,
+    or set of accepted values, or a single value to compare for equality.
+    """
+    if callable(condition):
+        return np.asarray(condition(values), dtype=bool)
+    if isinstance(condition, (list, tuple, set)):
+        return np.array([v in condition for v in values], dtype=bool)
+    mask = values == condition
+    if np.ndim(mask) == 0:
+        # numpy returns a scalar when the comparison is not supported elementwise
+        mask = np.full(len(values), bool(mask))
+    return np.asarray(mask, dtype=bool)
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'count', 'nbytes', 'max_bytes', 'pinned'])
+
+
+class TSeriesDataCache(object):
+    """Bounded LRU cache of data arrays loaded for TSeries.
+
+    When a loader has a ``data_cache``, TSeries loaded through it do not keep their data
+    in memory; instead TSeries.data is looked up in the cache and reloaded from the loader
+    if it has been evicted. The least recently used arrays are evicted whenever the total
+    size of cached arrays exceeds *max_bytes*.
+
+    Pinned TSeries are never evicted (they may push the cache over its budget) until they
+    are unpinned.
+
+    Cached arrays are read-only, because changes written to them would be lost when they
+    are evicted. In-place TSeries operators (``ts += x``, ...) first move the data out of
+    the cache into an array owned by the TSeries; otherwise use ``ts.data.copy()``.
+
+    Example::
+
+        loader = MiesNwbLoader(file_path, data_cache=TSeriesDataCache(max_bytes=500e6))
+        dataset = Dataset(loader=loader)
+        for ts in dataset.all_traces:
+            analyze(ts.data)      # memory use stays below ~500 MB
+        print(loader.data_cache.info())
+
+        with loader.data_cache.pinned(ts1, ts2):
+            ...                   # ts1 and ts2 are kept in memory here
+    """
+    def __init__(self, max_bytes=1e9):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # tseries: data, least recently used first
+        self._pins = {}  # tseries: pin count
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, tseries, load):
+        """Return cached data for *tseries*, or call ``load(tseries)`` and cache the result.
+        """
+        with self._lock:
+            data = self._entries.get(tseries)
+            if data is not None:
+                self._entries.move_to_end(tseries)
+                self._hits += 1
+                return data
+            self._misses += 1
+
+        data = load(tseries).view()
+        data.setflags(write=False)
+
+        with self._lock:
+            if tseries not in self._entries:
+                self._entries[tseries] = data
+                self._nbytes += data.nbytes
+                self._evict()
+            return data
+
+    def peek(self, tseries):
+        """Return cached data for *tseries* if present, otherwise None. 
+
+        This does not load data or affect the LRU order or counters.
+        """
+        return self._entries.get(tseries)
+
+    def pin(self, tseries):
+        """Prevent data for *tseries* from being evicted until unpin() is called (pins are counted).
+        """
+        with self._lock:
+            self._pins[tseries] = self._pins.get(tseries, 0) + 1
+
+    def unpin(self, tseries):
+        with self._lock:
+            n = self._pins[tseries] - 1
+            if n == 0:
+                del self._pins[tseries]
+                self._evict()
+            else:
+                self._pins[tseries] = n
+
+    def pinned(self, *tseries):
+        """Context manager that pins *tseries* for the duration of a ``with`` block.
+        """
+        return _PinContext(self, tseries)
+
+    def discard(self, tseries):
+        """Remove data for *tseries* from the cache, if present.
+        """
+        with self._lock:
+            data = self._entries.pop(tseries, None)
+            if data is not None:
+                self._nbytes -= data.nbytes
+
+    def clear(self):
+        """Remove all unpinned data from the cache.
+        """
+        with self._lock:
+            for ts in list(self._entries):
+                if ts not in self._pins:
+                    self.discard(ts)
+
+    def info(self):
+        """Return a CacheInfo with hit / miss / eviction counts and current usage.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, len(self._entries),
+                             self._nbytes, self.max_bytes, len(self._pins))
+
+    def _evict(self):
+        if self._nbytes <= self.max_bytes:
+            return
+        for ts in list(self._entries):
+            if self._nbytes <= self.max_bytes:
+                break
+            if ts in self._pins:
+                continue
+            self.discard(ts)
+            self._evictions += 1
+
+
+class _PinContext(object):
+    def __init__(self, cache, tseries):
+        self.cache = cache
+        self.tseries = tseries
+
+    def __enter__(self):
+        for ts in self.tseries:
+            self.cache.pin(ts)
+        return self.cache
 
+    def __exit__(self, *args):
+        for ts in self.tseries:
+            self.cache.unpin(ts)
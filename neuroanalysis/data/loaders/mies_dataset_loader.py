@@ -1,3 +1,4 @@
+import weakref
 import h5py
 import numpy as np
 from collections import OrderedDict
@@ -6,22 +7,33 @@ import neuroanalysis.util.mies_nwb_parsing as parser
 #import aisynphys.pipeline.opto.data_model as dm
 import neuroanalysis.stimuli as stimuli
 from neuroanalysis.test_pulse import PatchClampTestPulse
-from neuroanalysis.data.loaders.loaders import DatasetLoader
+from neuroanalysis.data.loaders.loaders import DatasetLoader, filter_mask, patch_clamp_meta_columns
 
 
 class MiesNwbLoader(DatasetLoader):
     _baseline_analyzer_class = None ## make room for subclasses to automatically supply baseline analyzers
+    _notebook_cache = None ## passed to parse_lab_notebook(cache=...); True for a sidecar file, or a cache directory
+    use_memmap = True ## read contiguous, uncompressed datasets through a memory map rather than h5py
 
-    def __init__(self, file_path, baseline_analyzer_class=None):
+    def __init__(self, file_path, baseline_analyzer_class=None, notebook_cache=None, data_cache=None):
         self._file_path = file_path
         if baseline_analyzer_class is not None:
             self._baseline_analyzer_class = baseline_analyzer_class
+        if notebook_cache is not None:
+            self._notebook_cache = notebook_cache
+        if data_cache is not None:
+            self.data_cache = data_cache ## TSeriesDataCache shared by all TSeries loaded from this file
 
         self._time_series = None ## parse nwb into sweep_number: info dictionary for lookup of individual sweeps
         self._notebook = None ## parse the lab_notebook part of the nwb 
+        self._group_index = None ## sweep_number: names of the hdf groups holding data for each sweep
         self._hdf = None ## holder for the .hdf file
         self._rig = None ## holder for the name of the rig this nwb was recorded on
         self._device_config = None 
+        self._valid_lengths = {} ## number of non-NaN samples in each hdf dataset, used for partial reads
+        self._file_map = None ## read-only memory map of the whole file, for contiguous datasets
+        self._dataset_maps = {} ## hdf dataset name: memory-mapped samples (or None if the dataset can't be mapped)
+        self._tseries_sources = weakref.WeakKeyDictionary() ## tseries: (dataset, scale, offset)
 
     @property
     def hdf(self):
@@ -29,6 +41,16 @@ class MiesNwbLoader(DatasetLoader):
             self._hdf = h5py.File(self._file_path, 'r')
         return self._hdf
 
+    def close(self):
+        """Close the hdf5 file and release any memory maps (they are reopened if needed).
+        """
+        if self._hdf is not None:
+            self._hdf.close()
+            self._hdf = None
+        self._file_map = None
+        self._dataset_maps = {}
+        self._tseries_sources = weakref.WeakKeyDictionary()
+
     @property
     def time_series(self):
         if self._time_series is None:
@@ -41,18 +63,55 @@ class MiesNwbLoader(DatasetLoader):
                 self._time_series.setdefault(sweep, {})[ad_chan] = src
         return self._time_series
 
+    @property
+    def group_index(self):
+        """Index of the hdf groups that hold data for each sweep, built once on first access.
+
+        The format is ``{sweep_number: {'AD': {chan: name}, 'DA': {chan: name}, 'TTL': {ttl: name}, 'electrodes': {name: electrode_name}}}``,
+        where names are group names inside acquisition/timeseries (AD) or stimulus/presentation
+        (DA, TTL), *ttl* is a string like 'TTL1_0', and 'electrodes' holds the electrode_name
+        of each AD/DA group that has one.
+        """
+        if self._group_index is None:
+            index = {}
+            for kind, path in [('AD', 'acquisition/timeseries'), ('DA', 'stimulus/presentation')]:
+                parent = self.hdf[path]
+                for name in parent.keys():
+                    parts = name.split('_', 2)
+                    if len(parts) != 3 or parts[0] != 'data':
+                        continue
+                    sweep = index.setdefault(int(parts[1]), {'AD': {}, 'DA': {}, 'TTL': {}, 'electrodes': {}})
+                    chan = parts[2]
+                    if chan.startswith('TTL'):
+                        sweep['TTL'][chan] = name
+                        continue
+                    if not chan.startswith(kind):
+                        continue
+                    sweep[kind][int(chan[len(kind):])] = name
+                    group = parent[name]
+                    if 'electrode_name' in group:
+                        elec = group['electrode_name'][()][0]
+                        if isinstance(elec, bytes):
+                            elec = elec.decode()
+                        sweep['electrodes'][name] = elec
+            self._group_index = index
+        return self._group_index
+
     @property
     def notebook(self):
         """Return compiled data from the lab notebook.
 
-        The format is a dict like ``{sweep_number: [ch1, ch2, ...]}`` that contains one key:value
-        pair per sweep. Each value is a list containing one metadata dict for each channel in the
+        The format is a mapping like ``{sweep_number: [ch1, ch2, ...]}`` that contains one key:value
+        pair per sweep. Each value is a list containing one metadata mapping for each channel in the
         sweep. For example::
 
-            nwb.notebook()[sweep_id][channel_id][metadata_key]
+            nwb.notebook[sweep_id][channel_id][metadata_key]
+
+        Values are stored in a single array (see mies_nwb_parsing.LabNotebook); the per-channel
+        mappings are lightweight views into it.
         """
         if self._notebook is None:
-            self._notebook = parser.parse_lab_notebook(self.hdf)
+            self._notebook = parser.read_lab_notebook(self.hdf, cache=self._notebook_cache)
         return self._notebook
 
     def get_dataset_name(self):
@@ -81,14 +140,16 @@ class MiesNwbLoader(DatasetLoader):
             'TTL1_2': 'LED-590nm'
         }
 
+        groups = self.group_index.get(sweep_id, {'AD': {}, 'TTL': {}, 'electrodes': {}})
         for ch, meta in self.time_series[sweep_id].items():
-            if 'data_%05d_AD%d' %(sweep_id, ch) in self.hdf['acquisition/timeseries'].keys():
-                hdf_group = self.hdf['acquisition/timeseries/data_%05d_AD%d' %(sweep_id, ch)]
+            if ch in groups['AD']:
+                group_name = groups['AD'][ch]
+                hdf_group = self.hdf['acquisition/timeseries/' + group_name]
 
                 ### this channel is a patch-clamp headstage
-                if 'electrode_name' in hdf_group: 
+                if group_name in groups['electrodes']:
                     #rec = OptoMiesRecording(self, sweep_id, ch)
-                    device_id = int(hdf_group['electrode_name'][()][0].split('_')[1])
+                    device_id = int(groups['electrodes'][group_name].split('_')[1])
 
                     nb = self.notebook[sweep_id][device_id]
                     meta = {}
@@ -156,30 +217,28 @@ class MiesNwbLoader(DatasetLoader):
 
                     recordings[rec.device_id] = rec
 
-            ## now get associated ttl traces:
-            for k in self.hdf['stimulus/presentation'].keys():
-                if k.startswith('data_%05d_TTL' % sweep_id):
-                    ttl_data = self.hdf['stimulus/presentation/' + k]['data']
-                    dt = ttl_data.attrs['IGORWaveScaling'][1,0] / 1000.
+        ## now get associated ttl traces:
+        for ttl, k in groups['TTL'].items():
+            ttl_data = self.hdf['stimulus/presentation/' + k]['data']
+            dt = ttl_data.attrs['IGORWaveScaling'][1,0] / 1000.
 
-                    #ttl_num = k.split('_')[-1]
-                    #device = self.device_config['TTL1_%s'%ttl_num]
-                    ttl = k.split('_', 2)[-1]
-                    device = device_map[ttl]
+            #ttl_num = k.split('_')[-1]
+            #device = self.device_config['TTL1_%s'%ttl_num]
+            device = device_map[ttl]
 
-                    meta={}
-                    meta['sweep_name'] = k
+            meta={}
+            meta['sweep_name'] = k
 
-                    rec = Recording(
-                        channels={'reporter':TSeries(channel_id='reporter', dt=dt, loader=self)},
-                        device_type = device,
-                        device_id=device,
-                        sync_recording=sync_rec,
-                        loader=self,
-                        **meta)
-                    rec['reporter']._recording = rec
+            rec = Recording(
+                channels={'reporter':TSeries(channel_id='reporter', dt=dt, loader=self)},
+                device_type = device,
+                device_id=device,
+                sync_recording=sync_rec,
+                loader=self,
+                **meta)
+            rec['reporter']._recording = rec
 
-                    recordings[rec.device_id]=rec
+            recordings[rec.device_id]=rec
 
 
                             #     rec.device_name = device_mapping['Wayne']['AD%d'%ch]
@@ -195,15 +254,252 @@ class MiesNwbLoader(DatasetLoader):
 
         return recordings
 
+    def get_patch_clamp_meta(self, dataset, columns=None, filters=None):
+        """Return patch clamp recording metadata as ``{column: array}`` (see DatasetLoader.get_patch_clamp_meta).
+
+        Values are read directly from the group index and lab notebook arrays without creating
+        any Recording objects. Filter columns are evaluated first so that the remaining columns
+        are only computed for matching rows. Numerical values that were not recorded are NaN.
+        """
+        ## one row per headstage AD group, in sweep / headstage order
+        nb = self.notebook
+        if 'ADC' in nb.key_index:
+            ## the notebook records the AD channel of each active headstage; this avoids
+            ## opening every hdf group to read its electrode name
+            existing = set(self.hdf['acquisition/timeseries'].keys())
+            nb_rows, device_ids = np.nonzero(~np.isnan(nb.column('ADC')[:, :nb.n_channels-1]))
+            ad_chans = nb.column('ADC')[nb_rows, device_ids].astype(int)
+            sweep_ids = nb.sweep_ids[nb_rows].astype(int)
+            names = ['data_%05d_AD%d' % row for row in zip(sweep_ids.tolist(), ad_chans.tolist())]
+            keep = np.array([name in existing for name in names], dtype=bool)
+            sweep_ids, device_ids = sweep_ids[keep], device_ids[keep]
+            names = [name for name, k in zip(names, keep) if k]
+        else:
+            rows = []
+            for sweep_id, groups in self.group_index.items():
+                if sweep_id not in nb.sweep_index:
+                    continue
+                for name in groups['AD'].values():
+                    if name in groups['electrodes']:
+                        rows.append((sweep_id, int(groups['electrodes'][name].split('_')[1]), name))
+            rows.sort()
+            sweep_ids = [row[0] for row in rows]
+            device_ids = [row[1] for row in rows]
+            names = [row[2] for row in rows]
+        sweep_ids = np.array(sweep_ids, dtype=int)
+        device_ids = np.array(device_ids, dtype=int)
+        names = np.array(names, dtype=object)
+
+        nb_rows = np.array([nb.sweep_index[s] for s in sweep_ids.tolist()], dtype=int)
+
+        def nb_col(key, idx, scale=1):
+            if key not in nb.key_index:
+                return np.full(len(idx), np.nan)
+            return nb.column(key)[nb_rows[idx], device_ids[idx]] * scale
+
+        def clamp_mode(idx):
+            return np.where(nb_col('Clamp Mode', idx) == 0, 'vc', 'ic').astype(object)
+
+        def bridge_balance(idx):
+            value = nb_col('Bridge Bal Value', idx, 1e6)
+            bb = np.where((nb_col('Bridge Bal Enable', idx) == 0) | np.isnan(value), 0.0, value)
+            bb[clamp_mode(idx) == 'vc'] = np.nan
+            return bb
+
+        def start_time(idx):
+            # igor timestamps are seconds since 1904-01-01
+            usec = nb_col('TimeStamp', idx, 1e6)
+            usec = np.where(np.isnan(usec), np.iinfo('int64').min, usec).astype('int64')  # int64 min is NaT
+            return np.datetime64('1904-01-01', 'us') + usec.astype('timedelta64[us]')
+
+        getters = {
+            'sweep_id': lambda idx: sweep_ids[idx],
+            'device_id': lambda idx: device_ids[idx],
+            'sweep_name': lambda idx: names[idx],
+            'start_time': start_time,
+            'device_type': lambda idx: np.full(len(idx), "MultiClamp 700", dtype=object),
+            'clamp_mode': clamp_mode,
+            'holding_potential': lambda idx: nb_col('V-Clamp Holding Level', idx, 1e-3),
+            'holding_current': lambda idx: nb_col('I-Clamp Holding Level', idx, 1e-12),
+            'bridge_balance': bridge_balance,
+            'lpf_cutoff': lambda idx: nb_col('LPF Cutoff', idx),
+            'pipette_offset': lambda idx: nb_col('Pipette Offset', idx, 1e-3),
+        }
+        columns = patch_clamp_meta_columns if columns is None else columns
+        for col in list(columns) + list(filters or {}):
+            if col not in getters:
+                raise KeyError("Unknown patch clamp metadata column %r" % col)
+
+        idx = np.arange(len(sweep_ids))
+        for col, cond in (filters or {}).items():
+            idx = idx[filter_mask(getters[col](idx), cond)]
+        return OrderedDict([(col, getters[col](idx)) for col in columns])
+
 
     def get_tseries_data(self, tseries):
+        mapped = self.get_tseries_memmap(tseries)
+        if mapped is not None:
+            raw, scale, offset = mapped
+            return self._to_si(raw, scale, offset)
+
+        dset, scale, offset = self._get_tseries_source(tseries)
+        data = np.array(dset)
+        if scale is not None:
+            data = data * scale
+        if offset is not None:
+            data = data + offset
+
+        if np.isnan(data[-1]):
+            # recording was interrupted; remove NaNs from the end of the array
+
+            first_nan = np.searchsorted(data, np.nan)
+            data = data[:first_nan]
+
+        return data
+
+    def get_tseries_shape(self, tseries):
+        """Return the shape of the data for *tseries* without reading it.
+        """
+        dset = self._get_tseries_source(tseries)[0]
+        return (self._valid_length(dset),) + dset.shape[1:]
+
+    def get_tseries_memmap(self, tseries):
+        """Return ``(raw, scale, offset)`` for *tseries* if its samples can be memory-mapped, otherwise None.
+
+        *raw* is a read-only np.memmap of the stored samples (excluding NaN samples left at the end 
+        by an interrupted recording); SI values are ``raw * scale + offset``, where *scale* 
+        and *offset* may be None. Slicing *raw* only reads the requested part of the file.
+        """
+        if not self.use_memmap:
+            return None
+        dset, scale, offset = self._get_tseries_source(tseries)
+        raw = self._dataset_memmap(dset)
+        if raw is None:
+            return None
+        return raw[:self._valid_length(dset)], scale, offset
+
+    @staticmethod
+    def _to_si(raw, scale, offset):
+        """Return a new array with ``raw * scale + offset`` (scale, offset may be None).
+        """
+        data = np.array(raw) if scale is None else raw * scale
+        if offset is not None:
+            data = data + offset
+        return data
+
+    def get_sweep_data(self, sweeps, devices=None, channel='primary', dtype=np.float64, mmap=False):
+        """Return data for one channel of several devices across several sweeps in a single array.
+
+        Parameters
+        ----------
+        sweeps : list
+            SyncRecordings or sweep ids to read.
+        devices : list | None
+            Device ids to read from each sweep. By default, all devices in the first sweep.
+        channel : str
+            Name of the channel to read from each recording ('primary', 'command', or 'reporter').
+        dtype : dtype
+            Data type of the returned array (usually float32 or float64).
+        mmap : bool
+            If True, return ``(raw, scale, offset)`` instead: *raw* is a (sweeps, devices) object array
+            holding the stored (unscaled) samples of each recording, *scale* and *offset* are
+            (sweeps, devices) float arrays that convert them to SI units as ``raw * scale + offset``.
+            Datasets that are stored contiguous and uncompressed are returned as read-only
+            memory-mapped views of the file, without copying.
+
+        Returns
+        -------
+        data : array
+            Array with shape (sweeps, devices, samples). Data are read directly into this array
+            and scaled in place. Recordings shorter than the longest one (or missing from a
+            sweep) are padded with NaN.
+        """
+        sweeps = [s if isinstance(s, SyncRecording) else SyncRecording(key=s, loader=self) for s in sweeps]
+        if devices is None:
+            devices = sweeps[0].devices
+
+        sources = np.empty((len(sweeps), len(devices)), dtype=object)
+        scale = np.ones(sources.shape)
+        offset = np.zeros(sources.shape)
+        for i,sweep in enumerate(sweeps):
+            for j,dev in enumerate(devices):
+                if dev not in sweep.recording_dict:
+                    continue
+                dset, s, o = self._get_tseries_source(sweep[dev][channel])
+                sources[i, j] = dset
+                scale[i, j] = 1.0 if s is None else s
+                offset[i, j] = 0.0 if o is None else o
+
+        if mmap:
+            raw = np.empty(sources.shape, dtype=object)
+            for ij,dset in np.ndenumerate(sources):
+                if dset is not None:
+                    view = self._dataset_memmap(dset)
+                    raw[ij] = dset[()] if view is None else view
+            return raw, scale, offset
+
+        n_samples = max([dset.shape[0] for dset in sources.flat if dset is not None] or [0])
+        data = np.empty(sources.shape + (n_samples,), dtype=dtype)
+        for (i, j),dset in np.ndenumerate(sources):
+            n = 0 if dset is None else dset.shape[0]
+            if n > 0:
+                dset.read_direct(data, dest_sel=np.s_[i, j, :n])
+            data[i, j, n:] = np.nan
+        data *= scale[:, :, None]
+        data += offset[:, :, None]
+        return data
+
+    def _dataset_memmap(self, dset):
+        """Return a read-only memory map of the samples in *dset*, or None if the dataset is
+        chunked, compressed, or not yet allocated in the file.
+        """
+        name = dset.name
+        if name not in self._dataset_maps:
+            offset = None
+            if dset.chunks is None and dset.dtype.kind in 'iuf' and dset.external is None:
+                offset = dset.id.get_offset()
+            if offset is None:
+                self._dataset_maps[name] = None
+            else:
+                if self._file_map is None:
+                    self._file_map = np.memmap(self._file_path, mode='r', dtype=np.uint8)
+                nbytes = dset.size * dset.dtype.itemsize
+                self._dataset_maps[name] = self._file_map[offset:offset+nbytes].view(dset.dtype).reshape(dset.shape)
+        return self._dataset_maps[name]
+
+    def get_tseries_data_chunk(self, tseries, start, stop):
+        """Return data for the tseries between sample indices *start* and *stop*, reading
+        only the requested samples from the hdf5 file.
+        """
+        mapped = self.get_tseries_memmap(tseries)
+        if mapped is not None:
+            raw, scale, offset = mapped
+            return self._to_si(raw[start:stop], scale, offset)
+
+        dset, scale, offset = self._get_tseries_source(tseries)
+        n_samples = self._valid_length(dset)
+        start = min(start, n_samples)
+        stop = min(stop, n_samples)
+        # hyperslab read of just the requested samples
+        return self._to_si(dset[start:stop], scale, offset)
+
+    def _get_tseries_source(self, tseries):
+        """Return the hdf5 dataset containing data for *tseries*, along with the scale and 
+        offset (or None) that must be applied to convert it to SI units.
+        """
+        source = self._tseries_sources.get(tseries)
+        if source is None:
+            source = self._find_tseries_source(tseries)
+            self._tseries_sources[tseries] = source
+        return source
+
+    def _find_tseries_source(self, tseries):
         rec = tseries.recording
         chan = tseries.channel_id
 
         if chan == 'primary':
             scale = 1e-12 if rec.clamp_mode == 'vc' else 1e-3
-            #data = np.array(rec.primary_hdf) * scale
-            data = np.array(self.hdf['acquisition']['timeseries'][rec.meta['sweep_name']]['data'])*scale
+            return self.hdf['acquisition']['timeseries'][rec.meta['sweep_name']]['data'], scale, None
 
         elif chan == 'command':
             scale = 1e-3 if rec.clamp_mode == 'vc' else 1e-12
@@ -215,45 +511,54 @@ class MiesNwbLoader(DatasetLoader):
                 # Mark this exception so it can be ignored in specific places
                 exc._ignorable_bug_flag = True
                 raise exc
-            #self._data = (np.array(rec.command_hdf) * scale) + offset
-            data = (np.array(self.hdf['stimulus']['presentation']['data_%05d_DA%d'%(rec.sync_recording.key, self.get_da_chan(rec))]['data']) * scale) + offset
+            return self.hdf['stimulus']['presentation']['data_%05d_DA%d'%(rec.sync_recording.key, self.get_da_chan(rec))]['data'], scale, offset
 
         elif chan == 'reporter':
             if 'AD' in rec.meta['sweep_name']:
-                data = np.array(self.hdf['acquisition']['timeseries'][rec.meta['sweep_name']]['data'])
+                return self.hdf['acquisition']['timeseries'][rec.meta['sweep_name']]['data'], None, None
             elif 'TTL' in rec.meta['sweep_name']:
-                data = np.array(self.hdf['stimulus']['presentation'][rec.meta['sweep_name']]['data'])
+                return self.hdf['stimulus']['presentation'][rec.meta['sweep_name']]['data'], None, None
             else:
                 raise Exception("Not sure where to find data for recording: %s"%rec.meta['sweep_name'])
 
         else:
             raise Exception("Getting data for channels named %s is not yet implemented." % chan)
 
-
-        if np.isnan(data[-1]):
-            # recording was interrupted; remove NaNs from the end of the array
-
-            first_nan = np.searchsorted(data, np.nan)
-            data = data[:first_nan]
-
-        return data
+    def _valid_length(self, dset):
+        """Return the number of samples in *dset* before any NaN values that were left 
+        at the end of the array by an interrupted recording.
+        """
+        if dset.name not in self._valid_lengths:
+            samples = self._dataset_memmap(dset) if self.use_memmap else None
+            if samples is None:
+                samples = dset
+            n = dset.shape[0]
+            if n > 0 and np.isnan(samples[n-1]):
+                # binary search for the first NaN, reading one sample at a time
+                lo, hi = 0, n - 1
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if np.isnan(samples[mid]):
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                n = lo
+            self._valid_lengths[dset.name] = n
+        return self._valid_lengths[dset.name]
 
     def get_da_chan(self, rec):
         """Return the DA channel ID for the given recording.
         """
         da_chan = None
 
-        hdf = self.hdf['stimulus/presentation']
-        stims = [k for k in hdf.keys() if k.startswith('data_%05d_'%rec.sync_recording.key)]
-        for s in stims:
-            if 'TTL' in s:
-                continue
-            elec = hdf[s]['electrode_name'][()][0]
-            if elec == 'electrode_%d' % rec.device_id:
-                da_chan = int(s.split('_')[-1][2:])
+        groups = self.group_index.get(rec.sync_recording.key)
+        if groups is not None:
+            for chan, name in groups['DA'].items():
+                if groups['electrodes'].get(name) == 'electrode_%d' % rec.device_id:
+                    da_chan = chan
 
         if da_chan is None:
-            raise Exception("Cannot find DA channel for headstage %d" % self.device_id)
+            raise Exception("Cannot find DA channel for headstage %d" % rec.device_id)
 
         return da_chan
 
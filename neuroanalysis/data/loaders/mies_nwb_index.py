@@ -0,0 +1,257 @@
+"""
+Persistent summary index for directories of MIES NWB files.
+
+Scanning opens each NWB file (in parallel worker processes), extracts one summary row per
+patch-clamp recording, and stores the rows in a local SQLite database. Later queries are
+answered from the database without reopening any HDF5 files, and rescans only revisit
+files whose size or modification time changed.
+
+Example::
+
+    index = MiesNwbIndex('nwb_index.sqlite')
+    index.scan('/data/nwb')              # uses one process per CPU by default
+    rows = index.sweeps(clamp_mode='ic', stim_name='PulseTrain_50Hz_DA_0')
+"""
+import os
+import glob
+import sqlite3
+import concurrent.futures
+from datetime import datetime
+import numpy as np
+
+
+# (column, sqlite type) for each per-recording summary row
+sweep_columns = [
+    ('sweep_id', 'INTEGER'),
+    ('device_id', 'INTEGER'),
+    ('start_time', 'TEXT'),
+    ('clamp_mode', 'TEXT'),
+    ('stim_name', 'TEXT'),
+    ('holding_potential', 'REAL'),
+    ('holding_current', 'REAL'),
+    ('bridge_balance', 'REAL'),
+    ('lpf_cutoff', 'REAL'),
+    ('sample_rate', 'REAL'),
+    ('duration', 'REAL'),
+    ('tp_access_resistance', 'REAL'),
+    ('tp_input_resistance', 'REAL'),
+    ('tp_capacitance', 'REAL'),
+    ('tp_baseline_potential', 'REAL'),
+    ('tp_baseline_current', 'REAL'),
+    ('error', 'TEXT'),  # failures while summarizing this recording, or None
+]
+
+
+class MiesNwbIndex(object):
+    """SQLite index of per-recording summaries for many MIES NWB files.
+
+    Parameters
+    ----------
+    db_file : str
+        Path of the SQLite database (created if it does not exist). Use ':memory:' for a
+        temporary index.
+    """
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.db = sqlite3.connect(db_file)
+        self.db.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def _create_tables(self):
+        cols = ', '.join('%s %s' % col for col in sweep_columns)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, n_sweeps INTEGER, error TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sweeps (path TEXT, %s, PRIMARY KEY (path, sweep_id, device_id))" % cols)
+            # add columns that are missing from indexes created by older versions
+            existing = [row['name'] for row in self.db.execute("PRAGMA table_info(sweeps)")]
+            for col in sweep_columns:
+                if col[0] not in existing:
+                    self.db.execute("ALTER TABLE sweeps ADD COLUMN %s %s" % col)
+            self.db.execute("CREATE INDEX IF NOT EXISTS sweeps_by_stim ON sweeps (stim_name)")
+
+    def close(self):
+        self.db.close()
+
+    def scan(self, paths, pattern='*.nwb', processes=None, executor=None, test_pulse=True):
+        """Add new or modified NWB files to the index.
+
+        Parameters
+        ----------
+        paths : str | list
+            NWB files and/or directories to scan. Directories are searched recursively
+            for files matching *pattern*.
+        processes : int | None
+            Number of worker processes to use (default is one per CPU). If 1, files are
+            scanned serially in this process.
+        executor : concurrent.futures.Executor | None
+            Optional executor to use instead of creating a process pool.
+        test_pulse : bool
+            If True, analyze the test pulse of each recording and store its metrics.
+
+        Returns
+        -------
+        scanned : list
+            The files that were (re)scanned. Files whose size and modification time match
+            the index are skipped.
+        """
+        files = self._stale_files(self._find_files(paths, pattern))
+        if len(files) == 0:
+            return []
+
+        if executor is None and processes == 1:
+            for path, stat in files:
+                self._store(path, stat, summarize_nwb(path, test_pulse))
+            return [f[0] for f in files]
+
+        own_executor = executor is None
+        if own_executor:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+        try:
+            futures = {executor.submit(summarize_nwb, path, test_pulse): (path, stat) for path, stat in files}
+            # write results as they arrive; sqlite only allows one writer anyway
+            for fut in concurrent.futures.as_completed(futures):
+                path, stat = futures[fut]
+                self._store(path, stat, fut.result())
+        finally:
+            if own_executor:
+                executor.shutdown()
+        return [f[0] for f in files]
+
+    def _find_files(self, paths, pattern):
+        if isinstance(paths, str):
+            paths = [paths]
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+            else:
+                files.append(path)
+        return sorted(set(os.path.abspath(f) for f in files))
+
+    def _stale_files(self, files):
+        """Return [(path, stat), ...] for files that are not in the index or have changed.
+        """
+        known = {row['path']: (row['mtime_ns'], row['size']) for row in self.db.execute("SELECT path, mtime_ns, size FROM files")}
+        stale = []
+        for path in files:
+            stat = os.stat(path)
+            if known.get(path) != (stat.st_mtime_ns, stat.st_size):
+                stale.append((path, stat))
+        return stale
+
+    def _store(self, path, stat, summary):
+        rows, error = summary
+        cols = ['path'] + [c[0] for c in sweep_columns]
+        insert = "INSERT OR REPLACE INTO sweeps (%s) VALUES (%s)" % (', '.join(cols), ', '.join('?' * len(cols)))
+        with self.db:
+            self.db.execute("DELETE FROM sweeps WHERE path=?", (path,))
+            self.db.executemany(insert, [[path] + [_sql_value(row.get(c[0])) for c in sweep_columns] for row in rows])
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                            (path, stat.st_mtime_ns, stat.st_size, len(rows), error))
+
+    def prune(self):
+        """Remove index entries for files that no longer exist. Returns the removed paths.
+        """
+        missing = [row['path'] for row in self.db.execute("SELECT path FROM files") if not os.path.exists(row['path'])]
+        with self.db:
+            for path in missing:
+                self.db.execute("DELETE FROM sweeps WHERE path=?", (path,))
+                self.db.execute("DELETE FROM files WHERE path=?", (path,))
+        return missing
+
+    def files(self):
+        """Return a list of dicts describing each indexed file (path, mtime_ns, size, n_sweeps, error).
+        """
+        return [dict(row) for row in self.db.execute("SELECT * FROM files ORDER BY path")]
+
+    def sweeps(self, **filters):
+        """Return a list of summary dicts (one per recording) whose columns equal the given values.
+
+        For example ``index.sweeps(clamp_mode='vc', device_id=2)``.
+        """
+        valid = set(['path'] + [c[0] for c in sweep_columns])
+        for k in filters:
+            if k not in valid:
+                raise KeyError("Unknown sweep column %r" % k)
+        where = ' AND '.join('%s=?' % k for k in filters)
+        sql = "SELECT * FROM sweeps" + (" WHERE " + where if where else "") + " ORDER BY path, sweep_id, device_id"
+        return self.query(sql, list(filters.values()))
+
+    def query(self, sql, params=()):
+        """Run an arbitrary SQL query on the index and return a list of dicts.
+        """
+        return [dict(row) for row in self.db.execute(sql, params)]
+
+
+def summarize_nwb(path, test_pulse=True):
+    """Return ``(rows, error)`` summarizing every patch-clamp recording in a MIES NWB file.
+
+    *rows* is a list of dicts with the keys in ``sweep_columns``. If the file could not be
+    read, *rows* holds whatever was collected before the failure and *error* is a message;
+    otherwise *error* is None. Failures that affect only one recording (or only its test
+    pulse metrics) are reported in the ``error`` column of that recording's row.
+    """
+    # imported here so that worker processes only pay for this when they scan a file
+    from ..dataset import Dataset, PatchClampRecording
+    from .mies_dataset_loader import MiesNwbLoader
+
+    rows = []
+    loader = MiesNwbLoader(path)
+    try:
+        for srec in Dataset(loader=loader).contents:
+            for rec in srec.recordings:
+                if not isinstance(rec, PatchClampRecording):
+                    continue
+                try:
+                    rows.append(_summarize_recording(rec, test_pulse))
+                except Exception as exc:
+                    rows.append({'sweep_id': srec.key, 'device_id': rec.device_id, 'error': _error_message(exc)})
+        return rows, None
+    except Exception as exc:
+        return rows, _error_message(exc)
+    finally:
+        loader.close()
+
+
+def _summarize_recording(rec, test_pulse):
+    nb = rec.meta['notebook']
+    primary = rec['primary']
+    start_time = rec.start_time
+    row = {
+        'sweep_id': rec.sync_recording.key,
+        'device_id': rec.device_id,
+        'start_time': start_time.isoformat() if isinstance(start_time, datetime) else start_time,
+        'clamp_mode': rec.clamp_mode,
+        'stim_name': nb.get('Stim Wave Name'),
+        # commanded holding levels; rec.holding_* would run baseline analysis instead
+        'holding_potential': rec.meta.get('holding_potential'),
+        'holding_current': rec.meta.get('holding_current'),
+        'bridge_balance': rec.meta.get('bridge_balance'),
+        'lpf_cutoff': rec.meta.get('lpf_cutoff'),
+        'sample_rate': primary.sample_rate,
+        'duration': primary.duration,
+    }
+    errors = []
+    if test_pulse:
+        try:
+            tp = rec.test_pulse
+        except Exception as exc:
+            tp = None
+            errors.append('test_pulse: ' + _error_message(exc))
+        if tp is not None:
+            for name in ('access_resistance', 'input_resistance', 'capacitance', 'baseline_potential', 'baseline_current'):
+                try:
+                    row['tp_' + name] = getattr(tp, name)
+                except Exception as exc:
+                    errors.append('tp_%s: %s' % (name, _error_message(exc)))
+    row['error'] = '; '.join(errors) if errors else None
+    return row
+
+
+def _error_message(exc):
+    return "%s: %s" % (type(exc).__name__, exc)
+
+
+def _sql_value(val):
+    # numpy scalars are not accepted by sqlite
+    return val.item() if isinstance(val, np.generic) else val
@@ -1,6 +1,7 @@
 from __future__ import division
 import numpy as np
-from .data import TSeries
+import scipy.signal
+from .data import TSeries, TSeriesList
 
 
 def zero_crossing_events(data, min_length=3, min_peak=0.0, min_sum=0.0, noise_threshold=None):
@@ -13,6 +14,9 @@ def zero_crossing_events(data, min_length=3, min_peak=0.0, min_sum=0.0, noise_th
     In addition, the event amplitude must be sufficiently large that the signal does not 
     cross 0 within a single event (low-pass filtering may be necessary to achive this).
     
+    If *noise_threshold* is given, then a gaussian is fit to the histogram of event sums
+    and events with abs(sum) smaller than noise_threshold * sigma are discarded.
+    
     Returns an array of events where each row is (start, length, sum, peak)
     """
     
@@ -25,67 +29,57 @@ def zero_crossing_events(data, min_length=3, min_peak=0.0, min_sum=0.0, noise_th
     
     ## find all 0 crossings
     mask = data1 > 0
-    diff = mask[1:] - mask[:-1]  ## mask is True every time the trace crosses 0 between i and i+1
+    diff = mask[1:] != mask[:-1]  ## mask is True every time the trace crosses 0 between i and i+1
     times1 = np.argwhere(diff)[:, 0]  ## index of each point immediately before crossing.
     
     times = np.empty(len(times1)+2, dtype=times1.dtype)  ## add first/last indexes to list of crossing times
     times[0] = 0                                         ## this is a bit suspicious, but we'd rather know
     times[-1] = len(data1)                               ## about large events at the beginning/end
     times[1:-1] = times1                                 ## rather than ignore them.
-    #p.mark('find crossings')
     
     ## select only events longer than min_length.
     ## We do this check early for performance--it eliminates the vast majority of events
-    long_events = np.argwhere(times[1:] - times[:-1] > min_length)
-    if len(long_events) < 1:
-        n_events = 0
-    else:
-        long_events = long_events[:, 0]
-        n_events = len(long_events)
+    long_events = np.argwhere((times[1:] - times[:-1] > min_length) & (times[1:] > times[:-1]))[:, 0]
+    n_events = len(long_events)
     
     ## Measure sum of values within each region between crossings, combine into single array
     if xvals is None:
         events = np.empty(n_events, dtype=[('index',int),('len', int),('sum', float),('peak', float)])  ### rows are [start, length, sum]
     else:
         events = np.empty(n_events, dtype=[('index',int),('time',float),('len', int),('sum', float),('peak', float)])  ### rows are [start, length, sum]
-    #p.mark('empty %d -> %d'% (len(times), n_events))
-    #n = 0
-    for i in range(n_events):
-        t1 = times[long_events[i]]+1
-        t2 = times[long_events[i]+1]+1
-        events[i]['index'] = t1
-        events[i]['len'] = t2-t1
-        evData = data1[t1:t2]
-        events[i]['sum'] = evData.sum()
-        if events[i]['sum'] > 0:
-            peak = evData.max()
-        else:
-            peak = evData.min()
-        events[i]['peak'] = peak
-    #p.mark('generate event array')
+    
+    ## each region spans data1[times[i]+1 : times[i+1]+1]; the last region is clipped to the end of the data
+    starts = times[long_events] + 1
+    stops = times[long_events + 1] + 1
+    events['index'] = starts
+    events['len'] = stops - starts
+    if n_events > 0:
+        events['sum'] = _reduceat_segments(np.add, data1, starts, stops)
+        peak_max = _reduceat_segments(np.maximum, data1, starts, stops)
+        peak_min = _reduceat_segments(np.minimum, data1, starts, stops)
+        events['peak'] = np.where(events['sum'] > 0, peak_max, peak_min)
     
     if xvals is not None:
         events['time'] = xvals[events['index']]
     
-    if noise_threshold > 0:
+    if noise_threshold is not None and noise_threshold > 0 and n_events > 1:
         ## Fit gaussian to peak in size histogram, use fit sigma as criteria for noise rejection
-        stdev = measureNoise(data1)
-        #p.mark('measureNoise')
-        hist = histogram(events['sum'], bins=100)
-        #p.mark('histogram')
-        histx = 0.5*(hist[1][1:] + hist[1][:-1]) ## get x values from middle of histogram bins
-        #p.mark('histx')
-        fit = fitGaussian(histx, hist[0], [hist[0].max(), 0, stdev*3, 0])
-        #p.mark('fit')
-        sigma = fit[0][2]
-        minSize = sigma * noise_threshold
+        from .fitting import Gaussian
+        hist, edges = np.histogram(events['sum'], bins=100)
+        histx = 0.5 * (edges[1:] + edges[:-1])  ## get x values from middle of histogram bins
+        # most regions are noise, so the median absolute sum gives a robust initial sigma
+        sigma_init = max(1.4826 * np.median(np.abs(events['sum'])), edges[1] - edges[0])
+        fit = Gaussian().fit(hist, x=histx, params={
+            'xoffset': 0,
+            'yoffset': (0, 'fixed'),
+            'sigma': (sigma_init, 0, None),
+            'amp': hist.max(),
+        })
+        sigma = abs(fit.best_values['sigma'])
+        min_size = sigma * noise_threshold
         
-        ## Generate new set of events, ignoring those with sum < minSize
-        #mask = abs(events['sum'] / events['len']) >= minSize
-        mask = abs(events['sum']) >= minSize
-        #p.mark('mask')
-        events = events[mask]
-        #p.mark('select')
+        ## Generate new set of events, ignoring those with sum < min_size
+        events = events[abs(events['sum']) >= min_size]
 
     if min_peak > 0:
         events = events[abs(events['peak']) > min_peak]
@@ -96,6 +90,21 @@ def zero_crossing_events(data, min_length=3, min_peak=0.0, min_sum=0.0, noise_th
     return events
 
 
+def _reduceat_segments(ufunc, data, starts, stops):
+    """Apply *ufunc*.reduce to each segment ``data[starts[i]:stops[i]]`` using a single
+    ufunc.reduceat call.
+
+    Segments must be non-empty and may overlap, but only the last segment may extend to 
+    (or past) the end of *data*.
+    """
+    inds = np.empty(len(starts) * 2, dtype=int)
+    inds[0::2] = starts
+    inds[1::2] = stops
+    if inds[-1] >= len(data):
+        inds = inds[:-1]
+    return ufunc.reduceat(data, inds)[0::2]
+
+
 def threshold_events(trace, threshold, adjust_times=True, baseline=0.0, omit_ends=True):
     """
     Finds regions in a trace that cross a threshold value (as measured by distance from baseline). Returns the index, length, peak, and sum of each event.
@@ -104,44 +113,11 @@ def threshold_events(trace, threshold, adjust_times=True, baseline=0.0, omit_end
     threshold = abs(threshold)
     data = trace.data
     data1 = data - baseline
-    #if (hasattr(data, 'implements') and data.implements('MetaArray')):
     
-    ## find all threshold crossings
-    hits = []
-    for signed_threshold in (-threshold, threshold):
-        if signed_threshold < 0:
-            mask = data1 < signed_threshold
-        else:
-            mask = data1 > signed_threshold
-        
-        imask = mask.astype('byte')
-        diff = imask[1:] - imask[:-1]
-        on_inds = list(np.argwhere(diff==1)[:,0] + 1)
-        off_inds = list(np.argwhere(diff==-1)[:,0] + 1)
-        
-        if omit_ends:
-            if mask[0]:
-                off_inds = off_inds[1:]
-            if mask[-1]:
-                on_inds = on_inds[:-1]
-        else:
-            if mask[0]:
-                on_inds.insert(0, 0)
-            if mask[-1]:
-                off_inds.append(len(mask))
-
-        if len(on_inds) == 0:
-            continue
-        
-        for i in range(len(on_inds)):
-            if on_inds[i] == off_inds[i]:
-                continue
-            hits.append((on_inds[i], off_inds[i]))
+    ## find all threshold crossings; positive and negative events come out already interleaved
+    on_inds, off_inds = _threshold_crossings(data1, threshold, omit_ends)
     
-    ## sort hits  ## NOTE: this can be sped up since we already know how to interleave the events..
-    hits.sort(key=lambda a: a[0])
-    
-    n_events = len(hits)
+    n_events = len(on_inds)
     events = np.empty(n_events, dtype=[
         ('index', int),
         ('len', int),
@@ -155,109 +131,169 @@ def threshold_events(trace, threshold, adjust_times=True, baseline=0.0, omit_end
         ('peak_time', float),
     ])
     
-    ## Lots of work ahead:
     ## 1) compute length, peak, sum for each event
-    ## 2) adjust event times if requested, then recompute parameters
-    for i in range(n_events):
-        ind1, ind2 = hits[i]
-        ln = ind2-ind1
-        ev_data = data1[ind1:ind2]
-        sum = ev_data.sum()
-        if sum > 0:
-            peak_ind = np.argmax(ev_data)
-        else:
-            peak_ind = np.argmin(ev_data)
-        peak = ev_data[peak_ind]
-        peak_ind += ind1
-            
-        #print "event %f: %d" % (xvals[ind1], ind1) 
-        if adjust_times:  ## Move start and end times outward, estimating the zero-crossing point for the event
+    sums, max_inds, min_inds = _segment_stats(data1, on_inds, off_inds)
+    lengths = off_inds - on_inds
+    peak_inds = np.where(sums > 0, max_inds, min_inds)
+    peaks = data1[on_inds + peak_inds]
+    
+    if not adjust_times:
+        events['index'] = on_inds
+        events['len'] = lengths
+        events['sum'] = sums
+        events['peak'] = peaks
+        events['peak_index'] = on_inds + peak_inds
+    else:
+        ## 2) Move start and end times outward, estimating the zero-crossing point for each event
+        adj1 = _crossing_adjustment(threshold, max_inds, peaks - data1[on_inds], lengths)
+        adj2 = _crossing_adjustment(threshold, lengths - max_inds, peaks - data1[off_inds - 1], lengths)
+        starts = (on_inds - adj1).astype(float)
+        stops = off_inds + adj2
         
-            ## adjust ind1 first
-            mind = np.argmax(ev_data)
-            pdiff = abs(peak - ev_data[0])
-            if pdiff == 0:
-                adj1 = 0
-            else:
-                adj1 = int(threshold * mind / pdiff)
-                adj1 = min(ln, adj1)
-            ind1 -= adj1
-            
-            ## check for collisions with previous events
-            if i > 0:
-                lind2 = hits[i-1][1]
-                if ind1 < lind2:
-                    diff = lind2-ind1   ## if events have collided, force them to compromise
-                    tot = adj1 + last_adj
-                    if tot != 0:
-                        d1 = diff * float(last_adj) / tot
-                        d2 = diff * float(adj1) / tot
-                        hits[i-1] = (int(hits[i-1][0]), int(hits[i-1][1]-(d1+1)))
-                        ind1 += d2
-            
-            ## adjust ind2
-            mind = ln - mind
-            pdiff = abs(peak - ev_data[-1])
-            if pdiff == 0:
-                adj2 = 0
-            else:
-                adj2 = int(threshold * mind / pdiff)
-                adj2 = min(ln, adj2)
-            ind2 += adj2
-            last_adj = adj2
-            
-        hits[i] = (int(ind1), int(ind2))
-        events[i]['peak'] = peak
-        events[i]['index'] = ind1
-        events[i]['peak_index'] = peak_ind
-        events[i]['len'] = ln
-        events[i]['sum'] = sum
+        ## check for collisions with previous events; if events have collided, force them to compromise
+        last_stops = stops[:-1]
+        diff = last_stops - starts[1:]
+        tot = adj1[1:] + adj2[:-1]
+        collided = np.flatnonzero((diff > 0) & (tot != 0))
+        diff = diff[collided]
+        tot = tot[collided]
+        d1 = diff * adj2[collided].astype(float) / tot
+        d2 = diff * adj1[collided + 1].astype(float) / tot
+        stops[collided] = (last_stops[collided] - (d1 + 1)).astype(int)
+        starts[collided + 1] += d2
+        starts = starts.astype(int)
         
-    if adjust_times:  ## go back and re-compute event parameters.
-        mask = np.ones(n_events, dtype=bool)
-        for i in range(n_events):
-            ind1, ind2 = hits[i]
-            
-            ln = ind2 - ind1
-            ev_data = data1[ind1:ind2]
-            sum = ev_data.sum()
-            if len(ev_data) == 0:
-                mask[i] = False
-                continue
-            if sum > 0:
-                peak_ind = np.argmax(ev_data)
-            else:
-                peak_ind = np.argmin(ev_data)
-            peak = ev_data[peak_ind]
-            peak_ind += ind1
-                
-            events[i]['peak'] = peak
-            events[i]['index'] = ind1
-            events[i]['peak_index'] = peak_ind
-            events[i]['len'] = ln
-            events[i]['sum'] = sum
-    
-        ## remove masked events
+        ## re-compute event parameters; start/stop follow python slicing rules 
+        ## and events that end up empty are removed
+        slice_starts, slice_stops = _slice_bounds(starts, stops, len(data1))
+        mask = slice_stops > slice_starts
         events = events[mask]
+        starts = starts[mask]
+        stops = stops[mask]
+        slice_starts = slice_starts[mask]
+        slice_stops = slice_stops[mask]
+        
+        sums, max_inds, min_inds = _segment_stats(data1, slice_starts, slice_stops)
+        peak_inds = np.where(sums > 0, max_inds, min_inds)
+        events['peak'] = data1[slice_starts + peak_inds]
+        events['index'] = starts
+        events['peak_index'] = starts + peak_inds
+        events['len'] = stops - starts
+        events['sum'] = sums
 
     # add in timing information if available:
     if trace.has_timing:
-        for ev in events:
-            i1 = ev['index']
-            i2 = i1 + ev['len']
-            ev['time'] = trace.time_at(i1)
-            ev['duration'] = trace.time_at(i2) - ev['time']
-            ev['area'] = np.trapz(y=data1[i1:i2], x=trace.time_values[i1:i2])
-            ev['peak_time'] = trace.time_at(ev['peak_index'])
+        i1 = events['index']
+        i2 = i1 + events['len']
+        events['time'] = trace.time_at(i1)
+        events['duration'] = trace.time_at(i2) - events['time']
+        events['area'] = _segment_trapz(data1, trace.time_values, *_slice_bounds(i1, i2, len(data1)))
+        events['peak_time'] = trace.time_at(events['peak_index'])
     else:
-        ev['time'] = np.nan
-        ev['duration'] = np.nan
-        ev['area'] = np.nan
-        ev['peak_time'] = np.nan
+        events['time'] = np.nan
+        events['duration'] = np.nan
+        events['area'] = np.nan
+        events['peak_time'] = np.nan
 
     return events
 
 
+def _threshold_crossings(data, threshold, omit_ends):
+    """Return arrays of (on, off) indices for all regions in *data* that lie above *threshold* or
+    below *-threshold*.
+
+    Regions are returned in order; a signal that jumps directly from one side of the threshold
+    to the other ends one region and begins the next at the same index.
+    """
+    state = np.zeros(len(data), dtype='byte')
+    state[data > threshold] = 1
+    state[data < -threshold] = -1
+    if len(state) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    
+    changes = np.argwhere(state[1:] != state[:-1])[:, 0] + 1
+    on_inds = changes[state[changes] != 0]
+    off_inds = changes[state[changes - 1] != 0]
+    
+    if omit_ends:
+        if state[0] != 0:
+            off_inds = off_inds[1:]
+        if state[-1] != 0:
+            on_inds = on_inds[:-1]
+    else:
+        if state[0] != 0:
+            on_inds = np.concatenate([[0], on_inds])
+        if state[-1] != 0:
+            off_inds = np.concatenate([off_inds, [len(state)]])
+    
+    return on_inds.astype(int), off_inds.astype(int)
+
+
+def _crossing_adjustment(threshold, n_samples, peak_diff, max_adj):
+    """Return the number of samples by which each event boundary should be moved outward
+    to reach an extrapolated baseline crossing.
+    """
+    peak_diff = abs(peak_diff)
+    nonzero = peak_diff != 0
+    adj = np.zeros(len(n_samples), dtype=int)
+    adj[nonzero] = (threshold * n_samples[nonzero] / peak_diff[nonzero]).astype(int)
+    return np.minimum(max_adj, adj)
+
+
+def _slice_bounds(starts, stops, length):
+    """Return the actual (start, stop) indices covered by ``data[start:stop]`` for arrays
+    of start and stop values, following python slicing rules for negative and out-of-range values.
+    """
+    bounds = []
+    for inds in (starts, stops):
+        inds = np.where(inds < 0, inds + length, inds)
+        bounds.append(np.clip(inds, 0, length))
+    starts, stops = bounds
+    return starts, np.maximum(starts, stops)
+
+
+def _segment_groups(starts, stops):
+    """Generate (selection, indices) for groups of equal-length segments ``[starts[i]:stops[i]]``.
+
+    *selection* gives the positions of the segments in the group, and *indices* is a 2D array
+    of the sample indices covered by each of those segments. Reducing each row of data[indices]
+    gives results identical to reducing the equivalent 1D slice, which is not true for ufunc.reduceat.
+    """
+    lengths = stops - starts
+    order = np.argsort(lengths, kind='stable')
+    breaks = np.argwhere(np.diff(lengths[order]) != 0)[:, 0] + 1
+    for sel in np.split(order, breaks):
+        if len(sel) == 0:
+            continue
+        yield sel, starts[sel, None] + np.arange(lengths[sel[0]])
+
+
+def _segment_stats(data, starts, stops):
+    """Return the sum, argmax, and argmin of each non-empty segment ``data[starts[i]:stops[i]]``.
+    """
+    sums = np.empty(len(starts), dtype=data[:0].sum().dtype)
+    max_inds = np.empty(len(starts), dtype=int)
+    min_inds = np.empty(len(starts), dtype=int)
+    for sel, inds in _segment_groups(starts, stops):
+        seg = data[inds]
+        sums[sel] = seg.sum(axis=1)
+        max_inds[sel] = seg.argmax(axis=1)
+        min_inds[sel] = seg.argmin(axis=1)
+    return sums, max_inds, min_inds
+
+
+def _segment_trapz(y, x, starts, stops):
+    """Return the trapezoidal integral of each segment ``y[starts[i]:stops[i]]`` over *x*.
+    """
+    area = np.zeros(len(starts))
+    for sel, inds in _segment_groups(starts, stops):
+        if inds.shape[1] < 2:
+            continue
+        seg_y = y[inds]
+        area[sel] = (np.diff(x[inds], axis=1) * (seg_y[:, 1:] + seg_y[:, :-1]) / 2.0).sum(axis=1)
+    return area
+
+
 def rolling_sum(data, n):
     """A sliding-window filter that returns the sum of n source values for each
     value in the output array::
@@ -272,7 +308,7 @@ def rolling_sum(data, n):
     return d2
     
 
-def clements_bekkers(data, template):
+def clements_bekkers(data, template, method='auto'):
     """Sliding, scale-invariant template matching algorithm.
 
     Slides a template along a signal, measuring their similarity and scale difference
@@ -283,7 +319,14 @@ def clements_bekkers(data, template):
     data : array
         The signal data to process
     template : array
-        A template 
+        A template, or a 2D array of shape (n_templates, template_length) containing several 
+        templates of equal length (for example, with different rise/decay kinetics) to be 
+        matched against *data* in a single call.
+    method : 'auto' | 'direct' | 'fft' | 'oa'
+        Method used to correlate the template with the data: direct correlation, FFT convolution 
+        over the entire signal, or overlap-add FFT convolution. With 'auto' (default), direct 
+        correlation is used for short templates, and overlap-add is used when the data are much
+        longer than the template.
     
     Returns
     -------
@@ -293,6 +336,9 @@ def clements_bekkers(data, template):
         The scale factor providing the best fit between template and signal at each sample.
     offset : array
         The y-offset of the best template fit at each sample.
+
+    Each returned array has length ``len(data) - template_length + 1``, with one row per template
+    if *template* is 2D.
     
     Notes
     -----
@@ -300,51 +346,259 @@ def clements_bekkers(data, template):
     See Clements & Bekkers, Biophysical Journal, 73: 220-229, 1997.
     """
     # Strip out meta-data for faster computation
-    D = data.view(ndarray)
-    T = template.view(ndarray)
+    D = np.asarray(data).view(np.ndarray)
+    T = np.asarray(template).view(np.ndarray)
+    single = T.ndim == 1
+    T = np.atleast_2d(T)
     
-    # Prepare a bunch of arrays we'll need later
-    N = len(T)
-    sumT = T.sum()
-    sumT2 = (T**2).sum()
+    # Prepare a bunch of arrays we'll need later; data sums are shared by all templates
+    N = T.shape[1]
+    sumT = T.sum(axis=1)[:, None]
+    sumT2 = (T**2).sum(axis=1)[:, None]
     sumD = rolling_sum(D, N)
     sumD2 = rolling_sum(D**2, N)
-    sumTD = correlate(D, T, mode='valid')
+    sumTD = _correlate_templates(D, T, method)
     
     # compute scale factor, offset at each location:
     scale = (sumTD - sumT * sumD / N) / (sumT2 - sumT**2 / N)
     offset = (sumD - scale * sumT) / N
     
-    # compute SSE at every location
+    # compute SSE at every location (clipped to avoid small negative values caused by fp error)
     SSE = sumD2 + scale**2 * sumT2 + N * offset**2 - 2 * (scale*sumTD + offset*sumD - scale*offset*sumT)
+    np.clip(SSE, 0, None, out=SSE)
     
     # finally, compute error and detection criterion
-    error = sqrt(SSE / (N-1))
+    error = np.sqrt(SSE / (N-1))
     DC = scale / error
+    if single:
+        return DC[0], scale[0], offset[0]
     return DC, scale, offset
 
 
-def exp_deconvolve(trace, tau):
+def _correlate_templates(data, templates, method='auto'):
+    """Return the 'valid' correlation of 1D *data* with each row of *templates*.
+    """
+    n_data = len(data)
+    n_tmpl = templates.shape[1]
+    if method == 'auto':
+        if n_tmpl < 64:
+            method = 'direct'
+        elif n_data > 16 * n_tmpl:
+            method = 'oa'
+        else:
+            method = 'fft'
+
+    if method == 'direct':
+        return np.vstack([np.correlate(data, t, mode='valid') for t in templates])
+    elif method == 'fft':
+        return scipy.signal.fftconvolve(data[None, :], templates[:, ::-1], mode='valid', axes=1)
+    elif method == 'oa':
+        return scipy.signal.oaconvolve(data[None, :], templates[:, ::-1], mode='valid', axes=1)
+    else:
+        raise ValueError("method must be 'auto', 'direct', 'fft', or 'oa'; got %r" % method)
+
+
+def exp_deconvolve(trace, tau, dt=None):
     """Exponential deconvolution used to isolate overlapping events; works nicely on PSPs, calcium transients, etc.
 
+    *trace* may be a TSeries, a TSeriesList, or an array. Arrays are filtered along their last axis,
+    so a 2D array of (sweeps, samples) is processed in a single call; in this case *dt* must be given.
+    The output is one sample shorter than the input.
+
     See: Richardson & Silberberg 2008, "Measurement and Analysis of Postsynaptic Potentials Using 
          a Novel Voltage-Deconvolution Method"
     """
-    dt = trace.dt
-    arr = trace.data
-    deconv = arr[:-1] + (tau / dt) * (arr[1:] - arr[:-1])
-    if trace.has_time_values:
-        # data is one sample shorter; clip time values to match.
-        return trace.copy(data=deconv, time_values=trace.time_values[:-1])
+    return _apply_exp_filter(_exp_deconvolve_array, trace, tau, dt, trim=1)
+
+
+def exp_reconvolve(trace, tau, dt=None):
+    """Inverse of exp_deconvolve; equivalent to subtracting an exponential decay from the original unconvolved signal.
+
+    Accepts the same input types as exp_deconvolve. The output has the same length as the input.
+    """
+    return _apply_exp_filter(_exp_reconvolve_array, trace, tau, dt, trim=0)
+
+
+def _exp_deconvolve_array(data, tau, dt):
+    # FIR filter written in difference form to avoid cancellation error when tau >> dt
+    return data[..., :-1] + (tau / dt) * (data[..., 1:] - data[..., :-1])
+
+
+def _exp_reconvolve_array(data, tau, dt):
+    # first-order IIR filter:  d[i] = (1 - dt/tau) * d[i-1] + (dt/tau) * data[i-1]
+    dtt = dt / tau
+    out = scipy.signal.lfilter([0., dtt], [1., -(1. - dtt)], data, axis=-1)
+    return out.astype(data.dtype, copy=False)
+
+
+def _apply_exp_filter(fn, trace, tau, dt, trim):
+    """Apply an exponential filter function (which operates on the last axis of an array) to a
+    TSeries, TSeriesList, or array.
+    """
+    if isinstance(trace, TSeriesList):
+        traces = list(trace)
+        if len(traces) == 0:
+            return TSeriesList()
+        if len(set([(t.dt, t.shape) for t in traces])) == 1 and traces[0].ndim == 1:
+            # all traces share timing; filter them together as a single 2D array
+            filtered = fn(np.vstack([t.data for t in traces]), tau, traces[0].dt)
+            return TSeriesList([_exp_filtered_copy(t, d, trim) for t, d in zip(traces, filtered)])
+        return TSeriesList([_apply_exp_filter(fn, t, tau, dt, trim) for t in traces])
+    elif isinstance(trace, TSeries):
+        # TSeries data has time along the first axis
+        filtered = np.moveaxis(fn(np.moveaxis(trace.data, 0, -1), tau, trace.dt), -1, 0)
+        return _exp_filtered_copy(trace, filtered, trim)
+    else:
+        if dt is None:
+            raise TypeError("dt must be specified when filtering an array.")
+        return fn(np.asarray(trace), tau, dt)
+
+
+def _exp_filtered_copy(trace, data, trim):
+    if trim > 0 and trace.has_time_values:
+        # data is shorter than the original; clip time values to match.
+        return trace.copy(data=data, time_values=trace.time_values[:-trim])
     else:
-        return trace.copy(data=deconv)
+        return trace.copy(data=data)
+
+
+def iter_exp_deconvolve(chunks, tau):
+    """Apply exp_deconvolve to a sequence of consecutive TSeries chunks, such as those generated
+    by TSeries.iter_chunks().
+
+    The last sample of each chunk is carried over to the next, so that the concatenated output is 
+    identical to exp_deconvolve() applied to the complete trace.
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = _join_chunks(carry, chunk)
+        if len(chunk) < 2:
+            carry = chunk
+            continue
+        yield exp_deconvolve(chunk, tau)
+        carry = chunk[len(chunk)-1:]
+
+
+def iter_clements_bekkers(chunks, template):
+    """Apply clements_bekkers to a sequence of consecutive TSeries chunks, such as those generated
+    by TSeries.iter_chunks().
+
+    Generates one TSeries per chunk containing the detection criterion, where each sample
+    corresponds to the template aligned at the same position in the input. If *template* is 
+    a 2D stack of templates, then each TSeries has one column per template. The last 
+    ``template_length - 1`` samples of each chunk are carried over to the next, so that the 
+    concatenated output covers every template position in the complete trace.
+    """
+    n = np.shape(template)[-1]
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = _join_chunks(carry, chunk)
+        if len(chunk) < n:
+            carry = chunk
+            continue
+        dc = clements_bekkers(chunk.data, template)[0].T
+        if chunk.has_time_values:
+            yield chunk.copy(data=dc, time_values=chunk.time_values[:len(dc)])
+        else:
+            yield chunk.copy(data=dc)
+        carry = chunk[len(chunk)-n+1:]
+
+
+def iter_threshold_events(chunks, threshold, overlap, **kwds):
+    """Run threshold_events over a sequence of consecutive TSeries chunks, such as those generated
+    by TSeries.iter_chunks().
+
+    Generates one array of events (in the format returned by threshold_events) for each block of 
+    data that has been processed. Event indices are given relative to the beginning of the first chunk.
     
-def exp_reconvolve(trace, tau):
-    # equivalent to subtracting an exponential decay from the original unconvolved signal
-    dt = trace.dt
-    d = np.zeros(trace.data.shape, trace.data.dtype)
-    dtt = dt / tau
-    dtti = 1. - dtt
-    for i in range(1, len(d)):
-        d[i] = dtti * d[i-1] + dtt * trace.data[i-1]
-    return trace.copy(data=d)
+    Chunks are combined into overlapping windows with *overlap* samples of context on each side, 
+    and each event is reported only by the window whose central region contains the event's start.
+    Results are identical to running threshold_events on the complete trace as long as *overlap*
+    is longer than any event (including the extent of adjust_times). Events that are
+    longer than *overlap* may be truncated or missed.
+
+    All extra keyword arguments are passed to threshold_events.
+    """
+    overlap = int(overlap)
+    buf = None      # window currently being processed
+    buf_start = 0   # index of the first sample in buf
+    report_start = 0  # events starting before this index have already been reported
+    for chunk in chunks:
+        buf = chunk if buf is None else _join_chunks(buf, chunk)
+        report_stop = buf_start + len(buf) - overlap
+        if report_stop <= report_start:
+            continue
+        yield _window_events(buf, buf_start, report_start, report_stop, threshold, **kwds)
+        report_start = report_stop
+
+        # discard data that is no longer needed as context for the next window
+        keep_start = max(buf_start, report_start - overlap)
+        buf = buf[keep_start-buf_start:]
+        buf_start = keep_start
+
+    if buf is not None:
+        yield _window_events(buf, buf_start, report_start, None, threshold, **kwds)
+
+
+def iter_events(trace, threshold, chunk_size=1000000, overlap=10000, deconv_tau=None, template=None, **kwds):
+    """Detect events in a long TSeries without loading the entire data array into memory.
+
+    Data are read from *trace* in chunks of *chunk_size* samples (see TSeries.iter_chunks), 
+    optionally passed through exponential deconvolution and/or Clements-Bekkers template
+    matching, and then searched with threshold_events. Arrays of detected events are 
+    generated as each chunk is processed; peak memory use depends on *chunk_size* and
+    *overlap* rather than on the length of the recording.
+
+    Parameters
+    ----------
+    trace : TSeries
+        The data to search. If the data are not yet loaded, they are read from the trace's loader.
+    threshold : float
+        Threshold passed to threshold_events.
+    chunk_size : int
+        Number of samples to read at a time.
+    overlap : int
+        Number of samples of context used on either side of each window passed to 
+        threshold_events. This must be longer than the longest expected event.
+    deconv_tau : float | None
+        If given, the data are first processed with exp_deconvolve using this time constant.
+    template : array | None
+        If given, events are detected in the clements_bekkers detection criterion computed
+        with this template. Only a single (1D) template is supported; use
+        iter_clements_bekkers directly to compute the criterion for a stack of templates.
+    
+    All extra keyword arguments are passed to threshold_events.
+    """
+    if template is not None and np.ndim(template) > 1:
+        raise ValueError("iter_events requires a 1D template (got shape %r)." % (np.shape(template),))
+    chunks = trace.iter_chunks(chunk_size)
+    if deconv_tau is not None:
+        chunks = iter_exp_deconvolve(chunks, deconv_tau)
+    if template is not None:
+        chunks = iter_clements_bekkers(chunks, template)
+    return iter_threshold_events(chunks, threshold, overlap=overlap, **kwds)
+
+
+def _join_chunks(chunk1, chunk2):
+    """Return a TSeries containing the data from two consecutive chunks.
+    """
+    data = np.concatenate([chunk1.data, chunk2.data])
+    if chunk1.has_time_values:
+        return chunk1.copy(data=data, time_values=np.concatenate([chunk1.time_values, chunk2.time_values]))
+    else:
+        return chunk1.copy(data=data)
+
+
+def _window_events(window, window_start, report_start, report_stop, threshold, **kwds):
+    """Run threshold_events on one window of a chunked trace, returning only events that start
+    between *report_start* and *report_stop*, with indices offset by *window_start*.
+    """
+    events = threshold_events(window, threshold, **kwds)
+    events['index'] += window_start
+    events['peak_index'] += window_start
+    mask = events['index'] >= report_start
+    if report_stop is not None:
+        mask &= events['index'] < report_stop
+    return events[mask]
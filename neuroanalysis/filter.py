@@ -1,49 +1,134 @@
+import functools
+from fractions import Fraction
 import numpy as np
 import scipy.stats, scipy.signal
 
 
 def bessel_filter(trace, cutoff, order=1, btype='low', bidir=True):
-    """Return a Bessel-filtered copy of a TSeries.
+    """Return a Bessel-filtered copy of a TSeries or TSeriesBatch.
     """
-    b,a = scipy.signal.bessel(order, cutoff * trace.dt, btype=btype) 
-    filtered = apply_filter(trace.data, b, a, bidir=bidir)
+    sos = design_filter('bessel', order, cutoff * trace.dt, btype=btype)
+    filtered = apply_sos_filter(trace.data, sos, bidir=bidir)
     # todo: record information about filtering?
     #filtered.meta['processing'].append({'name': 'bessel_filter', 'cutoff': cutoff, 'order': order, 'btype': btype, 'bidir': bidir})
     return trace.copy(data=filtered)
 
 
 def butterworth_filter(trace, w_pass, w_stop=None, g_pass=2.0, g_stop=20.0, order=1, btype='low', bidir=True):
-    """Return a Butterworth-filtered copy of a TSeries.
+    """Return a Butterworth-filtered copy of a TSeries or TSeriesBatch.
     """
     if w_stop is None:
         w_stop = w_pass * 2.0
     dt = trace.dt
-    ord, Wn = scipy.signal.buttord(w_pass*dt*2., w_stop*dt*2., g_pass, g_stop)
-    b,a = scipy.signal.butter(ord, Wn, btype=btype) 
-    filtered = apply_filter(trace.data, b, a, bidir=bidir)
+    ord, Wn = _buttord(_hashable(w_pass*dt*2.), _hashable(w_stop*dt*2.), g_pass, g_stop)
+    sos = design_filter('butter', ord, Wn, btype=btype)
+    filtered = apply_sos_filter(trace.data, sos, bidir=bidir)
 
     return trace.copy(data=filtered)
 
 
+@functools.lru_cache(maxsize=256)
+def _design_filter(ftype, order, Wn, btype):
+    design = {'bessel': scipy.signal.bessel, 'butter': scipy.signal.butter}[ftype]
+    return design(order, Wn, btype=btype, output='sos')
+
+
+def design_filter(ftype, order, Wn, btype='low'):
+    """Return second-order sections for a digital IIR filter.
+
+    Designs are memoized, so repeatedly filtering with the same parameters (for example,
+    many chunks of a recording with the same sample rate) only designs the filter once.
+
+    Parameters
+    ----------
+    ftype : "bessel" | "butter"
+        Filter type.
+    order : int
+        Filter order.
+    Wn : float | tuple
+        Critical frequency (or frequencies, for bandpass/bandstop filters), normalized
+        to the Nyquist frequency as in scipy.signal.
+    btype : str
+        "low", "high", "bandpass", or "bandstop".
+    """
+    # copy so that callers cannot modify the cached design
+    return _design_filter(ftype, int(order), _hashable(Wn), btype).copy()
+
+
+@functools.lru_cache(maxsize=256)
+def _buttord(wp, ws, gpass, gstop):
+    return scipy.signal.buttord(wp, ws, gpass, gstop)
+
+
+def _hashable(Wn):
+    if np.ndim(Wn) == 0:
+        return float(Wn)
+    return tuple(float(w) for w in Wn)
+
+
+def _mirror_pad(data, padding):
+    """Return (padded, n_pad): a copy of *data* with up to *padding* samples mirrored onto both
+    ends of the last axis, written into a single new array.
+    """
+    n = data.shape[-1]
+    p = min(padding, n)
+    padded = np.empty(data.shape[:-1] + (n + 2*p,), dtype=np.result_type(data.dtype, np.float64))
+    padded[..., p:p+n] = data
+    padded[..., :p] = data[..., :p][..., ::-1]
+    padded[..., p+n:] = data[..., n-p:][..., ::-1]
+    return padded, p
+
+
 def apply_filter(data, b, a, padding=100, bidir=True):
     """Apply a linear filter with coefficients a, b. Optionally pad the data before filtering
     and/or run the filter in both directions.
+
+    The filter is applied along the last axis, so a 2D array of (traces, samples) is
+    filtered in a single call.
     """
+    data = np.asarray(data)
+    p = 0
     if padding > 0:
-        pad1 = data[:padding][::-1]
-        pad2 = data[-padding:][::-1]
-        data = np.hstack([pad1, data, pad2])
+        data, p = _mirror_pad(data, padding)
     
     if bidir:
-        filtered = scipy.signal.lfilter(b, a, scipy.signal.lfilter(b, a, data)[::-1])[::-1]
+        filtered = scipy.signal.lfilter(b, a, scipy.signal.lfilter(b, a, data, axis=-1)[..., ::-1], axis=-1)[..., ::-1]
     else:
-        filtered = scipy.signal.lfilter(b, a, data)
+        filtered = scipy.signal.lfilter(b, a, data, axis=-1)
     
-    if padding > 0:
-        filtered = filtered[len(pad1):-len(pad2)]
+    if p > 0:
+        filtered = filtered[..., p:-p]
         
     return filtered
 
+
+def apply_sos_filter(data, sos, padding=100, bidir=True):
+    """Apply a filter given as second-order sections (see design_filter). Optionally pad the data
+    before filtering and/or run the filter in both directions.
+
+    Second-order sections are numerically stable for high filter orders and low cutoffs,
+    where (b, a) coefficients can fail. The bidirectional filter (scipy.signal.sosfiltfilt)
+    starts from the filter's steady state rather than from zero, so edges do not show a
+    transient when the data are far from zero and the cutoff is low.
+
+    The filter is applied along the last axis, so a 2D array of (traces, samples) is
+    filtered in a single call.
+    """
+    data = np.asarray(data)
+    p = 0
+    if padding > 0:
+        data, p = _mirror_pad(data, padding)
+
+    if bidir:
+        filtered = scipy.signal.sosfiltfilt(sos, data, axis=-1, padtype=None)
+    else:
+        filtered = scipy.signal.sosfilt(sos, data, axis=-1)
+
+    if p > 0:
+        filtered = filtered[..., p:-p]
+
+    return filtered
+
 def savgol_filter(trace, window_duration, **kwds):
     """Return a Savitsky-Golay-filtered copy of a TSeries.
     """
@@ -121,6 +206,7 @@ def downsample(data, n, axis=0):
     elif n < 1:
         raise ValueError("Invalid downsampling window %d" % n)
     
+    axis = axis % data.ndim
     n_pts = int(data.shape[axis] / n)
     s = list(data.shape)
     s[axis] = n_pts
@@ -132,3 +218,65 @@ def downsample(data, n, axis=0):
     d2 = d1.mean(axis+1)
 
     return d2
+
+
+def resample(data, sample_rate, new_sample_rate, method='auto', axis=-1, max_factor=1000):
+    """Resample regularly sampled *data* from *sample_rate* to *new_sample_rate* along *axis*.
+
+    The first output sample has the same time as the first input sample.
+
+    Parameters
+    ----------
+    data : array
+        Data to resample; may have any number of dimensions (e.g. a 2D array of
+        (traces, samples) with axis=-1).
+    sample_rate : float
+        Sample rate of *data*.
+    new_sample_rate : float
+        Sample rate of the returned array.
+    method : "auto" | "average" | "polyphase" | "interp"
+        "polyphase" uses scipy.signal.resample_poly (FIR antialiasing filter) and requires
+        a rational rate ratio whose terms are at most *max_factor*. "average" downsamples
+        by an integer factor by averaging groups of samples (see downsample); this is the
+        fastest method but gives weaker antialiasing. "interp" applies a 2nd order
+        bidirectional Bessel filter (cutoff=new_sample_rate; downsampling only) and
+        linearly interpolates new samples; this avoids ringing and works for any ratio.
+        "auto" uses "polyphase" where possible and "interp" otherwise.
+    max_factor : int
+        Largest up- or down-sampling factor to use with the polyphase method.
+    """
+    data = np.asarray(data)
+    ratio = new_sample_rate / sample_rate
+    frac = Fraction(ratio).limit_denominator(max_factor)
+    rational = frac.numerator <= max_factor and abs(float(frac) - ratio) < 1e-9 * ratio
+    up, down = frac.numerator, frac.denominator
+
+    if method == 'auto':
+        method = 'polyphase' if rational else 'interp'
+
+    if method == 'average':
+        if not rational or up != 1:
+            raise ValueError("Cannot average-downsample from %gHz to %gHz; the downsample factor is not an integer." % (sample_rate, new_sample_rate))
+        return downsample(data, down, axis=axis)
+    elif method == 'polyphase':
+        if not rational:
+            raise ValueError("Cannot resample from %gHz to %gHz with the polyphase method; the rate ratio is not a rational number with terms <= %d." % (sample_rate, new_sample_rate, max_factor))
+        # extend edges linearly to avoid pulling the ends toward 0
+        return scipy.signal.resample_poly(data, up, down, axis=axis, padtype='line')
+    elif method == 'interp':
+        data = np.moveaxis(data, axis, -1)
+        if ratio < 1:
+            filtered = apply_sos_filter(data, design_filter('bessel', 2, ratio), bidir=True)
+        else:
+            # no antialiasing needed when upsampling
+            filtered = data
+        # fractional sample index of each new sample; same grid as np.arange(t0, t_end, 1/new_sample_rate)
+        n_pts = int(np.ceil((data.shape[-1] - 1) * ratio - 1e-9))
+        x = np.arange(n_pts) / ratio
+        i0 = np.clip(x.astype(int), 0, max(data.shape[-1] - 2, 0))
+        i1 = np.minimum(i0 + 1, data.shape[-1] - 1)
+        f = x - i0
+        resampled = filtered[..., i0] * (1 - f) + filtered[..., i1] * f
+        return np.moveaxis(resampled, -1, axis)
+    else:
+        raise ValueError("Unknown resample method %r" % method)
@@ -3,4 +3,4 @@ from .searchfit import SearchFit
 from .gaussian import Gaussian
 from .sigmoid import Sigmoid
 from .exp import Exp, Exp2
-from .psp import Psp, StackedPsp, PspTrain, Psp2, fit_psp
\ No newline at end of file
+from .psp import Psp, StackedPsp, PspTrain, Psp2, fit_psp, fit_psp_batch
\ No newline at end of file
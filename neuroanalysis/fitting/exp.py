@@ -10,12 +10,25 @@ class Exp(FitModel):
     Parameters are xoffset, yoffset, amp, and tau.
     """
     def __init__(self):
-        FitModel.__init__(self, self.exp, independent_vars=['x'], nan_policy='omit', method='nelder')
+        FitModel.__init__(self, self.exp, jac=self.exp_jac, independent_vars=['x'], nan_policy='omit', method='nelder')
 
     @staticmethod
     def exp(x, xoffset, yoffset, amp, tau):
         return yoffset + amp * np.exp(-(x - xoffset)/tau)
 
+    @staticmethod
+    def exp_jac(x, xoffset, yoffset, amp, tau):
+        """Return a dict of the partial derivatives of exp with respect to each parameter.
+        """
+        xoff = x - xoffset
+        exp = np.exp(-xoff/tau)
+        return {
+            'xoffset': amp * exp / tau,
+            'yoffset': 1.0,
+            'amp': exp,
+            'tau': amp * exp * xoff / tau**2,
+        }
+
     def fit(self, *args, **kwds):
         kwds.setdefault('method', 'nelder')
         return FitModel.fit(self, *args, **kwds)
@@ -30,7 +43,7 @@ class Exp2(FitModel):
 
     """
     def __init__(self):
-        FitModel.__init__(self, self.exp2, independent_vars=['x'])
+        FitModel.__init__(self, self.exp2, jac=self.exp2_jac, independent_vars=['x'])
 
     @staticmethod
     def exp2(x, xoffset, yoffset, amp, tau1, tau2):
@@ -39,3 +52,20 @@ class Exp2(FitModel):
         out[xoff < 0] = yoffset
         return out
 
+    @staticmethod
+    def exp2_jac(x, xoffset, yoffset, amp, tau1, tau2):
+        """Return a dict of the partial derivatives of exp2 with respect to each parameter.
+        """
+        xoff = x - xoffset
+        exp1 = np.exp(-xoff/tau1)
+        exp2 = np.exp(-xoff/tau2)
+        jac = {
+            'xoffset': amp * (exp1 / tau1 - exp2 / tau2),
+            'yoffset': 1.0,
+            'amp': exp1 - exp2,
+            'tau1': amp * exp1 * xoff / tau1**2,
+            'tau2': -amp * exp2 * xoff / tau2**2,
+        }
+        for name in ('xoffset', 'amp', 'tau1', 'tau2'):
+            jac[name][xoff < 0] = 0
+        return jac
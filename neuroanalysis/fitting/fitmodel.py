@@ -3,6 +3,7 @@ from __future__ import print_function, division
 Derived from acq4 and cnmodel code originally developed by Luke Campagnola and Paul B. Manis,
 Univerity of North Carolina at Chapel Hill.
 """
+import functools
 import numpy as np
 import lmfit
 
@@ -49,7 +50,16 @@ class FitModel(lmfit.Model):
                 tau2='tau1 * tau_ratio'         # tau2 is forced to be tau1 * tau_ratio 
             ))
         
+    Subclasses may pass a *jac* function to FitModel.__init__. It takes the same
+    arguments as the model function and returns a dict of the partial derivatives
+    of the model with respect to each parameter. When present, fits that use the
+    default leastsq method are given an analytic Jacobian instead of estimating
+    it by finite differences.
     """
+    def __init__(self, func, jac=None, **kwds):
+        lmfit.Model.__init__(self, func, **kwds)
+        self.jac_func = jac
+
     def fit(self, data, params=None, interactive=False, **kwds):
         """ Return a fit of data to this model.
         
@@ -67,16 +77,80 @@ class FitModel(lmfit.Model):
         if params is None:
             params = {}
         p = self.make_params(**params)
+        if self.jac_func is not None and kwds.get('method', 'leastsq') == 'leastsq':
+            fit_kws = dict(kwds.get('fit_kws') or {})
+            fit_kws.setdefault('Dfun', self._jacobian)
+            kwds['fit_kws'] = fit_kws
         fit = lmfit.Model.fit(self, data, params=p, **kwds)
         if interactive:
             self.show_interactive(fit)
 
-        # monkey-patch some extra GOF metrics:
-        fit.rmse = lambda: self.rmse(fit)
-        fit.nrmse = lambda: self.nrmse(fit)
+        # monkey-patch some extra GOF metrics (partials rather than lambdas so
+        # that results can be pickled back from worker processes):
+        fit.rmse = functools.partial(type(self).rmse, fit)
+        fit.nrmse = functools.partial(type(self).nrmse, fit)
 
         return fit
         
+    # arguments needed to rebuild this model by calling its constructor
+    _init_args = ()
+
+    def __reduce__(self):
+        # lmfit can only pickle model functions by name (or with dill), which fails
+        # for our staticmethods and closures. Subclasses build their model function
+        # in __init__, so pickle them by calling the constructor again instead.
+        if type(self) is FitModel:
+            return (FitModel.__new__, (FitModel,), self.__getstate__())
+        return (type(self), self._init_args)
+
+    def _jacobian(self, params, data, weights, **kwds):
+        """Jacobian of the fit residual with respect to the varying parameters (leastsq *Dfun*).
+        """
+        partials = self.jac_func(**self.make_funcargs(params, kwds))
+        var_names = [name for name,par in params.items() if par.vary and par.expr is None]
+        var_index = {name:i for i,name in enumerate(var_names)}
+        jac = np.zeros((np.size(data), len(var_names)))
+
+        for name,deriv in partials.items():
+            par = params.get(name)
+            if par is None:
+                continue
+            if par.expr is None:
+                if name in var_index:
+                    jac[:, var_index[name]] += deriv
+            else:
+                # chain rule through constrained parameters
+                for var,dp in self._expr_derivatives(params, name, var_names).items():
+                    jac[:, var_index[var]] += deriv * dp
+
+        # residual is (data - model) * weights
+        jac *= -1
+        if weights is not None:
+            jac *= np.asarray(weights).reshape(-1, 1)
+        return jac
+
+    @staticmethod
+    def _expr_derivatives(params, name, var_names):
+        """Return {var: d(name)/d(var)} for a parameter constrained by an expression.
+        """
+        out = {}
+        value = params[name].value
+        for var in var_names:
+            v = params[var].value
+            h = 1e-7 * abs(v) if v != 0 else 1e-7
+            params[var].value = v + h
+            if params[var].value != v + h:
+                # clipped at an upper bound; step the other way
+                h = -h
+                params[var].value = v + h
+            params.update_constraints()
+            dp = (params[name].value - value) / h
+            params[var].value = v
+            params.update_constraints()
+            if dp != 0:
+                out[var] = dp
+        return out
+
     def make_params(self, **params):
         """
         Make parameters used for fitting with this model.
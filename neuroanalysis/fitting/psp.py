@@ -1,6 +1,6 @@
 from __future__ import print_function, division
 
-import sys, json, warnings
+import sys, json, math, time, functools, warnings
 import numpy as np
 import scipy.optimize
 from ..data import Trace
@@ -40,7 +40,7 @@ class Psp(FitModel):
     """
 
     def __init__(self):
-        FitModel.__init__(self, self.psp_func, independent_vars=['x'])
+        FitModel.__init__(self, self.psp_func, jac=self.psp_jac, independent_vars=['x'])
 
     @staticmethod
     def _psp_inner(x, rise, decay, power):
@@ -68,10 +68,96 @@ class Psp(FitModel):
             raise ValueError("Parameters are invalid: xoffset=%f, yoffset=%f, rise_tau=%f, decay_tau=%f, amp=%f, rise_power=%f, isfinite(x)=%s" % (xoffset, yoffset, rise_tau, decay_tau, amp, rise_power, np.all(np.isfinite(x))))
         return output
             
+    @staticmethod
+    def psp_jac(x, xoffset, yoffset, rise_time, decay_tau, amp, rise_power):
+        """Return a dict of the partial derivatives of psp_func with respect to each parameter.
+        """
+        rise_tau = Psp._compute_rise_tau(rise_time, rise_power, decay_tau)
+        max_val = Psp._psp_inner(rise_time, rise_tau, decay_tau, rise_power)
+
+        # rise_tau is defined implicitly by rise_time = rise_tau * log(1 + a / rise_tau), with a = decay_tau * rise_power
+        a = decay_tau * rise_power
+        dh_dtau = np.log(1 + a / rise_tau) - a / (rise_tau + a)
+        dtau_drise = 1.0 / dh_dtau
+        dtau_da = -(rise_tau / (rise_tau + a)) / dh_dtau
+
+        xoff = x - xoffset
+        mask = xoff > 0
+        t = xoff[mask]
+        e = np.exp(-t / rise_tau)
+        one_minus_e = -np.expm1(-t / rise_tau)
+        shape = one_minus_e**rise_power * np.exp(-t / decay_tau) / max_val
+        psp = amp * shape
+
+        # derivatives of log(inner(t) / inner(rise_time)); the rise_time argument of the
+        # denominator drops out because inner has its peak there
+        er = np.exp(-rise_time / rise_tau)
+        dlog_dtau = -rise_power * (t * e / one_minus_e - rise_time * er / -np.expm1(-rise_time / rise_tau)) / rise_tau**2
+        dlog_ddecay = (t - rise_time) / decay_tau**2
+        dlog_dpower = np.log(one_minus_e) - np.log(-np.expm1(-rise_time / rise_tau))
+
+        jac = {'yoffset': 1.0}
+        for name, deriv in [
+                ('xoffset', -psp * (rise_power * e / (rise_tau * one_minus_e) - 1.0 / decay_tau)),
+                ('rise_time', psp * dlog_dtau * dtau_drise),
+                ('decay_tau', psp * (dlog_dtau * dtau_da * rise_power + dlog_ddecay)),
+                ('amp', shape),
+                ('rise_power', psp * (dlog_dtau * dtau_da * decay_tau + dlog_dpower)),
+            ]:
+            jac[name] = np.zeros(xoff.shape)
+            jac[name][mask] = deriv
+        return jac
+
     @staticmethod
     def _compute_rise_tau(rise_time, rise_power, decay_tau):
-        fn = lambda tr: tr * np.log(1 + (decay_tau * rise_power / tr)) - rise_time
-        return scipy.optimize.fsolve(fn, (rise_time,))[0]
+        """Return the rising time constant that gives a peak at *rise_time*.
+
+        Results are memoized in a bounded LRU cache; see rise_tau_cache_info().
+        """
+        return _cached_rise_tau(float(rise_time), float(rise_power), float(decay_tau))
+
+    @staticmethod
+    def rise_tau_cache_info():
+        """Return hits, misses, maxsize and currsize of the rise tau cache (as from functools.lru_cache).
+        """
+        return _cached_rise_tau.cache_info()
+
+    @staticmethod
+    def clear_rise_tau_cache():
+        _cached_rise_tau.cache_clear()
+
+
+# The peak of a psp satisfies  rise_time = rise_tau * log(1 + a / rise_tau)  with a = decay_tau * rise_power.
+# Writing u = a / rise_tau gives  log(1 + u) / u = rise_time / a, which depends only on the ratio r = rise_time / a.
+# We solve for v = log(u) by Newton iteration, starting from a table of log(r) vs v.
+_rise_tau_table_v = np.linspace(-20, 40, 241)
+_rise_tau_table_logr = np.log(np.log1p(np.exp(_rise_tau_table_v))) - _rise_tau_table_v
+
+
+@functools.lru_cache(maxsize=8192)
+def _cached_rise_tau(rise_time, rise_power, decay_tau):
+    a = decay_tau * rise_power
+    if not (rise_time > 0 and a > 0 and rise_time < a):
+        # no solution; keep the old behavior for invalid parameters
+        return _fsolve_rise_tau(rise_time, rise_power, decay_tau)
+    log_r = math.log(rise_time / a)
+    # table is decreasing in v; interp needs increasing x
+    v = float(np.interp(-log_r, -_rise_tau_table_logr, _rise_tau_table_v))
+    for i in range(20):
+        u = math.exp(v)
+        lu = math.log1p(u)
+        err = math.log(lu) - v - log_r
+        slope = u / ((1 + u) * lu) - 1
+        step = err / slope
+        v -= step
+        if abs(step) < 1e-13:
+            return a / math.exp(v)
+    return _fsolve_rise_tau(rise_time, rise_power, decay_tau)
+
+
+def _fsolve_rise_tau(rise_time, rise_power, decay_tau):
+    fn = lambda tr: tr * np.log(1 + (decay_tau * rise_power / tr)) - rise_time
+    return scipy.optimize.fsolve(fn, (rise_time,))[0]
 
 
 class StackedPsp(FitModel):
@@ -81,7 +167,7 @@ class StackedPsp(FitModel):
     which describe the baseline exponential decay.
     """
     def __init__(self):
-        FitModel.__init__(self, self.stacked_psp_func, independent_vars=['x'])
+        FitModel.__init__(self, self.stacked_psp_func, jac=self.stacked_psp_jac, independent_vars=['x'])
     
     @staticmethod
     def stacked_psp_func(x, xoffset, yoffset, rise_time, decay_tau, amp, rise_power, exp_amp, exp_tau):
@@ -90,12 +176,26 @@ class StackedPsp(FitModel):
             exp = exp_amp * np.exp(-(x-xoffset) / exp_tau)
             return exp + Psp.psp_func(x, xoffset, yoffset, rise_time, decay_tau, amp, rise_power)
 
+    @staticmethod
+    def stacked_psp_jac(x, xoffset, yoffset, rise_time, decay_tau, amp, rise_power, exp_amp, exp_tau):
+        """Return a dict of the partial derivatives of stacked_psp_func with respect to each parameter.
+        """
+        jac = Psp.psp_jac(x, xoffset, yoffset, rise_time, decay_tau, amp, rise_power)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")    
+            exp = np.exp(-(x-xoffset) / exp_tau)
+        jac['xoffset'] += exp_amp * exp / exp_tau
+        jac['exp_amp'] = exp
+        jac['exp_tau'] = exp_amp * exp * (x - xoffset) / exp_tau**2
+        return jac
+
 
 class PspTrain(FitModel):
     """A Train of PSPs, all having the same rise/decay kinetics.
     """
     def __init__(self, n_psp):
         self.n_psp = n_psp
+        self._init_args = (n_psp,)
         def fn(*args, **kwds):
             return self.psp_train_func(n_psp, *args, **kwds)
         
@@ -106,26 +206,83 @@ class PspTrain(FitModel):
         for i in range(n_psp):
             fn.argnames.extend(['xoffset%d'%i, 'amp%d'%i])
             fn.kwargs.append(('decay_tau_factor%d'%i, None))
+
+        def jac(*args, **kwds):
+            return self.psp_train_jac(n_psp, *args, **kwds)
         
-        FitModel.__init__(self, fn, independent_vars=['x'])
+        FitModel.__init__(self, fn, jac=jac, independent_vars=['x'])
 
     @staticmethod
     def psp_train_func(n_psp, x, xoffset, yoffset, rise_time, decay_tau, rise_power, **kwds):
         """Paramters are the same as for the single Psp model, with the exception
         that the x offsets and amplitudes of each event must be numbered like
         xoffset0, amp0, xoffset1, amp1, etc.
+
+        All PSPs are accumulated into a single output array. For sorted *x*, each PSP
+        only touches the samples after its onset.
         """
+        x = np.asarray(x)
+        out = np.empty(x.shape, dtype=np.result_type(x.dtype, float))
+        out[:] = yoffset
+        if x.ndim != 1 or np.any(x[1:] < x[:-1]):
+            for i in range(n_psp):
+                tauf = kwds.get('decay_tau_factor%d'%i, 1)
+                out += Psp.psp_func(x, xoffset+kwds['xoffset%d'%i], 0, rise_time, decay_tau*tauf, kwds['amp%d'%i], rise_power)
+            return out
+
+        # scratch buffers reused by every psp
+        buf1 = np.empty(out.shape, out.dtype)
+        buf2 = np.empty(out.shape, out.dtype)
+        kinetics = {}
+        for i in range(n_psp):
+            xoffi = xoffset + kwds['xoffset%d'%i]
+            amp = kwds['amp%d'%i]
+            tau = decay_tau * kwds.get('decay_tau_factor%d'%i, 1)
+            if tau not in kinetics:
+                rise_tau = Psp._compute_rise_tau(rise_time, rise_power, tau)
+                kinetics[tau] = (rise_tau, Psp._psp_inner(rise_time, rise_tau, tau, rise_power))
+            rise_tau, max_val = kinetics[tau]
+
+            start = np.searchsorted(x, xoffi, side='left')
+            n = len(x) - start
+            if n == 0:
+                continue
+            t = np.subtract(x[start:], xoffi, out=buf1[:n])
+            rise = np.multiply(t, -1.0 / rise_tau, out=buf2[:n])
+            np.expm1(rise, out=rise)
+            np.negative(rise, out=rise)
+            if rise_power == 2:
+                np.square(rise, out=rise)
+            else:
+                np.power(rise, rise_power, out=rise)
+            decay = np.multiply(t, -1.0 / tau, out=t)
+            np.exp(decay, out=decay)
+            rise *= decay
+            rise *= amp / max_val
+            out[start:] += rise
+
+        if not np.all(np.isfinite(out)):
+            raise ValueError("Parameters are invalid: xoffset=%f, yoffset=%f, rise_time=%f, decay_tau=%f, rise_power=%f" % (xoffset, yoffset, rise_time, decay_tau, rise_power))
+        return out
+
+    @staticmethod
+    def psp_train_jac(n_psp, x, xoffset, yoffset, rise_time, decay_tau, rise_power, **kwds):
+        """Return a dict of the partial derivatives of psp_train_func with respect to each parameter.
+        """
+        jac = {'yoffset': 1.0, 'xoffset': 0, 'rise_time': 0, 'decay_tau': 0, 'rise_power': 0}
         for i in range(n_psp):
             xoffi = kwds['xoffset%d'%i]
             amp = kwds['amp%d'%i]
             tauf = kwds.get('decay_tau_factor%d'%i, 1)
-            psp = Psp.psp_func(x, xoffset+xoffi, 0, rise_time, decay_tau*tauf, amp, rise_power)
-            if i == 0:
-                tot = psp
-            else:
-                tot += psp
-        
-        return tot + yoffset
+            d = Psp.psp_jac(x, xoffset+xoffi, 0, rise_time, decay_tau*tauf, amp, rise_power)
+            jac['xoffset'] = jac['xoffset'] + d['xoffset']
+            jac['rise_time'] = jac['rise_time'] + d['rise_time']
+            jac['decay_tau'] = jac['decay_tau'] + d['decay_tau'] * tauf
+            jac['rise_power'] = jac['rise_power'] + d['rise_power']
+            jac['xoffset%d'%i] = d['xoffset']
+            jac['amp%d'%i] = d['amp']
+            jac['decay_tau_factor%d'%i] = d['decay_tau'] * decay_tau
+        return jac
 
 
 class Psp2(FitModel):
@@ -156,7 +313,7 @@ class Psp2(FitModel):
         return out
 
 
-def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline_like_psp=False, refine=True, init_params=None, fit_kws=None, ui=None):
+def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline_like_psp=False, refine=True, init_params=None, fit_kws=None, ui=None, executor=None):
     """Fit a Trace instance to a StackedPsp model.
     
     This function is a higher-level interface to StackedPsp.fit:    
@@ -188,6 +345,8 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
         Initial parameter guesses
     fit_kws : dict
         Extra keyword arguments to send to the minimizer
+    executor : concurrent.futures.Executor | None
+        Optional executor used to run the search fits in parallel (see SearchFit)
     
     Returns
     -------
@@ -206,6 +365,74 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
         ui.plt1.addLine(x=search_window[1], pen=0.3)
         prof('plot')
 
+    config = _psp_fit_config(search_window, clamp_mode, sign, exp_baseline, baseline_like_psp, init_params, fit_kws)
+    base_params, amp_max = _psp_base_params(config, data)
+
+    # specify fitting function and set up conditions
+    psp = StackedPsp()
+
+    fit, n_fits = _psp_search(psp, data.time_values, data.data, config, base_params, amp_max, refine, executor=executor, ui=ui, prof=prof)
+    return fit
+
+
+def fit_psp_batch(traces, search_window, clamp_mode, sign=0, exp_baseline=True, baseline_like_psp=False, refine=True, init_params=None, fit_kws=None, executor=None):
+    """Fit many traces to a StackedPsp model using the same settings for each.
+
+    Each trace is fit exactly as by fit_psp, but the model, search grids and fit options are
+    built once and shared by all traces. If an *executor* is given, traces are fit in parallel
+    (one trace per task).
+
+    Parameters
+    ----------
+    traces : list of neuroanalysis.data.TSeries
+        Traces to fit.
+    executor : concurrent.futures.Executor | None
+        Optional executor used to fit traces in parallel.
+
+    All other arguments are the same as for fit_psp.
+
+    Returns
+    -------
+    results : structured array
+        One row per trace, with fields for each StackedPsp parameter plus 'nrmse', 'n_fits'
+        (number of fits run in the search) and 'fit_time' (wall time in seconds spent fitting
+        the trace).
+    """
+    config = _psp_fit_config(search_window, clamp_mode, sign, exp_baseline, baseline_like_psp, init_params, fit_kws)
+    psp = StackedPsp()
+
+    # preprocessing that needs the TSeries (timing, baseline) happens here; workers only see arrays
+    jobs = []
+    for trace in traces:
+        base_params, amp_max = _psp_base_params(config, trace)
+        jobs.append((psp, trace.time_values, trace.data, config, base_params, amp_max, refine))
+
+    if executor is None:
+        rows = [_fit_psp_batch_one(*job) for job in jobs]
+    else:
+        futures = [executor.submit(_fit_psp_batch_one, *job) for job in jobs]
+        rows = [fut.result() for fut in futures]
+
+    fields = psp.param_names + ['nrmse', 'n_fits', 'fit_time']
+    results = np.empty(len(rows), dtype=[(f, int if f == 'n_fits' else float) for f in fields])
+    for i,row in enumerate(rows):
+        results[i] = tuple(row[f] for f in fields)
+    return results
+
+
+def _fit_psp_batch_one(psp, x, y, config, base_params, amp_max, refine):
+    start = time.perf_counter()
+    fit, n_fits = _psp_search(psp, x, y, config, base_params, amp_max, refine)
+    row = fit.best_values.copy()
+    row['nrmse'] = fit.nrmse()
+    row['n_fits'] = n_fits
+    row['fit_time'] = time.perf_counter() - start
+    return row
+
+
+def _psp_fit_config(search_window, clamp_mode, sign, exp_baseline, baseline_like_psp, init_params, fit_kws):
+    """Collect the data-independent settings used by fit_psp.
+    """
     if fit_kws is None:
         fit_kws = {}
     if init_params is None:
@@ -234,26 +461,19 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
     # method = 'L-BFGS-B'
     # fit_kws.setdefault('options', {'maxiter': 100, 'disp': True})
 
-    # take some measurements to help constrain fit
-    data_min = data.data.min()
-    data_max = data.data.max()
-    data_mean = data.mean()
-    
-    baseline_mode = float_mode(data.time_slice(None, search_window[0]).data)
-    
     # set initial conditions depending on whether in voltage or current clamp
     # note that sign of these will automatically be set later on based on the 
     # the *sign* input
     if clamp_mode == 'ic':
         amp_init = init_params.get('amp', .2e-3)
-        amp_max = min(100e-3, 3 * (data_max-data_min))
+        amp_max = 100e-3
         rise_time_init = init_params.get('rise_time', 5e-3)
         decay_tau_init = init_params.get('decay_tau', 50e-3)
         exp_tau_init = init_params.get('exp_tau', 50e-3)
         exp_amp_max = 100e-3
     elif clamp_mode == 'vc':
         amp_init = init_params.get('amp', 20e-12)
-        amp_max = min(500e-12, 3 * (data_max-data_min))
+        amp_max = 500e-12
         rise_time_init = init_params.get('rise_time', 1e-3)
         decay_tau_init = init_params.get('decay_tau', 4e-3)
         exp_tau_init = init_params.get('exp_tau', 4e-3)
@@ -261,27 +481,15 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
     else:
         raise ValueError('clamp_mode must be "ic" or "vc"')
 
-    # Set up amplitude initial values and boundaries depending on whether *sign* are positive or negative
-    if sign == -1:
-        amp = (-amp_init, -amp_max, 0)
-    elif sign == 1:
-        amp = (amp_init, 0, amp_max)
-    elif sign == 0:
-        amp = (0, -amp_max, amp_max)
-    else:
+    if sign not in (-1, 0, 1):
         raise ValueError('sign must be 1, -1, or 0')
-        
+
     # initial condition, lower boundary, upper boundary
     base_params = {
-        'yoffset': (init_params.get('yoffset', baseline_mode), -exp_amp_max, exp_amp_max),
         'rise_time': (rise_time_init, rise_time_init/10., rise_time_init*10.),
         'decay_tau': (decay_tau_init, decay_tau_init/10., decay_tau_init*10.),
         'rise_power': (2, 'fixed'),
-        'amp': amp,
     }
-    
-    # specify fitting function and set up conditions
-    psp = StackedPsp()
     if exp_baseline:
         if baseline_like_psp:
             exp_min = 0 if sign == 1 else -exp_amp_max 
@@ -294,7 +502,73 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
         base_params['exp_amp'] = (0.01 * sign * amp_init, exp_min, exp_max)
     else:
         base_params.update({'exp_amp': (0, 'fixed'), 'exp_tau': (1, 'fixed')})
-    
+
+    # Coarse search xoffset
+    n_xoffset_chunks = max(1, int((search_window[1] - search_window[0]) / 1e-3))
+    xoffset_chunks = np.linspace(search_window[0], search_window[1], n_xoffset_chunks+1)
+    xoffset = [{'xoffset': ((a+b)/2., a, b)} for a,b in zip(xoffset_chunks[:-1], xoffset_chunks[1:])]
+
+    # Search amp / rise time / decay tau to avoid traps
+    rise_time_inits = base_params['rise_time'][0] * 1.2**np.arange(-1,6)
+    rise_time = [{'rise_time': (x,) + base_params['rise_time'][1:]} for x in rise_time_inits]
+
+    decay_tau_inits = base_params['decay_tau'][0] * 2.0**np.arange(-1,2)
+    decay_tau = [{'decay_tau': (x,) + base_params['decay_tau'][1:]} for x in decay_tau_inits]
+
+    return {
+        'search_window': search_window,
+        'sign': sign,
+        'init_params': init_params,
+        'fit_kws': fit_kws,
+        'method': method,
+        'amp_init': amp_init,
+        'amp_max': amp_max,
+        'exp_amp_max': exp_amp_max,
+        'base_params': base_params,
+        'coarse_xoffset': xoffset,
+        'rise_time': rise_time,
+        'decay_tau': decay_tau,
+    }
+
+
+def _psp_base_params(config, data):
+    """Return the fit_psp base parameters and amplitude limit for one trace.
+    """
+    # take some measurements to help constrain fit
+    data_min = data.data.min()
+    data_max = data.data.max()
+    baseline_mode = float_mode(data.time_slice(None, config['search_window'][0]).data)
+
+    amp_init = config['amp_init']
+    amp_max = min(config['amp_max'], 3 * (data_max-data_min))
+    exp_amp_max = config['exp_amp_max']
+
+    # Set up amplitude initial values and boundaries depending on whether *sign* are positive or negative
+    sign = config['sign']
+    if sign == -1:
+        amp = (-amp_init, -amp_max, 0)
+    elif sign == 1:
+        amp = (amp_init, 0, amp_max)
+    else:
+        amp = (0, -amp_max, amp_max)
+
+    base_params = config['base_params'].copy()
+    base_params['yoffset'] = (config['init_params'].get('yoffset', baseline_mode), -exp_amp_max, exp_amp_max)
+    base_params['amp'] = amp
+    return base_params, amp_max
+
+
+def _psp_search(psp, x, y, config, base_params, amp_max, refine, executor=None, ui=None, prof=None):
+    """Run the coarse (and optionally fine) fit_psp searches.
+
+    Returns the best fit and the total number of fits run.
+    """
+    if prof is None:
+        prof = lambda msg: None
+    fit_kws = config['fit_kws']
+    method = config['method']
+    search_window = config['search_window']
+
     # print(clamp_mode, base_params, sign, amp_init)
     
     # if weight is None: #use default weighting
@@ -305,28 +579,23 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
     # fit_kws['weights'] = weight
 
     # Round 1: coarse fit
-
-    # Coarse search xoffset
-    n_xoffset_chunks = max(1, int((search_window[1] - search_window[0]) / 1e-3))
-    xoffset_chunks = np.linspace(search_window[0], search_window[1], n_xoffset_chunks+1)
-    xoffset = [{'xoffset': ((a+b)/2., a, b)} for a,b in zip(xoffset_chunks[:-1], xoffset_chunks[1:])]
-    
     prof('prep for coarse fit')
 
     # Find best coarse fit 
-    search = SearchFit(psp, [xoffset], params=base_params, x=data.time_values, data=data.data, fit_kws=fit_kws, method=method)
+    search = SearchFit(psp, [config['coarse_xoffset']], executor=executor, params=base_params, x=x, data=y, fit_kws=fit_kws, method=method)
     for i,result in enumerate(search.iter_fit()):
         pass
         # prof('  coarse fit iteration %d/%d: %s %s' % (i, len(search), result['param_index'], result['params']))
     fit = search.best_result.best_values
+    n_fits = len(search.results)
     prof("coarse fit done (%d iter)" % len(search))
 
     if ui is not None:
         br = search.best_result
-        ui.plt1.plot(data.time_values, br.best_fit, pen=(0, 255, 0, 100))
+        ui.plt1.plot(x, br.best_fit, pen=(0, 255, 0, 100))
 
     if not refine:
-        return search.best_result
+        return search.best_result, n_fits
 
     # Round 2: fine fit
         
@@ -336,16 +605,9 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
     xoffset_chunks = np.linspace(fine_search_window[0], fine_search_window[1], n_xoffset_chunks + 1)
     xoffset = [{'xoffset': ((a+b)/2., a, b)} for a,b in zip(xoffset_chunks[:-1], xoffset_chunks[1:])]
 
-    # Search amp / rise time / decay tau to avoid traps
-    rise_time_inits = base_params['rise_time'][0] * 1.2**np.arange(-1,6)
-    rise_time = [{'rise_time': (x,) + base_params['rise_time'][1:]} for x in rise_time_inits]
-
-    decay_tau_inits = base_params['decay_tau'][0] * 2.0**np.arange(-1,2)
-    decay_tau = [{'decay_tau': (x,) + base_params['decay_tau'][1:]} for x in decay_tau_inits]
-
     search_params = [
-        rise_time, 
-        decay_tau, 
+        config['rise_time'], 
+        config['decay_tau'], 
         xoffset,
     ]
     
@@ -355,21 +617,23 @@ def fit_psp(data, search_window, clamp_mode, sign=0, exp_baseline=True, baseline
     #     search_params.append(exp_amp)
 
     # if no sign was specified, search from both sides    
-    if sign == 0:
+    if config['sign'] == 0:
+        amp_init = config['amp_init']
         amp = [{'amp': (amp_init, -amp_max, amp_max)}, {'amp': (-amp_init, -amp_max, amp_max)}]
         search_params.append(amp)
 
     prof("prepare for fine fit %r" % base_params)
 
     # Find best fit 
-    search = SearchFit(psp, search_params, params=base_params, x=data.time_values, data=data.data, fit_kws=fit_kws, method=method)
+    search = SearchFit(psp, search_params, executor=executor, params=base_params, x=x, data=y, fit_kws=fit_kws, method=method)
     for i,result in enumerate(search.iter_fit()):
         pass
         prof('  fine fit iteration %d/%d: %s %s' % (i, len(search), result['param_index'], result['params']))
     fit = search.best_result
+    n_fits += len(search.results)
     prof('fine fit done (%d iter)' % len(search))
 
-    return fit
+    return fit, n_fits
 
 
 class PspFitTestCase(DataTestCase):
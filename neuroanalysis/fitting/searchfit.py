@@ -1,3 +1,5 @@
+import hashlib, pickle
+import concurrent.futures
 import numpy as np
 
 
@@ -14,6 +16,14 @@ class SearchFit(object):
         Structure that describes the space of fit parameters to search. Each item is a list representing one
         _dimension_ of the parameter space, and the items in a dimension are dictionaries used to modify
         the *params* argument to model.fit().
+    executor : concurrent.futures.Executor | None
+        Optional executor used to run fits in parallel. With a ThreadPoolExecutor the model is shared
+        between threads; with any other executor (e.g. ProcessPoolExecutor) the model and fit arguments
+        are pickled once and cached in each worker, so only the per-fit parameters are sent per task.
+    target_nrmse : float | None
+        If given, stop searching as soon as a fit (in parameter space order) reaches an NRMSE
+        at or below this value. Fits later in the search order are cancelled or discarded, so the
+        results are the same whether or not an executor is used.
     kwds : keyword arguments
         Default keyword arguments to use when calling model.fit(). These may be overridden by items in 
         *parameter_space*.
@@ -34,18 +44,26 @@ class SearchFit(object):
         
         search = SearchFit(model, [amp, xoffset], params={'sigma': (50, 1, 500), 'yoffset': 0}, data=y)
         best = search.best_result
+
+    The same search run on 4 worker processes::
+
+        with concurrent.futures.ProcessPoolExecutor(4) as pool:
+            search = SearchFit(model, [amp, xoffset], executor=pool, params={'sigma': (50, 1, 500), 'yoffset': 0}, data=y)
+            best = search.best_result
     
     """
-    def __init__(self, model, parameter_space, **kwds):
+    def __init__(self, model, parameter_space, executor=None, target_nrmse=None, **kwds):
         self.model = model
         self.parameter_space = parameter_space
+        self.executor = executor
+        self.target_nrmse = target_nrmse
         self.kwds = kwds
         self.kwds.setdefault('params', {})
 
         # list of indices to iterate over complete parameter space
         slices = tuple([slice(0, len(p)) for p in self.parameter_space])
         all_inds = np.mgrid[slices]
-        self.all_inds = all_inds.reshape(all_inds.shape[0], np.product(all_inds.shape[1:])).T
+        self.all_inds = all_inds.reshape(all_inds.shape[0], np.prod(all_inds.shape[1:])).T
         
         self.results = None
         self._best_index = None
@@ -57,31 +75,83 @@ class SearchFit(object):
                 pass
             
         if self._best_index is None:
-            all_nrmse = [result['result'].nrmse() for result in self.results]
-            self._best_index = np.argmin(all_nrmse)
+            # lowest nrmse wins; NaN never wins and ties go to the earliest point in the search
+            all_nrmse = np.array([result['nrmse'] for result in self.results], dtype=float)
+            all_nrmse[np.isnan(all_nrmse)] = np.inf
+            self._best_index = int(np.argmin(all_nrmse))
             
         return self.results[self._best_index]['result']
 
     def iter_fit(self):
         """Generator that yields results from fitting each point in the parameter space.
+
+        Results are always yielded in parameter space order, even when fits are run on an executor.
         """
         self.results = []
+        self._best_index = None
         assert len(self.all_inds) > 0, "No parameters to search"
-        for i,inds in enumerate(self.all_inds):
-            params = {}
-            for j,ind in enumerate(inds):
-                params.update(self.parameter_space[j][ind])
-            result = self.fit_one(params)
-            result = {'param_index': inds, 'params': params, 'result': result}
-            self.results.append(result)
-            yield result
-        
+        all_params = [self.point_params(inds) for inds in self.all_inds]
+
+        if self.executor is None:
+            fits = (self.fit_one(params) for params in all_params)
+            futures = []
+        else:
+            futures = self._submit(all_params)
+            fits = (fut.result() for fut in futures)
+
+        try:
+            for inds, params, fit in zip(self.all_inds, all_params, fits):
+                nrmse = fit.nrmse()
+                result = {'param_index': inds, 'params': params, 'result': fit, 'nrmse': nrmse}
+                self.results.append(result)
+                yield result
+                if self.target_nrmse is not None and nrmse <= self.target_nrmse:
+                    break
+        finally:
+            # don't leave unneeded fits queued on the executor
+            for fut in futures:
+                fut.cancel()
+
+    def point_params(self, inds):
+        """Return the fit parameters for one point in the parameter space, given its index in each dimension.
+        """
+        params = {}
+        for j,ind in enumerate(inds):
+            params.update(self.parameter_space[j][ind])
+        return params
+
     def fit_one(self, params):
-        kwds = self.kwds.copy()
-        kwds['params'] = kwds['params'].copy()
-        kwds['params'].update(params)
-        result = self.model.fit(**kwds)
-        return result
+        return _fit_one(self.model, self.kwds, params)
+
+    def _submit(self, all_params):
+        if isinstance(self.executor, concurrent.futures.ThreadPoolExecutor):
+            return [self.executor.submit(self.fit_one, params) for params in all_params]
+
+        # serialize the model and data once; workers cache the unpickled job by its hash
+        job = pickle.dumps((self.model, self.kwds), protocol=pickle.HIGHEST_PROTOCOL)
+        key = hashlib.sha1(job).hexdigest()
+        return [self.executor.submit(_fit_one_cached, key, job, params) for params in all_params]
         
     def __len__(self):
-        return len(self.all_inds)
\ No newline at end of file
+        return len(self.all_inds)
+
+
+def _fit_one(model, kwds, params):
+    kwds = kwds.copy()
+    kwds['params'] = kwds['params'].copy()
+    kwds['params'].update(params)
+    return model.fit(**kwds)
+
+
+# per-process cache of unpickled (model, kwds) jobs, keyed by the hash of their pickle
+_job_cache = {}
+_job_cache_size = 4
+
+
+def _fit_one_cached(key, job, params):
+    if key not in _job_cache:
+        while len(_job_cache) >= _job_cache_size:
+            _job_cache.pop(next(iter(_job_cache)))
+        _job_cache[key] = pickle.loads(job)
+    model, kwds = _job_cache[key]
+    return _fit_one(model, kwds, params)
@@ -220,18 +220,38 @@ class MiesNwb(Dataset):
         self.close()
 
     @staticmethod
-    def pack_sweep_data(sweeps):
+    def pack_sweep_data(sweeps, devices=None):
         """Return a single array containing all data from a list of sweeps.
         
         The array shape is (sweeps, channels, samples, 2), where the final axis
         contains recorded data at index 0 and the stimulus at index 1.
 
+        If *devices* is given, only those devices are included (in that order); otherwise
+        all devices of the first sweep are used.
         All sweeps must have the same length and number of channels.
+
+        Data are read from the hdf5 file directly into the returned array.
         """
-        sweeps = [s.data() for s in sweeps]
-        data = np.empty((len(sweeps),) + sweeps[0].shape, dtype=sweeps[0].dtype)
-        for i in range(len(sweeps)):
-            data[i] = sweeps[i]
+        if devices is None:
+            devices = sweeps[0].devices
+        ts = sweeps[0][devices[0]]['primary']
+        n_samples = ts.shape[0]
+        data = np.empty((len(sweeps), len(devices), n_samples, 2), dtype=np.float64)
+        for i,sweep in enumerate(sweeps):
+            for j,dev in enumerate(devices):
+                for k,chan in enumerate(('primary', 'command')):
+                    ts = sweep[dev][chan]
+                    if ts._data is not None:
+                        data[i, j, :, k] = ts._data
+                        continue
+                    dset, scale, offset = ts.hdf_source()
+                    if dset.shape[0] != n_samples:
+                        raise ValueError("All sweeps must have the same length (%d != %d)" % (dset.shape[0], n_samples))
+                    dset.read_direct(data, dest_sel=np.s_[i, j, :, k])
+                    out = data[i, j, :, k]
+                    out *= scale
+                    if offset is not None:
+                        out += offset
         return data
 
     @staticmethod
@@ -282,24 +302,33 @@ class MiesTSeries(TSeries):
     @property
     def data(self):
         if self._data is None:
-            rec = self.recording
-            chan = self.channel_id
-            if chan == 'primary':
-                scale = 1e-12 if rec.clamp_mode == 'vc' else 1e-3
-                self._data = np.array(rec.primary_hdf) * scale
-            elif chan == 'command':
-                scale = 1e-3 if rec.clamp_mode == 'vc' else 1e-12
-                # command values are stored _without_ holding, so we add
-                # that back in here.
-                offset = rec.holding_potential if rec.clamp_mode == 'vc' else rec.holding_current
-                if offset is None:
-                    exc = Exception("Holding value unknown for this recording; cannot generate command data.")
-                    # Mark this exception so it can be ignored in specific places
-                    exc._ignorable_bug_flag = True
-                    raise exc
-                self._data = (np.array(rec.command_hdf) * scale) + offset
+            dset, scale, offset = self.hdf_source()
+            self._data = np.array(dset) * scale
+            if offset is not None:
+                self._data += offset
 
         return self._data
+
+    def hdf_source(self):
+        """Return the hdf5 dataset holding this channel, along with the scale and offset (or None)
+        that convert its values to SI units.
+        """
+        rec = self.recording
+        chan = self.channel_id
+        if chan == 'primary':
+            scale = 1e-12 if rec.clamp_mode == 'vc' else 1e-3
+            return rec.primary_hdf, scale, None
+        elif chan == 'command':
+            scale = 1e-3 if rec.clamp_mode == 'vc' else 1e-12
+            # command values are stored _without_ holding, so we add
+            # that back in here.
+            offset = rec.holding_potential if rec.clamp_mode == 'vc' else rec.holding_current
+            if offset is None:
+                exc = Exception("Holding value unknown for this recording; cannot generate command data.")
+                # Mark this exception so it can be ignored in specific places
+                exc._ignorable_bug_flag = True
+                raise exc
+            return rec.command_hdf, scale, offset
     
     @property
     def shape(self):
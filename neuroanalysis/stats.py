@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import scipy.optimize
 import scipy.stats
@@ -104,25 +105,50 @@ def ragged_mean(arrays, method='clip'):
         If "clip", then the arrays are truncated to the minimum length.
         If "pad", then the arrays are all padded to the maximum length with NaN.
     """
+    # Stack into one array and return the nanmean
+    return np.nanmean(ragged_stack(arrays, method=method), axis=0)
+
+
+def ragged_stack(arrays, method='clip', offsets=None):
+    """Stack a list of 1D arrays of different lengths into a single 2D array with one row per array.
+
+    The output array is allocated once and each input is copied into its row.
+
+    Parameters
+    ----------
+    arrays : list
+        A list of 1D arrays.
+    method : "clip" | "pad"
+        If "clip", the output covers only the range where all arrays have values.
+        If "pad", the output covers the range where any array has values, and missing
+        values are filled with NaN.
+    offsets : list of int | None
+        Position of the first element of each array on a common axis; arrays are aligned on
+        this axis before stacking. By default all arrays start at 0. Column 0 of the output
+        corresponds to ``max(offsets)`` ("clip") or ``min(offsets)`` ("pad").
+    """
     assert len(arrays) > 0
-    arrays = arrays[:]
-    
+    lens = np.array([len(a) for a in arrays])
+    offsets = np.zeros(len(arrays), dtype=int) if offsets is None else np.asarray(offsets, dtype=int)
+    dtype = functools.reduce(np.promote_types, set(np.asarray(a).dtype for a in arrays))
+
     if method == 'pad':
-        # Pad all arrays with nan until we have a rectangular array
-        max_len = max([len(a) for a in arrays])
-        for j,arr in enumerate(arrays):
-            if len(arr) < max_len:
-                arrays[j] = np.empty(max_len, dtype=arr.dtype)
-                arrays[j][:len(arr)] = arr
-                arrays[j][len(arr):] = np.nan
+        start, stop = offsets.min(), (offsets + lens).max()
+        # pad values with NaN (promotes ints to float)
+        out = np.full((len(arrays), stop - start), np.nan, dtype=np.result_type(dtype, np.float32))
     elif method == 'clip':
-        min_len = min([len(a) for a in arrays])
-        arrays = [arr[:min_len] for arr in arrays]
+        start, stop = offsets.max(), (offsets + lens).min()
+        out = np.empty((len(arrays), max(stop - start, 0)), dtype=dtype)
     else:
         raise ValueError("method must be 'pad' or 'clip'")
-            
-    # Stack into one array and return the nanmean
-    return np.nanmean(np.vstack(arrays), axis=0)
+
+    n = out.shape[1]
+    for i, arr in enumerate(arrays):
+        i0 = start - offsets[i]  # index in arr of output column 0
+        src0, src1 = max(i0, 0), min(i0 + n, len(arr))
+        if src1 > src0:
+            out[i, src0-i0:src1-i0] = arr[src0:src1]
+    return out
 
 
 def weighted_std(values, weights):
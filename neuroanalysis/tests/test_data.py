@@ -1,7 +1,13 @@
 from pytest import raises
+import copy
+import pickle
 import numpy as np
 
-from neuroanalysis.data import TSeries
+from neuroanalysis.data import Container, Dataset, SyncRecording, Recording, TSeries, TSeriesList
+from neuroanalysis.data.dataset import TSeriesBatch
+from neuroanalysis.filter import bessel_filter, resample
+from neuroanalysis.stats import ragged_mean, ragged_stack
+from neuroanalysis.data.loaders.loaders import DatasetLoader, TSeriesDataCache
 
 
 def test_trace_timing():
@@ -163,3 +169,354 @@ def check_timing(tr, data, time_values, has_timing, has_time_values, regularly_s
     assert np.all(tr.value_at(tr.time_at(indices)) == tr.data)
     assert np.all(tr.index_at(tr.time_at(indices)) == indices)
 
+
+
+class CountingLoader(DatasetLoader):
+    def __init__(self, data_cache):
+        self.data_cache = data_cache
+        self.loads = 0
+
+    def get_tseries_data(self, tseries):
+        self.loads += 1
+        return np.ones(1000) * tseries.meta['value']
+
+
+def test_data_cache():
+    cache = TSeriesDataCache(max_bytes=3 * 8000)
+    loader = CountingLoader(cache)
+    traces = [TSeries(dt=1, loader=loader, value=i) for i in range(5)]
+
+    for ts in traces:
+        assert ts.data[0] == ts.meta['value']
+    info = cache.info()
+    assert (info.misses, info.hits, info.evictions, info.count, info.nbytes) == (5, 0, 2, 3, 24000)
+
+    # most recently used traces are still cached; evicted ones are reloaded
+    traces[4].data
+    assert cache.info().hits == 1 and loader.loads == 5
+    assert traces[0].data[0] == 0
+    assert loader.loads == 6 and cache.peek(traces[2]) is None
+
+    # pinned traces survive eviction
+    with cache.pinned(traces[1]):
+        for ts in traces:
+            ts.data
+        assert cache.peek(traces[1]) is not None
+        assert cache.info().pinned == 1
+    assert cache.info().pinned == 0
+    assert cache.info().nbytes <= cache.max_bytes
+
+    # chunks come from the cache when the data are already loaded
+    chunks = list(traces[4].iter_chunks(300))
+    assert loader.loads == cache.info().misses
+    assert sum(len(c) for c in chunks) == 1000
+
+    cache.clear()
+    assert cache.info().count == 0
+
+    # cached arrays are read-only; in-place operators move the data out of the cache
+    cache = TSeriesDataCache(max_bytes=1000)
+    loader = CountingLoader(cache)
+    a, b = [TSeries(dt=1, loader=loader, value=i) for i in range(2)]
+    with raises(ValueError):
+        a.data[:] = 5
+    a += 5
+    b.data
+    assert cache.peek(a) is None and np.all(a.data == 5)
+
+
+class WindowLoader(DatasetLoader):
+    """Serves only the requested sample ranges and records them.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def get_tseries_data(self, tseries):
+        raise AssertionError("complete data array was requested")
+
+    def get_tseries_data_chunk(self, tseries, start, stop):
+        self.reads.append((start, stop))
+        return self.data[start:stop]
+
+    def get_tseries_shape(self, tseries):
+        return self.data.shape
+
+
+def test_lazy_view():
+    data = np.arange(10000) * 0.5
+    loader = WindowLoader(data)
+    ts = TSeries(dt=1e-4, t0=1.0, loader=loader, channel_id='primary')
+    rec = Recording(channels={'primary': ts})
+
+    view = rec.time_slice(1.1, 1.2)['primary']
+    assert loader.reads == []
+    assert len(view) == 1000
+    assert view.t0 == 1.1
+    assert view.time_at(10) == 1.1 + 10e-4
+    assert loader.reads == []
+    assert np.all(view.data == data[1000:2000])
+    assert loader.reads == [(1000, 2000)]
+
+    # views of views read only their own window from the original trace
+    inner = ts[1000:2000][100:150][10:20]
+    assert np.all(inner.data == data[1110:1120])
+    assert loader.reads[-1] == (1110, 1120)
+
+    # views of loaded data are sliced from memory
+    n_reads = len(loader.reads)
+    assert np.all(view[100:150][10:20].data == data[1110:1120])
+    assert len(loader.reads) == n_reads
+    assert inner.source_indices == (1110, 1120)
+    assert np.allclose(inner.time_values, 1.1 + np.arange(110, 120) * 1e-4)
+
+    # slices past the end are truncated
+    assert np.all(ts[9990:20000].data == data[9990:])
+
+    # lazily read windows are read-only; views of loaded data write through
+    with raises(ValueError):
+        view.data[:] = 0
+    view += 1
+    assert np.all(view.data == data[1000:2000] + 1)
+    ts = TSeries(data.copy(), dt=1e-4)
+    ts[10:20].data[:] = 0
+    assert np.all(ts.data[10:20] == 0)
+
+
+class TreeLoader(DatasetLoader):
+    """Builds sweeps with two recordings each and counts get_recordings calls.
+    """
+    def __init__(self, n_sweeps):
+        self.n_sweeps = n_sweeps
+        self.loaded = []
+
+    def get_sync_recordings(self, dataset):
+        return [SyncRecording(parent=dataset, key=i, loader=self) for i in range(self.n_sweeps)]
+
+    def get_recordings(self, sync_rec):
+        self.loaded.append(sync_rec.key)
+        recs = {}
+        for dev in (0, 1):
+            recs[dev] = Recording(channels={'primary': TSeries(np.zeros(10), dt=1)}, device_id=dev, sync_recording=sync_rec)
+        return recs
+
+
+def test_find():
+    loader = TreeLoader(5)
+    dataset = Dataset(loader=loader)
+    assert len(dataset.all_sync_recordings) == 5
+    assert loader.loaded == []
+
+    # generator traversal only loads sweeps as they are reached
+    recs = dataset.iter_find(Recording)
+    assert [next(recs).sync_recording.key for i in range(3)] == [0, 0, 1]
+    assert loader.loaded == [0, 1]
+
+    traces = dataset.all_traces
+    assert len(traces) == 10
+    assert loader.loaded == [0, 1, 2, 3, 4]
+    assert dataset.all_traces == traces
+    assert dataset.all_traces is not dataset.all_traces
+    assert loader.loaded == [0, 1, 2, 3, 4]
+
+    # same objects and order as a full walk of the tree
+    assert dataset.find(Container) == dataset.all_children
+    assert dataset.find(Recording) == [c for c in dataset.all_children if isinstance(c, Recording)]
+    srec = dataset.contents[2]
+    assert srec.find(Recording) == srec.recordings
+
+
+def test_compact_tseries():
+    data = np.random.normal(size=1000)
+    ts = TSeries(data, dt=1e-3, t0=0.5, units='V')
+    view = ts[100:200]
+    assert not hasattr(ts, '__dict__') and not hasattr(view, '__dict__')
+    assert ts._extra_meta is None
+
+    # metadata is stored sparsely but still behaves like a dict
+    assert ts.meta['units'] == 'V' and ts.meta['sample_rate'] is None
+    assert list(ts.meta.keys()) == ['start_time', 'dt', 't0', 'sample_rate', 'units', 'channel_id']
+    ts.meta['pulse_n'] = 3
+    ts.update_meta(units='A')
+    assert ts.units == 'A' and ts.meta['pulse_n'] == 3
+    assert ts[10:20].meta['pulse_n'] == 3
+    assert ts.copy().meta['pulse_n'] == 3
+    assert 'pulse_n' not in view.meta
+
+    # interpolation without time values matches numpy.interp over generated time values
+    t = np.array([0.4, 0.5, 0.6004, 0.6, 0.75, 1.4993, 2.0])
+    assert np.allclose(view.value_at(t), np.interp(t, view.time_values, view.data))
+    assert np.isclose(view.value_at(0.6004), np.interp(0.6004, view.time_values, view.data))
+    assert view.value_at(0.601) == view.data[1]
+    assert view.time_values is not view.time_values
+
+
+def test_tseries_pickle_copy():
+    rec = Recording(device_id=1)
+    ts = TSeries(np.arange(10.), dt=1e-3, t0=0.5, units='V', recording=rec, pulse_n=3)
+    rec = Recording(channels={'primary': ts}, device_id=2)
+    view = ts[2:6]
+
+    for dup in (lambda x: pickle.loads(pickle.dumps(x)), copy.copy, copy.deepcopy):
+        ts2 = dup(ts)
+        assert type(ts2) is TSeries and np.all(ts2.data == ts.data)
+        assert ts2.meta == ts.meta and ts2.t0 == 0.5 and ts2.recording.device_id == 1
+
+        view2 = dup(view)
+        assert type(view2) is type(view) and np.all(view2.data == view.data)
+        assert np.all(view2.time_values == view.time_values) and view2.source_indices == (2, 6)
+
+        rec2 = dup(rec)
+        assert rec2.device_id == 2 and rec2['primary'].recording.device_id == 1
+        assert np.all(rec2['primary'].data == ts.data) and rec2['primary'].meta['pulse_n'] == 3
+
+
+def test_copy_on_write():
+    data = np.arange(10.)
+    ts = TSeries(data, time_values=np.linspace(0, 1, 10))
+    # plain copies are independent and writable
+    c = ts.copy()
+    c.data[:5] = 1
+    c.time_values[0] = -1
+    assert np.all(ts.data == np.arange(10)) and ts.time_values[0] == 0
+
+    # copies with new data (and views of them) share the time values until they are accessed
+    c = ts.copy(data=data * 2)
+    d = (c * 2)[2:8]
+    assert c._time_values is ts._time_values and np.shares_memory(d._time_values, ts._time_values)
+    c.time_values[0] = 1
+    d.time_values[0] = 1
+    assert ts.time_values[0] == 0 and ts.time_values[2] > 0
+    assert c.time_values[0] == 1 and (c * 2).time_values[0] == 1
+
+    # shared copies are read-only views
+    c = ts.copy(share=True, units='V')
+    assert np.shares_memory(c.data, data) and np.shares_memory(c.time_values, ts.time_values)
+    with raises(ValueError):
+        c.data[0] = 1
+
+    # in-place operators give the copy its own buffer, then work in place
+    c += 1
+    assert not np.shares_memory(c.data, data)
+    assert np.all(ts.data == np.arange(10)) and np.all(c.data == np.arange(10) + 1)
+    buf = c.data
+    c *= 2
+    c -= ts
+    c /= 2
+    assert c.data is buf
+    assert np.allclose(c.data, (np.arange(10) + 2) / 2)
+
+    # operators and out= variants
+    out = np.empty(10)
+    r = ts.multiply(3, out=out)
+    assert r.data is out and np.all(out == np.arange(10) * 3)
+    assert ts.subtract(ts, out=c) is c and np.all(c.data == 0)
+    assert np.all((ts - 1).data == np.arange(10) - 1)
+    assert np.all(ts.data == np.arange(10))
+
+    # views share the buffer they were sliced from; int data are upcast when needed
+    ts = TSeries(np.zeros(10, dtype=int), dt=1)
+    view = ts[2:4]
+    ts += 1
+    assert np.all(view.data == 1)
+    ts *= 0.5
+    assert ts.data.dtype == float and np.all(ts.data == 0.5)
+
+
+def test_tseries_batch():
+    data = [np.random.normal(size=n) for n in (100, 120, 90)]
+    traces = TSeriesList([
+        TSeries(data[0], dt=1e-3, t0=0),
+        TSeries(data[1], dt=1e-3, t0=-0.01),
+        TSeries(data[2], dt=1e-3, t0=0.005),
+    ])
+
+    # clipped mean covers only the range shared by all traces
+    avg = traces.mean()
+    assert avg.t0 == 0.005 and len(avg) == 90 and avg.meta['mean_of_n'] == 3
+    expected = (data[0][5:95] + data[1][15:105] + data[2][:90]) / 3
+    assert np.allclose(avg.data, expected)
+
+    # traces with only time values are averaged on the batch timing
+    t = np.arange(10) * 0.1
+    avg = TSeriesList([TSeries(np.arange(10.), time_values=t, units='V'), TSeries(np.arange(10.), time_values=t + 0.2)]).mean()
+    assert len(avg) == 8 and not avg.has_time_values and np.isclose(avg.t0, 0.2)
+    assert np.allclose(avg.data, np.arange(1, 9)) and avg.units == 'V'
+
+    # padded batch covers all traces, with NaN where a trace has no data
+    batch = traces.to_batch()
+    assert batch.shape == (3, 120) and batch.t0 == -0.01
+    assert np.all(np.isnan(batch.data[0, :10])) and np.all(batch.data[0, 10:110] == data[0])
+    assert np.all(batch.count()[:10] == 1) and np.all(batch.count()[15:105] == 3)
+    assert np.allclose(batch.mean().data[15:105], expected)
+    assert np.isclose(batch.time_values[10], 0)
+    assert np.all(batch[2].data[15:105] == data[2])
+    assert batch[1:].shape == (2, 120) and len(batch.to_list()) == 3
+
+    stack = np.vstack([data[0][5:95], data[1][15:105], data[2][:90]])
+    clipped = traces.to_batch(align='clip')
+    assert np.allclose(clipped.median().data, np.median(stack, axis=0))
+    assert np.allclose(clipped.std().data, np.std(stack, axis=0))
+    p = clipped.percentile([10, 90])
+    assert len(p) == 2 and np.allclose(p[1].data, np.percentile(stack, 90, axis=0))
+
+    # filters operate on all traces at once
+    filtered = bessel_filter(clipped, 100.)
+    for i, tr in enumerate(clipped):
+        assert np.allclose(filtered[i].data, bessel_filter(tr, 100.).data)
+
+    # traces are resampled to the lowest rate
+    mixed = TSeriesBatch.from_traces([TSeries(np.ones(200), dt=5e-4), TSeries(np.ones(100), dt=1e-3)])
+    assert mixed.shape == (2, 100) and mixed.dt == 1e-3
+
+
+def test_ragged_stack():
+    arrays = [np.arange(5), np.arange(3), np.arange(4.)]
+    assert np.all(ragged_stack(arrays) == [[0, 1, 2], [0, 1, 2], [0, 1, 2]])
+    padded = ragged_stack(arrays, method='pad')
+    assert padded.shape == (3, 5) and np.isnan(padded[1, 3])
+    assert np.allclose(ragged_mean(arrays, method='pad'), [0, 1, 2, 3, 4])
+
+    # offsets align arrays on a common axis
+    stacked = ragged_stack([np.arange(5), np.arange(5)], method='pad', offsets=[0, 2])
+    assert np.all(stacked[1, 2:] == [0, 1, 2, 3, 4]) and np.isnan(stacked[0, 5])
+    assert np.all(ragged_stack([np.arange(5), np.arange(5)], offsets=[0, 2]) == [[2, 3, 4], [0, 1, 2]])
+
+
+def test_resample():
+    t = np.arange(50000) / 50000.
+    sine = np.sin(2 * np.pi * 100 * t)
+    ts = TSeries(sine, sample_rate=50000., t0=1.0)
+
+    # rational ratios use polyphase filtering; low frequencies pass unchanged
+    for sr in [10000., 20000., 100000.]:
+        rs = ts.resample(sr)
+        assert rs.sample_rate == sr and rs.t0 == 1.0
+        assert len(rs) == int(np.ceil(len(ts) * sr / 50000.))
+        expected = np.sin(2 * np.pi * 100 * (rs.time_values - 1.0))
+        assert np.allclose(rs.data[100:-100], expected[100:-100], atol=1e-3)
+        assert np.allclose(rs.data, expected, atol=0.02)
+    assert ts.resample(50000.) is ts
+
+    # arbitrary ratios fall back to Bessel filtering + interpolation
+    rs = ts.resample(12345.)
+    assert len(rs) == len(np.arange(ts.t0, ts.t_end, 1 / 12345.))
+    assert np.allclose(rs.data[100:-100], np.sin(2 * np.pi * 100 * (rs.time_values[100:-100] - 1.0)), atol=0.02)
+
+    # averaging is available for integer factors; dt-based and time-value timing is preserved
+    avg = TSeries(sine, dt=2e-5).resample(10000., method='average')
+    assert avg.dt == 1e-4 and np.all(avg.data == sine.reshape(-1, 5).mean(axis=1))
+    with raises(ValueError):
+        ts.resample(20000., method='average')
+    tv = TSeries(sine[:1000], time_values=t[:1000] + 2).resample(25000.)
+    assert tv.t0 == 2 and np.isclose(tv.dt, 4e-5)
+
+    # 2D data are resampled along the last axis
+    data = np.random.normal(size=(3, 1000))
+    batch = TSeriesBatch(data, sample_rate=50000.)
+    for sr in [10000., 20000., 12345.]:
+        rb = batch.resample(sr)
+        assert rb.sample_rate == sr
+        for i in range(3):
+            assert np.allclose(rb.data[i], TSeries(data[i], sample_rate=50000.).resample(sr).data)
+    assert np.allclose(resample(data.T, 50000., 20000., axis=0), resample(data, 50000., 20000.).T)
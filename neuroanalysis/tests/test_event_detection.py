@@ -1,8 +1,9 @@
 from pytest import raises
 import numpy as np
 
-from neuroanalysis.data import TSeries
-from neuroanalysis.event_detection import threshold_events
+from neuroanalysis.data import TSeries, TSeriesList
+from neuroanalysis.data.loaders.loaders import DatasetLoader
+from neuroanalysis.event_detection import threshold_events, zero_crossing_events, exp_deconvolve, exp_reconvolve, iter_events, iter_exp_deconvolve, clements_bekkers
 
 dtype = [
     ('index', int),
@@ -57,7 +58,146 @@ def test_threshold_events():
     check_events(threshold_events(d, 1), empty_result)
     expected = np.array([(0, 10, 60., 6., 0, 0., 1., 5.4, 0.)], dtype=dtype)
     check_events(threshold_events(d, 1, omit_ends=False), expected)
-    
+
+    # signal jumps directly from one side of threshold to the other
+    d.data[:] = 0
+    d.data[3:5] = 6
+    d.data[5:7] = -6
+    expected = np.array([
+        (3, 2,  12.,  6., 3, 0.3, 0.2,  0.6, 0.3),
+        (5, 2, -12., -6., 5, 0.5, 0.2, -0.6, 0.5)],
+        dtype=dtype
+    )
+    check_events(threshold_events(d, 1, adjust_times=False), expected)
+
+    # no timing information
+    d = TSeries(np.zeros(10))
+    d.data[5:7] = 6
+    ev = threshold_events(d, 1)
+    assert len(ev) == 1
+    assert ev[0]['index'] == 5
+    assert np.isnan(ev[0]['time'])
+    assert np.isnan(ev[0]['area'])
+
+
+def test_zero_crossing_events():
+    d = np.array([-1, -1, -1, -1, 1, 2, 3, 2, 1, -1, -1, -1, -1], dtype=float)
+    ev = zero_crossing_events(d, min_length=3)
+    assert list(ev['index']) == [4, 9]
+    assert list(ev['len']) == [5, 5]
+    assert list(ev['sum']) == [9, -4]
+    assert list(ev['peak']) == [3, -1]
+
+    ev = zero_crossing_events(TSeries(d, dt=0.1), min_length=3, min_peak=2)
+    assert list(ev['index']) == [4]
+    assert np.allclose(ev['time'], [0.4])
+
+    # noise rejection based on gaussian fit to the distribution of event sums
+    rng = np.random.RandomState(0)
+    d = np.convolve(rng.normal(size=100000), np.ones(5) / 5., mode='same')
+    onsets = np.arange(1000, 100000, 4000)
+    for i in onsets:
+        d[i:i+100] += 2
+    all_events = zero_crossing_events(d)
+    events = zero_crossing_events(d, noise_threshold=4)
+    assert len(events) < len(all_events) / 10
+    for i in onsets:
+        assert np.any(abs(events['index'] - i) < 10)
+
+
+def test_clements_bekkers():
+    rng = np.random.RandomState(0)
+    t = np.arange(200)
+    templates = np.array([np.exp(-t / decay) - np.exp(-t / rise) for rise, decay in [(2, 20), (5, 50)]])
+    data = rng.normal(scale=0.05, size=20000)
+    onsets = [1000, 5000, 12000]
+    for i in onsets:
+        data[i:i+200] += 3 * templates[1] + 1
+
+    dc, scale, offset = clements_bekkers(data, templates)
+    assert dc.shape == scale.shape == offset.shape == (2, len(data) - 199)
+    for i in onsets:
+        assert abs(np.argmax(dc[1, i-100:i+100]) - 100) < 2
+        assert np.allclose(scale[1, i], 3, rtol=0.05)
+        assert np.allclose(offset[1, i], 1, atol=0.05)
+
+    # batched and single-template results agree for all correlation methods
+    for method in ('direct', 'fft', 'oa'):
+        for j in range(2):
+            single = clements_bekkers(data, templates[j], method=method)
+            for a, b in zip(single, (dc[j], scale[j], offset[j])):
+                assert a.shape == b.shape
+                assert np.allclose(a, b)
+
+
+def test_exp_reconvolve():
+    rng = np.random.RandomState(0)
+    dt = 1e-4
+    tau = 10e-3
+    data = rng.normal(size=(3, 2000))
+    data[:, 0] = 0
+
+    # compare against direct evaluation of the recurrence
+    expected = np.zeros(data.shape)
+    for i in range(1, data.shape[1]):
+        expected[:, i] = (1 - dt/tau) * expected[:, i-1] + (dt/tau) * data[:, i-1]
+    assert np.allclose(exp_reconvolve(data, tau, dt=dt), expected, rtol=1e-12, atol=1e-12)
+
+    trace = TSeries(data[0], dt=dt)
+    recon = exp_reconvolve(trace, tau)
+    assert recon.dt == dt
+    assert np.allclose(recon.data, expected[0], rtol=1e-12, atol=1e-12)
+
+    # reconvolution inverts deconvolution
+    deconv = exp_deconvolve(trace, tau)
+    assert len(deconv) == len(trace) - 1
+    assert np.allclose(exp_reconvolve(deconv, tau).data, trace.data[:-1])
+
+    # TSeriesList input is processed as a batch
+    traces = TSeriesList([TSeries(d, dt=dt) for d in data])
+    deconv = exp_deconvolve(traces, tau)
+    assert isinstance(deconv, TSeriesList)
+    assert len(deconv) == 3
+    for tr, d in zip(deconv, exp_deconvolve(data, tau, dt=dt)):
+        assert np.all(tr.data == d)
+
+
+class ChunkLoader(DatasetLoader):
+    """Serves data only in chunks, to make sure streaming detection never loads the full array.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    def get_tseries_data(self, tseries):
+        raise AssertionError("complete data array was requested")
+
+    def get_tseries_data_chunk(self, tseries, start, stop):
+        return self.data[start:stop]
+
+
+def test_iter_events():
+    rng = np.random.RandomState(0)
+    data = np.convolve(rng.normal(size=50000), np.ones(10), mode='same')
+    expected = threshold_events(TSeries(data, dt=1e-4), 5.0)
+    assert len(expected) > 100
+
+    for chunk_size in (999, 10000, 100000):
+        trace = TSeries(dt=1e-4, loader=ChunkLoader(data))
+        events = np.concatenate(list(iter_events(trace, 5.0, chunk_size=chunk_size, overlap=200)))
+        assert events.shape == expected.shape
+        for k in ('index', 'len', 'sum', 'peak', 'peak_index'):
+            assert np.all(events[k] == expected[k])
+        for k in ('time', 'duration', 'area', 'peak_time'):
+            assert np.allclose(events[k], expected[k])
+
+        trace = TSeries(dt=1e-4, loader=ChunkLoader(data))
+        deconv = np.concatenate([c.data for c in iter_exp_deconvolve(trace.iter_chunks(chunk_size), 10e-3)])
+        assert np.all(deconv == exp_deconvolve(TSeries(data, dt=1e-4), 10e-3).data)
+
+    template = np.exp(-np.arange(20) / 5.)
+    with raises(ValueError):
+        iter_events(trace, 3.0, template=np.vstack([template, template * 0.5]))
+
 
 def check_events(a, b):
     # print("Check:")
@@ -0,0 +1,45 @@
+import numpy as np
+import scipy.signal
+from neuroanalysis.data import TSeries
+from neuroanalysis.filter import bessel_filter, butterworth_filter, apply_filter, apply_sos_filter, design_filter, _design_filter
+
+
+def test_filter_design_cache():
+    _design_filter.cache_clear()
+    sos = design_filter('bessel', 4, 0.4)
+    assert np.allclose(sos, scipy.signal.bessel(4, 0.4, output='sos'))
+    for i in range(10):
+        bessel_filter(TSeries(np.zeros(50), dt=2e-5), 10e3, order=4)
+    info = _design_filter.cache_info()
+    assert (info.misses, info.hits) == (2, 9)
+
+    # returned arrays do not share the cached design
+    sos[:] = 0
+    assert np.any(design_filter('bessel', 4, 0.4) != 0)
+    assert design_filter('butter', 2, [0.1, 0.2], btype='bandpass').shape == (2, 6)
+
+
+def test_sos_filter():
+    data = np.random.normal(size=5000).cumsum() - 70
+    ts = TSeries(data, dt=2e-5)
+
+    # matches (b, a) filtering with the same padding away from low cutoffs
+    b, a = scipy.signal.bessel(4, 0.4)
+    assert np.allclose(bessel_filter(ts, 20e3, order=4).data, apply_filter(data, b, a))
+    b, a = scipy.signal.bessel(2, 0.4)
+    assert np.allclose(bessel_filter(ts, 20e3, order=2, bidir=False).data, apply_filter(data, b, a, bidir=False))
+
+    # no edge transients from a zero initial state with low cutoffs
+    flat = TSeries(np.full(1000, -70e-3), dt=2e-5)
+    assert np.allclose(bessel_filter(flat, 50.).data, -70e-3)
+    assert np.allclose(butterworth_filter(flat, 50.).data, -70e-3)
+
+    # batches of traces are filtered in one call
+    batch = np.vstack([data, data[::-1], np.zeros_like(data)])
+    sos = design_filter('butter', 8, 0.05)
+    filtered = apply_sos_filter(batch, sos)
+    for i in range(3):
+        assert np.allclose(filtered[i], apply_sos_filter(batch[i], sos))
+
+    # short data are padded as far as possible
+    assert np.allclose(apply_sos_filter(np.ones(5), sos, padding=100), 1)
@@ -0,0 +1,27 @@
+import concurrent.futures
+import numpy as np
+from neuroanalysis.data import TSeries
+from neuroanalysis.fitting.psp import fit_psp_batch, StackedPsp
+
+
+def test_fit_psp_batch():
+    x = np.arange(1000) * 1e-4
+    noise = np.random.RandomState(0).normal(scale=2e-5, size=len(x))
+    traces = []
+    for amp in (0.5e-3, -0.5e-3):
+        y = StackedPsp.stacked_psp_func(x, 0.03, -65e-3, 2e-3, 20e-3, amp, 2, 0, 1)
+        traces.append(TSeries(y + noise, dt=1e-4))
+
+    kwds = dict(search_window=(0.029, 0.031), clamp_mode='ic', sign=0, exp_baseline=False, refine=False)
+    results = fit_psp_batch(traces, **kwds)
+    assert len(results) == 2
+    assert set(StackedPsp().param_names + ['nrmse', 'n_fits', 'fit_time']) == set(results.dtype.names)
+    assert np.allclose(results['amp'], [0.5e-3, -0.5e-3], rtol=0.05)
+    assert np.allclose(results['decay_tau'], 20e-3, rtol=0.05)
+    assert np.all(results['n_fits'] > 0)
+    assert np.all(results['fit_time'] > 0)
+
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        threaded = fit_psp_batch(traces, executor=pool, **kwds)
+    assert np.all(threaded['amp'] == results['amp'])
+    assert np.all(threaded['nrmse'] == results['nrmse'])
@@ -0,0 +1,158 @@
+from types import SimpleNamespace
+import h5py
+import numpy as np
+from neuroanalysis.data import Dataset, SyncRecording, PatchClampRecording, TSeries
+from neuroanalysis.data.loaders.loaders import patch_clamp_meta_columns
+from neuroanalysis.data.loaders.mies_dataset_loader import MiesNwbLoader
+from neuroanalysis.util.mies_nwb_parsing import igorpro_date
+
+
+def make_nwb(path):
+    with h5py.File(path, 'w') as hdf:
+        acq = hdf.create_group('acquisition/timeseries')
+        stim = hdf.create_group('stimulus/presentation')
+        for sweep in (3, 4):
+            for chan, elec in [(0, 'electrode_1'), (2, 'electrode_0'), (6, None)]:
+                grp = acq.create_group('data_%05d_AD%d' % (sweep, chan))
+                n = 8 if (sweep, chan) == (4, 2) else 10
+                grp.create_dataset('data', data=np.arange(n, dtype='float32') + sweep * 100 + chan)
+                if elec is not None:
+                    grp.create_dataset('electrode_name', data=np.array([elec], dtype=h5py.string_dtype()))
+                    # DA channels are numbered independently of AD channels
+                    grp = stim.create_group('data_%05d_DA%d' % (sweep, 1 - chan // 2))
+                    grp.create_dataset('data', data=np.zeros(10, dtype='float32'))
+                    grp.create_dataset('electrode_name', data=np.array([elec], dtype=h5py.string_dtype()))
+            stim.create_group('data_%05d_TTL1_0' % sweep).create_dataset('data', data=np.zeros(10))
+
+
+def test_group_index(tmp_path):
+    path = str(tmp_path / 'test.nwb')
+    make_nwb(path)
+    loader = MiesNwbLoader(path)
+
+    index = loader.group_index
+    assert sorted(index.keys()) == [3, 4]
+    sweep = index[4]
+    assert sweep['AD'] == {0: 'data_00004_AD0', 2: 'data_00004_AD2', 6: 'data_00004_AD6'}
+    assert sweep['DA'] == {1: 'data_00004_DA1', 0: 'data_00004_DA0'}
+    assert sweep['TTL'] == {'TTL1_0': 'data_00004_TTL1_0'}
+    assert sweep['electrodes'] == {
+        'data_00004_AD0': 'electrode_1', 'data_00004_AD2': 'electrode_0',
+        'data_00004_DA1': 'electrode_1', 'data_00004_DA0': 'electrode_0',
+    }
+    assert loader.group_index is index
+
+    rec = SimpleNamespace(sync_recording=SimpleNamespace(key=3), device_id=0)
+    assert loader.get_da_chan(rec) == 0
+    rec.device_id = 1
+    assert loader.get_da_chan(rec) == 1
+
+
+def make_sweep(loader, sweep_id):
+    sweep = SyncRecording(key=sweep_id, loader=loader, recordings={})
+    for chan, dev in [(0, 1), (2, 0)]:
+        rec = PatchClampRecording(
+            channels={'primary': TSeries(channel_id='primary', dt=1, loader=loader)},
+            device_id=dev, sync_recording=sweep, loader=loader,
+            clamp_mode='ic', sweep_name='data_%05d_AD%d' % (sweep_id, chan),
+        )
+        rec['primary']._recording = rec
+        sweep.recording_dict[dev] = rec
+    return sweep
+
+
+def test_get_sweep_data(tmp_path):
+    path = str(tmp_path / 'test.nwb')
+    make_nwb(path)
+    loader = MiesNwbLoader(path)
+    sweeps = [make_sweep(loader, 3), make_sweep(loader, 4)]
+
+    data = loader.get_sweep_data(sweeps, devices=[0, 1])
+    assert data.shape == (2, 2, 10)
+    assert data.dtype == np.float64
+    assert np.allclose(data[0, 0], (np.arange(10) + 302) * 1e-3)
+    assert np.allclose(data[1, 1], (np.arange(10) + 400) * 1e-3)
+    assert np.allclose(data[1, 0, :8], (np.arange(8) + 402) * 1e-3)
+    assert np.all(np.isnan(data[1, 0, 8:]))
+
+    data32 = loader.get_sweep_data(sweeps, devices=[0, 1], dtype=np.float32)
+    assert data32.dtype == np.float32
+    assert np.allclose(data32, data, equal_nan=True)
+
+    raw, scale, offset = loader.get_sweep_data(sweeps, devices=[0, 1], mmap=True)
+    assert isinstance(raw[0, 0], np.memmap)
+    assert np.all(scale == 1e-3) and np.all(offset == 0)
+    assert np.allclose(raw[1, 0] * scale[1, 0] + offset[1, 0], data[1, 0, :8])
+
+
+def test_memmap_access(tmp_path):
+    path = str(tmp_path / 'test.nwb')
+    make_nwb(path)
+    with h5py.File(path, 'a') as hdf:
+        # interrupted recording (NaN tail) and a compressed integer dataset
+        data = hdf['acquisition/timeseries/data_00003_AD0/data']
+        data[7:] = np.nan
+        grp = hdf['acquisition/timeseries/data_00004_AD0']
+        del grp['data']
+        grp.create_dataset('data', data=np.arange(10, dtype='int16') + 400, compression='gzip')
+
+    loader = MiesNwbLoader(path)
+    sweep = make_sweep(loader, 3)
+    ts = sweep[1]['primary']
+    raw, scale, offset = loader.get_tseries_memmap(ts)
+    assert isinstance(raw, np.memmap)
+    assert (len(raw), scale, offset) == (7, 1e-3, None)
+    assert len(ts) == 7 and ts._data is None
+
+    view = ts[2:5]
+    assert ts._data is None
+    assert np.allclose(view.data, (np.arange(2, 5) + 300) * 1e-3)
+    assert np.allclose(ts.data, (np.arange(7) + 300) * 1e-3)
+    assert not isinstance(ts.data, np.memmap)
+
+    ts = make_sweep(loader, 4)[1]['primary']
+    assert loader.get_tseries_memmap(ts) is None
+    assert np.allclose(ts[3:6].data, (np.arange(3, 6) + 400) * 1e-3)
+    assert np.allclose(loader.get_tseries_data_chunk(ts, 8, 20), [0.408, 0.409])
+
+    loader.use_memmap = False
+    ts = make_sweep(loader, 3)[1]['primary']
+    assert loader.get_tseries_memmap(ts) is None
+    assert np.allclose(ts.data, (np.arange(7) + 300) * 1e-3)
+
+
+def test_patch_clamp_meta_table(tmp_path):
+    from test_mies_nwb_index import make_mies_nwb
+    path = str(tmp_path / 'test.nwb')
+    make_mies_nwb(path, 4)
+    dataset = Dataset(loader=MiesNwbLoader(path))
+
+    table = dataset.meta_table()
+    assert len(table) == 8
+    assert list(table.columns) == patch_clamp_meta_columns
+    assert dataset._data is None  # no recordings were created
+    assert list(table['sweep_id']) == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert list(table['clamp_mode']) == ['vc', 'ic'] * 4
+    assert table['start_time'][2] == igorpro_date(3.7e9 + 1)
+
+    # same values as the (slow) table built from Recording objects
+    cols = [c for c in patch_clamp_meta_columns if c != 'sweep_id']
+    expected = dataset.meta_table(dataset.all_recordings, columns=cols)
+    assert np.all(table['sweep_name'] == expected['sweep_name'])
+    assert np.all(table['clamp_mode'] == expected['clamp_mode'])
+    for col in ['holding_potential', 'holding_current', 'bridge_balance', 'pipette_offset']:
+        assert np.allclose(table[col], expected[col].astype(float), equal_nan=True)
+
+    ic = dataset.meta_table(columns=['sweep_id', 'holding_current'], clamp_mode='ic', sweep_id=lambda s: s > 1)
+    assert list(ic.columns) == ['sweep_id', 'holding_current']
+    assert list(ic['sweep_id']) == [2, 3]
+    assert np.allclose(ic['holding_current'], -50e-12)
+    assert len(dataset.meta_table(device_id=[0, 5])) == 4
+    assert len(dataset.meta_table(dataset.all_recordings, clamp_mode='vc')) == 4
+
+    # files without ADC notebook entries are indexed from the hdf groups instead
+    path = str(tmp_path / 'no_adc.nwb')
+    make_mies_nwb(path, 4, adc_keys=False)
+    loader = MiesNwbLoader(path)
+    assert 'ADC' not in loader.notebook.key_index
+    assert Dataset(loader=loader).meta_table().equals(table)
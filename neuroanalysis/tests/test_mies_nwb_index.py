@@ -0,0 +1,117 @@
+import os
+import concurrent.futures
+import h5py
+import numpy as np
+from neuroanalysis.data.loaders.mies_nwb_index import MiesNwbIndex
+from neuroanalysis.data.loaders.mies_dataset_loader import MiesNwbLoader
+
+
+nb_keys = ['SweepNum', 'TimeStamp', 'TimeStampSinceIgorEpochUTC', 'EntrySourceType', 'Clamp Mode',
+           'V-Clamp Holding Level', 'I-Clamp Holding Level', 'Bridge Bal Enable', 'Bridge Bal Value',
+           'LPF Cutoff', 'Pipette Offset', 'TP Insert Checkbox', 'TP Peak Resistance', 'TP Pulse Duration', 'ADC']
+text_keys = ['SweepNum', 'TimeStamp', 'EntrySourceType', 'Stim Wave Name']
+
+
+def make_mies_nwb(path, n_sweeps, adc_keys=True):
+    """Write a minimal MIES-style NWB file with two headstages per sweep.
+    """
+    str_dt = h5py.string_dtype()
+    nb = np.full((n_sweeps, len(nb_keys), 9), np.nan)
+    text = np.full((n_sweeps, len(text_keys), 9), '', dtype=object)
+    with h5py.File(path, 'w') as hdf:
+        hdf.create_group('general/devices/device_ITC18USB_Dev_0')
+        for sweep in range(n_sweeps):
+            for hs in (0, 1):
+                name = 'data_%05d_AD%d' % (sweep, hs)
+                grp = hdf.create_group('acquisition/timeseries/' + name)
+                grp.attrs['source'] = 'Device=ITC18USB_Dev_0;Sweep=%d;AD=%d;ElectrodeNumber=%d;ElectrodeName=%d' % (sweep, hs, hs, hs)
+                data = grp.create_dataset('data', data=np.zeros(5000 + 1000 * sweep, dtype='float32'))
+                data.attrs['IGORWaveScaling'] = np.array([[0, 0], [0.02, 0]])
+                grp.create_dataset('electrode_name', data=np.array(['electrode_%d' % hs], dtype=str_dt))
+                grp = hdf.create_group('stimulus/presentation/data_%05d_DA%d' % (sweep, hs))
+                grp.create_dataset('data', data=np.zeros(5000 + 1000 * sweep, dtype='float32'))
+                grp.create_dataset('electrode_name', data=np.array(['electrode_%d' % hs], dtype=str_dt))
+
+            # vc on headstage 0 and ic on headstage 1
+            nb[sweep, :4, 0] = [sweep, 3.7e9 + sweep, 3.7e9 + sweep, 0]
+            nb[sweep, 4:12, 0] = [0, -70, np.nan, 0, np.nan, 10000, 1, 0]
+            nb[sweep, 4:12, 1] = [1, np.nan, -50, 1, 15, 10000, 2, 0]
+            nb[sweep, 14, :2] = [0, 1]
+            text[sweep, :3, 0] = [str(sweep), '0', '0']
+            text[sweep, 3, :2] = ['Stim%d' % (sweep % 2), 'Stim%d' % (sweep % 2)]
+
+        n_keys = len(nb_keys) if adc_keys else nb_keys.index('ADC')
+        lab_nb = hdf.create_group('general/labnotebook/ITC18USB_Dev_0')
+        lab_nb.create_dataset('numericalKeys', data=np.array([nb_keys[:n_keys]], dtype=str_dt))
+        lab_nb.create_dataset('numericalValues', data=nb[:, :n_keys])
+        lab_nb.create_dataset('textualKeys', data=np.array([text_keys], dtype=str_dt))
+        lab_nb.create_dataset('textualValues', data=text.astype(str_dt))
+
+
+def test_nwb_index(tmp_path):
+    data_dir = tmp_path / 'data'
+    (data_dir / 'sub').mkdir(parents=True)
+    files = [str(data_dir / 'a.nwb'), str(data_dir / 'sub' / 'b.nwb')]
+    make_mies_nwb(files[0], 2)
+    make_mies_nwb(files[1], 3)
+    with open(str(data_dir / 'broken.nwb'), 'wb') as fh:
+        fh.write(b'not an hdf5 file')
+
+    index = MiesNwbIndex(str(tmp_path / 'index.sqlite'))
+    scanned = index.scan(str(data_dir), processes=1)
+    assert len(scanned) == 3
+    assert [f['n_sweeps'] for f in index.files()] == [4, 0, 6]
+    assert index.files()[1]['error'] is not None
+
+    rows = index.sweeps(path=os.path.abspath(files[1]))
+    assert len(rows) == 6
+    row = rows[3]
+    assert (row['sweep_id'], row['device_id'], row['clamp_mode']) == (1, 1, 'ic')
+    assert np.isclose(row['holding_current'], -50e-12)
+    assert row['bridge_balance'] == 15e6
+    assert row['stim_name'] == 'Stim1'
+    assert np.isclose(row['sample_rate'], 50000)
+    assert np.isclose(row['duration'], 6000 * 2e-5)
+    assert np.isclose(rows[0]['holding_potential'], -70e-3)
+    assert len(index.sweeps(clamp_mode='vc', stim_name='Stim0')) == 3
+
+    # unchanged files are skipped; modified files are rescanned
+    assert index.scan(str(data_dir), processes=1) == []
+    make_mies_nwb(files[0], 3)
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        assert index.scan(str(data_dir), executor=pool) == [os.path.abspath(files[0])]
+    assert len(index.sweeps(path=os.path.abspath(files[0]))) == 6
+
+    # the index persists
+    index.close()
+    index = MiesNwbIndex(str(tmp_path / 'index.sqlite'))
+    assert len(index.sweeps()) == 12
+    os.remove(files[1])
+    assert index.prune() == [os.path.abspath(files[1])]
+    assert len(index.sweeps()) == 6
+
+
+def test_nwb_index_errors(tmp_path, monkeypatch):
+    path = str(tmp_path / 'a.nwb')
+    make_mies_nwb(path, 2)
+
+    def load_test_pulse(self, rec):
+        raise RuntimeError("bad test pulse")
+    get_shape = MiesNwbLoader.get_tseries_shape
+    def get_tseries_shape(self, tseries):
+        if tseries.recording.device_id == 1 and tseries.recording.sync_recording.key == 1:
+            raise RuntimeError("bad data")
+        return get_shape(self, tseries)
+    monkeypatch.setattr(MiesNwbLoader, 'load_test_pulse', load_test_pulse)
+    monkeypatch.setattr(MiesNwbLoader, 'get_tseries_shape', get_tseries_shape)
+
+    # failed recordings and test pulses are recorded per row rather than dropped
+    index = MiesNwbIndex(':memory:')
+    index.scan(path, processes=1)
+    assert index.files()[0]['error'] is None
+    rows = index.sweeps()
+    assert len(rows) == 4
+    assert rows[0]['error'] == 'test_pulse: RuntimeError: bad test pulse'
+    assert (rows[3]['sweep_id'], rows[3]['device_id']) == (1, 1)
+    assert rows[3]['error'] == 'RuntimeError: bad data' and rows[3]['clamp_mode'] is None
+    assert len(index.query("SELECT * FROM sweeps WHERE error IS NOT NULL")) == 4
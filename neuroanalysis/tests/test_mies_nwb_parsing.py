@@ -0,0 +1,106 @@
+import os
+import numpy as np
+from neuroanalysis.util.mies_nwb_parsing import parse_lab_notebook, read_lab_notebook
+
+
+class FakeHdf(dict):
+    """Nested dict that supports h5py-style 'a/b/c' lookups.
+    """
+    filename = None
+
+    def __getitem__(self, key):
+        node = self
+        for part in key.split('/'):
+            node = dict.__getitem__(node, part)
+        return node
+
+
+def make_notebook_hdf(filename=None):
+    nan = np.nan
+    keys = ['SweepNum', 'TimeStamp', 'TimeStampSinceIgorEpochUTC', 'EntrySourceType', 'Clamp Mode', 'Stim Scale Factor', 'Async AD 0 [degC]', 'TP Peak Resistance', 'TP Pulse Duration']
+    nb = np.full((5, len(keys), 9), nan)
+    # sweep 0: two records; the later one overrides Stim Scale Factor on channel 0
+    nb[0, :, 0] = [0, 100, 100, 0, 1, 2, 32, nan, nan]
+    nb[0, 4:6, 1] = [0, 3]
+    nb[1, :, 0] = [0, 101, 101, 0, nan, 5, nan, nan, nan]
+    # test pulse record followed by a record that belongs to it; both are ignored
+    nb[2, :, 0] = [1, 102, 102, 1, 0, 9, nan, 10, nan]
+    nb[3, :, 0] = [1, 103, 103, nan, 0, 9, nan, nan, 10]
+    # sweep 1: global column applies to all channels
+    nb[4, :, 0] = [1, 104, 104, 0, 1, nan, 33, nan, nan]
+    nb[4, 5, 8] = 7
+
+    text_keys = ['SweepNum', 'TimeStamp', 'EntrySourceType', 'Stim Wave Note']
+    text = np.full((2, len(text_keys), 9), '', dtype=object)
+    text[0, :3, 0] = ['0', '100', '0']
+    text[0, 3, 1] = 'note'
+    text[1, :3, 0] = ['1', '104', '1']
+    text[1, 3, 1] = 'tp note'
+
+    hdf = FakeHdf(general=FakeHdf(
+        devices=FakeHdf(device_ITC18USB_Dev_0=None),
+        labnotebook=FakeHdf(ITC18USB_Dev_0=FakeHdf(
+            numericalKeys=np.array([keys], dtype=object), numericalValues=nb,
+            textualKeys=np.array([text_keys], dtype=object), textualValues=text,
+        )),
+    ))
+    hdf.filename = filename
+    return hdf
+
+
+def check_notebook(nb):
+    assert list(nb.keys()) == [0, 1]
+    assert len(nb[0]) == 9
+    assert nb[0][0]['Clamp Mode'] == 1
+    assert nb[0][0]['Stim Scale Factor'] == 5
+    assert nb[0][1]['Stim Scale Factor'] == 3
+    assert nb[0][2]['Stim Scale Factor'] is None
+    assert nb[0][3]['TimeStamp'] == 101
+    assert nb[0][5]['Async AD 0 [degC]'] == 32
+    assert nb[0][1]['Stim Wave Note'] == 'note'
+    assert 'Stim Wave Note' not in nb[0][0]
+    assert [ch['Stim Scale Factor'] for ch in nb[1]] == [7] * 9
+    assert nb[1][0]['TimeStamp'] == 104
+    assert 'Stim Wave Note' not in nb[1][1]
+
+
+def test_parse_lab_notebook(tmp_path):
+    check_notebook(parse_lab_notebook(make_notebook_hdf()))
+
+    # sidecar cache is written once and reused until the file changes
+    nwb_file = str(tmp_path / 'test.nwb')
+    with open(nwb_file, 'wb') as fh:
+        fh.write(b'x')
+    hdf = make_notebook_hdf(nwb_file)
+    check_notebook(parse_lab_notebook(hdf, cache=True))
+    assert os.path.exists(nwb_file + '.notebook.npz')
+    hdf['general/labnotebook/ITC18USB_Dev_0/numericalValues'][4, 4, 0] = 0
+    check_notebook(parse_lab_notebook(hdf, cache=True))
+    assert parse_lab_notebook(hdf, cache=True)[1][0]['Clamp Mode'] == 1
+
+    with open(nwb_file, 'wb') as fh:
+        fh.write(b'xy')
+    assert parse_lab_notebook(hdf, cache=True)[1][0]['Clamp Mode'] == 0
+
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    parse_lab_notebook(make_notebook_hdf(nwb_file), cache=str(cache_dir))
+    assert len(os.listdir(str(cache_dir))) == 1
+    assert parse_lab_notebook(hdf, cache=str(cache_dir))[1][0]['Clamp Mode'] == 1
+
+
+def test_read_lab_notebook():
+    hdf = make_notebook_hdf()
+    nb = read_lab_notebook(hdf)
+    check_notebook(nb)
+    expected = parse_lab_notebook(hdf)
+    assert list(nb.keys()) == list(expected.keys())
+    for sweep_id, channels in expected.items():
+        for entry, expected_entry in zip(nb[sweep_id], channels):
+            assert list(entry.items()) == list(expected_entry.items())
+
+    entry = nb[0][1]
+    assert 'Stim Wave Note' in entry and 'Clamp Mode' in entry and 'Bogus' not in entry
+    assert entry.get('Bogus') is None
+    assert nb.column('Stim Scale Factor').shape == (2, 9)
+    assert np.isnan(nb.column('Stim Scale Factor')[0, 2])
@@ -0,0 +1,77 @@
+import numpy as np
+from neuroanalysis.fitting import Psp, StackedPsp, PspTrain, Exp, Exp2
+
+
+def test_rise_tau():
+    Psp.clear_rise_tau_cache()
+    rng = np.random.RandomState(0)
+    for i in range(200):
+        decay_tau = 10**rng.uniform(-4, 0)
+        rise_power = rng.choice([1, 1.5, 2, 3])
+        rise_tau = decay_tau * 10**rng.uniform(-5, 0.5)
+        rise_time = Psp._psp_max_time(rise_tau, decay_tau, rise_power)
+        assert np.isclose(Psp._compute_rise_tau(rise_time, rise_power, decay_tau), rise_tau, rtol=1e-12, atol=0)
+
+    info = Psp.rise_tau_cache_info()
+    assert info.misses == 200
+    assert info.hits == 0
+    Psp._compute_rise_tau(rise_time, rise_power, decay_tau)
+    assert Psp.rise_tau_cache_info().hits == 1
+
+    # peak of the psp lands at rise_time with value amp
+    x = np.linspace(0, 0.1, 100001)
+    y = Psp.psp_func(x, xoffset=0.01, yoffset=0, rise_time=2e-3, decay_tau=10e-3, amp=1, rise_power=2)
+    assert abs(x[np.argmax(y)] - 0.012) < 2e-6
+    assert np.isclose(y.max(), 1)
+
+
+def check_jacobian(model, x, **params):
+    args = model.make_funcargs(model.make_params(**params), {'x': x})
+    jac = model.jac_func(**args)
+    for name, val in params.items():
+        h = 1e-6 * abs(val)
+        a1 = dict(args, **{name: val + h})
+        a0 = dict(args, **{name: val - h})
+        fd = (model.func(**a1) - model.func(**a0)) / (2 * h)
+        assert np.allclose(jac[name], fd, rtol=0, atol=1e-6 * np.abs(fd).max()), name
+
+
+def test_jacobians():
+    # xoffsets are placed between samples to avoid finite differences across the onset
+    x = np.arange(2000) * 5e-5
+    psp = dict(xoffset=0.010013, yoffset=-0.065, rise_time=2e-3, decay_tau=15e-3, amp=1e-3, rise_power=2)
+    check_jacobian(Psp(), x, **psp)
+    check_jacobian(Psp(), x, **dict(psp, rise_power=1.5))
+    check_jacobian(StackedPsp(), x, exp_amp=2e-3, exp_tau=30e-3, **psp)
+    check_jacobian(PspTrain(2), x, xoffset=0.010013, yoffset=-0.065, rise_time=2e-3, decay_tau=15e-3, rise_power=2,
+                   xoffset0=0.001, amp0=1e-3, xoffset1=0.02, amp1=-5e-4, decay_tau_factor1=1.5)
+    check_jacobian(Exp(), x, xoffset=0.010013, yoffset=1, amp=2, tau=0.02)
+    check_jacobian(Exp2(), x, xoffset=0.010013, yoffset=1, amp=2, tau1=0.02, tau2=0.005)
+
+    # analytic jacobian is used by default with leastsq, including through constrained parameters
+    y = StackedPsp.stacked_psp_func(x, 0.01, -0.065, 2e-3, 15e-3, 1e-3, 2, 2e-3, 15e-3)
+    params = dict(xoffset=(0.0105, 0.005, 0.015), yoffset=(-0.06, -0.1, 0.1), rise_time=(3e-3, 3e-4, 3e-2),
+                  decay_tau=(10e-3, 1e-3, 0.1), amp=(5e-4, 0, 0.01), rise_power=(2, 'fixed'),
+                  exp_amp=(0, -0.1, 0.1), exp_tau='decay_tau')
+    fit = StackedPsp().fit(y, x=x, params=params)
+    assert fit.jacfcn is not None
+    assert fit.nrmse() < 1e-6
+    assert np.isclose(fit.best_values['decay_tau'], 15e-3)
+
+
+def test_psp_train():
+    x = np.arange(5000) * 1e-4
+    params = dict(xoffset=10e-3, yoffset=-65e-3, rise_time=2e-3, decay_tau=15e-3, rise_power=2)
+    kwds = dict(xoffset0=0, amp0=1e-3, xoffset1=0.1, amp1=-2e-3, xoffset2=0.10005, amp2=5e-4, decay_tau_factor2=3., xoffset3=1.0, amp3=1e-3)
+    expected = params['yoffset']
+    for i in range(4):
+        expected = expected + Psp.psp_func(x, params['xoffset'] + kwds['xoffset%d'%i], 0, params['rise_time'],
+                                           params['decay_tau'] * kwds.get('decay_tau_factor%d'%i, 1), kwds['amp%d'%i], params['rise_power'])
+
+    y = PspTrain.psp_train_func(4, x, **dict(params, **kwds))
+    assert np.allclose(y, expected, rtol=0, atol=1e-15)
+
+    # unsorted x
+    order = np.random.RandomState(0).permutation(len(x))
+    y = PspTrain.psp_train_func(4, x[order], **dict(params, **kwds))
+    assert np.allclose(y, expected[order], rtol=0, atol=1e-15)
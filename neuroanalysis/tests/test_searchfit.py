@@ -0,0 +1,57 @@
+import pickle
+import concurrent.futures
+import numpy as np
+from neuroanalysis.fitting import SearchFit, Gaussian, StackedPsp, PspTrain
+
+
+def make_search(**kwds):
+    rng = np.random.RandomState(0)
+    y = rng.normal(size=1000)
+    y[220:250] += 10
+    amp = [{'amp': -1}, {'amp': 1}]
+    xoffset = [{'xoffset': (x, x-50, x+50)} for x in [50, 150, 250, 350, 450]]
+    return SearchFit(Gaussian(), [amp, xoffset], params={'sigma': (50, 1, 500), 'yoffset': 0}, x=np.arange(1000), data=y, **kwds)
+
+
+def test_search_executors():
+    serial = make_search()
+    best = serial.best_result
+    assert len(serial.results) == len(serial)
+
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        threaded = make_search(executor=pool)
+        assert threaded.best_result.best_values == best.best_values
+
+    with concurrent.futures.ProcessPoolExecutor(2) as pool:
+        procs = make_search(executor=pool)
+        assert procs.best_result.best_values == best.best_values
+        assert procs.best_result.nrmse() == best.nrmse()
+        assert [r['nrmse'] for r in procs.results] == [r['nrmse'] for r in serial.results]
+
+
+def test_search_target_nrmse():
+    serial = make_search()
+    nrmse = [r['nrmse'] for r in serial.iter_fit()]
+    target = min(nrmse) * 1.0001
+    first = int(np.argmax(np.array(nrmse) <= target))
+
+    for executor in (None, concurrent.futures.ThreadPoolExecutor(2)):
+        search = make_search(executor=executor, target_nrmse=target)
+        assert search.best_result.nrmse() <= target
+        assert len(search.results) == first + 1
+        if executor is not None:
+            executor.shutdown()
+
+
+def test_pickle_models():
+    x = np.arange(1000) * 1e-4
+    args = dict(xoffset=0.01, yoffset=0, rise_time=1e-3, decay_tau=5e-3, amp=1e-3, rise_power=2, exp_amp=0, exp_tau=1)
+    y = StackedPsp.stacked_psp_func(x, **args)
+    fit = StackedPsp().fit(y, x=x, params={k:(v, 'fixed') for k,v in args.items()})
+    fit2 = pickle.loads(pickle.dumps(fit))
+    assert fit2.nrmse() == fit.nrmse()
+    assert isinstance(fit2.model, StackedPsp)
+
+    train = pickle.loads(pickle.dumps(PspTrain(3)))
+    assert train.n_psp == 3
+    assert 'amp2' in train.param_names
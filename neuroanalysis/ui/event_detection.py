@@ -113,7 +113,7 @@ class EventDetector(QtCore.QObject):
         # filter
         filt = self.filter.process(bsub)        
         
-        self.events = threshold_events(filt.data, self.threshold_line.value())
+        self.events = threshold_events(filt, self.threshold_line.value())
         #self.events = self.events[self.events['sum'] > 0]
 
         if show:
@@ -41,17 +41,15 @@ class SweepView(QtGui.QWidget):
         if len(sweeps) == 0 or len(chans) == 0:
             return
         
-        # collect data
-        data = MiesNwb.pack_sweep_data(sweeps)  # returns (sweeps, channels, samples, 2)
+        # collect data for selected channels only
+        chans = [ch for ch in sweeps[0].devices if ch in chans]
+        if len(chans) == 0:
+            return
+        data = MiesNwb.pack_sweep_data(sweeps, devices=chans)  # returns (sweeps, channels, samples, 2)
         data, stim = data[...,0], data[...,1]  # unpack stim and recordings
         dt = sweeps[0].recordings[0]['primary'].dt
         t = np.arange(data.shape[2]) * dt
 
-        # mask for selected channels
-        mask = np.array([ch in chans for ch in sweeps[0].devices])
-        data = data[:, mask]
-        chans = np.array(sweeps[0].devices)[mask]
-
         # setup plot grid
         self.plots.set_shape(len(chans) * 2, 1)
         self.plots.setClipToView(True)
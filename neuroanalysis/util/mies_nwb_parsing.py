@@ -1,14 +1,22 @@
+import os, hashlib
 from collections import OrderedDict
+from collections.abc import Mapping
 import numpy as np
 from datetime import datetime
 
 
-def parse_lab_notebook(hdf):
+def parse_lab_notebook(hdf, cache=None):
     """Return compiled data from the lab notebook in the given hdf.
 
         Parameters:
         -----------
         hdf : HDF5 file (needs to have a labnotebook field)
+        cache : bool | str | None
+            If True, the parsed notebook is stored in a sidecar file next to the
+            HDF5 file (``<file>.notebook.npz``) and reused the next time the same
+            file is parsed. If a string, cache files are stored in that directory
+            instead. Cache files are keyed on the file path, modification time,
+            and size, so they are ignored once the HDF5 file changes.
 
         Returns:
         --------
@@ -19,137 +27,395 @@ def parse_lab_notebook(hdf):
 
             notebook[sweep_id][channel_id][metadata_key]
 
+        See also read_lab_notebook(), which returns the same data in a much more compact form.
         """
+    return notebook_dicts(_load_notebook_arrays(hdf, cache))
 
-    # collect all lab notebook entries
-    sweep_entries = OrderedDict()
-    tp_entries = []
+
+def read_lab_notebook(hdf, cache=None):
+    """Return the lab notebook in the given hdf as a LabNotebook.
+
+    This is indexed the same way as the dict returned by parse_lab_notebook
+    (``notebook[sweep_id][channel_id][metadata_key]``), but stores all values in a
+    single array rather than one dict per channel. See parse_lab_notebook for
+    the *cache* argument.
+    """
+    return LabNotebook(_load_notebook_arrays(hdf, cache))
+
+
+def _load_notebook_arrays(hdf, cache):
+    nb = None
+    if cache:
+        cache_file, file_key = _notebook_cache_file(hdf.filename, cache)
+        nb = _read_notebook_cache(cache_file, file_key)
+    if nb is None:
+        nb = parse_lab_notebook_arrays(hdf)
+        if cache:
+            _write_notebook_cache(cache_file, file_key, nb)
+    return nb
+
+
+class LabNotebook(Mapping):
+    """Read-only mapping of ``{sweep_id: [NotebookEntry, ...]}`` backed by the arrays
+    returned from parse_lab_notebook_arrays.
+
+    Numerical values are kept in a single (sweep, key, channel) array; use column()
+    to get all values of one key at once.
+    """
+    n_channels = 9
+
+    def __init__(self, arrays):
+        self.sweep_ids = arrays['sweep_ids']
+        self.fields = list(arrays['keys'])  # numerical keys
+        self.data = arrays['values']  # (sweep, key, channel)
+        self.key_index = {k:i for i,k in enumerate(self.fields)}
+        self.sweep_index = {sweep_id:i for i,sweep_id in enumerate(self.sweep_ids.tolist())}
+
+        # textual entries are sparse; group them per (sweep, channel) in insertion order
+        text_keys = arrays['text_keys']
+        text_index, text_values = arrays['text']
+        self._text = {}
+        for (sweep, chan, key), val in zip(np.asarray(text_index).tolist(), text_values):
+            self._text.setdefault((sweep, chan), OrderedDict())[text_keys[key]] = val
+
+    def __getitem__(self, sweep_id):
+        i = self.sweep_index[sweep_id]
+        return [NotebookEntry(self, i, chan) for chan in range(self.n_channels)]
+
+    def __iter__(self):
+        return iter(self.sweep_index)
+
+    def __len__(self):
+        return len(self.sweep_index)
+
+    def column(self, key):
+        """Return a (sweep, channel) float array of all values for a numerical key (NaN where missing).
+        """
+        return self.data[:, self.key_index[key], :]
+
+
+class NotebookEntry(Mapping):
+    """Lab notebook metadata for one channel of one sweep; a view into a LabNotebook.
+
+    Behaves like the dict returned by parse_lab_notebook(hdf)[sweep_id][channel];
+    numerical values that were not recorded are None.
+    """
+    __slots__ = ['_notebook', '_sweep', '_chan']
+
+    def __init__(self, notebook, sweep_index, channel):
+        self._notebook = notebook
+        self._sweep = sweep_index
+        self._chan = channel
+
+    def __getitem__(self, key):
+        nb = self._notebook
+        i = nb.key_index.get(key)
+        if i is None:
+            return nb._text.get((self._sweep, self._chan), {})[key]
+        val = float(nb.data[self._sweep, i, self._chan])
+        return None if np.isnan(val) else val
+
+    def __contains__(self, key):
+        return key in self._notebook.key_index or key in self._notebook._text.get((self._sweep, self._chan), ())
+
+    def __iter__(self):
+        yield from self._notebook.fields
+        yield from self._notebook._text.get((self._sweep, self._chan), ())
+
+    def __len__(self):
+        return len(self._notebook.fields) + len(self._notebook._text.get((self._sweep, self._chan), ()))
+
+    def __repr__(self):
+        return "<NotebookEntry sweep=%d channel=%d>" % (self._notebook.sweep_ids[self._sweep], self._chan)
+
+
+def parse_lab_notebook_arrays(hdf):
+    """Return the lab notebook in the given hdf in compact array form.
+
+    Returns a dict with:
+
+    * ``sweep_ids`` : array of sweep numbers, in the order they first appear in the notebook
+    * ``keys`` : list of numerical notebook keys
+    * ``values`` : float array (sweep, key, channel) of numerical values; NaN where no value was recorded
+    * ``text_keys`` : list of textual notebook keys
+    * ``text`` : (sweep index, channel, text key index) int array and list of values for each textual
+      entry, in the order they are added to the channel metadata
+
+    Use notebook_dicts() to convert this to the structure returned by parse_lab_notebook.
+    """
     device = list(hdf['general/devices'].keys())[0].split('_',1)[-1]
-    nb_keys = hdf['general']['labnotebook'][device]['numericalKeys'][0]
-    nb_fields = OrderedDict([(k, i) for i,k in enumerate(nb_keys)])
+    lab_nb = hdf['general']['labnotebook'][device]
+    nb_keys = list(_read_strings(lab_nb['numericalKeys'])[0])
 
     # convert notebook to array here, otherwise we incur the decompression cost for the entire
     # dataset every time we try to access part of it. 
-    nb = np.array(hdf['general']['labnotebook'][device]['numericalValues'])
+    nb = np.array(lab_nb['numericalValues'])
+    sweep_ids, values = _parse_numerical_notebook(nb, nb_keys)
+
+    # Load textual keys in a similar way 
+    text_nb_keys = list(_read_strings(lab_nb['textualKeys'])[0])
+    text_nb = np.asarray(_read_strings(lab_nb['textualValues']), dtype=object)
+    text = _parse_textual_notebook(text_nb, text_nb_keys, sweep_ids, set(nb_keys))
+
+    return {'sweep_ids': sweep_ids, 'keys': nb_keys, 'values': values, 'text_keys': text_nb_keys, 'text': text}
+
+
+def _read_strings(dset):
+    """Read a string dataset as str (h5py >= 3 returns bytes unless asked otherwise).
+    """
+    if hasattr(dset, 'asstr'):
+        return dset.asstr()[()]
+    return np.asarray(dset)
+
+
+def notebook_dicts(nb):
+    """Convert a notebook from parse_lab_notebook_arrays into ``{sweep_id: [channel metadata dict, ...]}``.
+    """
+    keys = nb['keys']
+    text_keys = nb['text_keys']
+    text_index, text_values = nb['text']
+
+    # NaN becomes None
+    values = nb['values'].transpose(0, 2, 1).astype(object)
+    values[np.isnan(nb['values'].transpose(0, 2, 1))] = None
+    values = values.tolist()
+
+    sweep_entries = OrderedDict()
+    for sweep_values, sweep_id in zip(values, nb['sweep_ids'].tolist()):
+        sweep_entries[sweep_id] = [OrderedDict(zip(keys, chan_values)) for chan_values in sweep_values]
+
+    sweeps = list(sweep_entries.values())
+    for (sweep, chan, key), val in zip(text_index.tolist(), text_values):
+        sweeps[sweep][chan][text_keys[key]] = val
+
+    return sweep_entries
+
+
+def _parse_numerical_notebook(nb, nb_keys):
+    nb_fields = OrderedDict([(k, i) for i,k in enumerate(nb_keys)])
+    n_rows = nb.shape[0]
+    sweep_nums = nb[:, 0, 0]
 
     # EntrySourceType field is needed to distinguish between records created by TP vs sweep
+    # (note: entrySourceType is nan if an older pxp is re-exported to nwb using newer MIES)
     entry_source_type_index = nb_fields.get('EntrySourceType', None)
-    
-    nb_iter = iter(range(nb.shape[0]))  # so we can skip multiple rows from within the loop
-    for i in nb_iter:
-        rec = nb[i]
-        sweep_num = rec[0,0]
-
-        is_tp_record = False
-        is_sweep_record = False
-
-        # ignore records that were generated by test pulse
-        # (note: entrySourceType is nan if an older pxp is re-exported to nwb using newer MIES)
-        if entry_source_type_index is not None and not np.isnan(rec[entry_source_type_index][0]):
-            if rec[entry_source_type_index][0] == 0:
-                is_sweep_record = True
-            else:
-                is_tp_record = True
-        elif i < nb.shape[0] - 1:
-            # Older files may be missing EntrySourceType. In this case, we can identify TP blocks
-            # as two records containing a "TP Peak Resistance" value in the first record followed
-            # by a "TP Pulse Duration" value in the second record.
-            tp_peak = rec[nb_fields['TP Peak Resistance']]
-            if any(np.isfinite(tp_peak)):
-                tp_dur = nb[i+1][nb_fields['TP Pulse Duration']]
-                if any(np.isfinite(tp_dur)):
-                    next(nb_iter)
-                    is_tp_record = True
-            if not is_tp_record:
-                is_sweep_record = np.isfinite(sweep_num)
-
-        if is_tp_record:
-            rec = np.array(rec)
-            next(nb_iter)
-            rec2 = np.array(nb[i+1])
-            mask = ~np.isnan(rec2)
-            rec[mask] = rec2[mask]
-            tp_entries.append(rec)
-
-        elif is_sweep_record:
-            sweep_num = int(sweep_num)
-            # each sweep gets multiple nb records; for each field we use the last non-nan value in any record
-            if sweep_num not in sweep_entries:
-                sweep_entries[sweep_num] = np.array(rec)
-            else:
-                mask = ~np.isnan(rec)
-                sweep_entries[sweep_num][mask] = rec[mask]
-
-    for swid, entry in sweep_entries.items():
-        # last column is "global"; applies to all channels
-        mask = ~np.isnan(entry[:,8])
-        entry[mask] = entry[:,8:9][mask]
-
-        # first 4 fields of first column apply to all channels
-        entry[:4] = entry[:4, 0:1]
-
-        # async AD fields (notably used to record temperature) appear
-        # only in column 0, but might move to column 8 later? Since these
-        # are not channel-specific, we'll copy them to all channels
-        for i,k in enumerate(nb_keys):
-            if not k.startswith('Async AD '):
-                continue
-            entry[i] = entry[i, 0]
+    if entry_source_type_index is None:
+        source_type = np.full(n_rows, np.nan)
+    else:
+        source_type = nb[:, entry_source_type_index, 0]
+    has_source_type = ~np.isnan(source_type)
 
-        # convert to list-o-dicts
-        meta = []
-        for i in range(entry.shape[1]):
-            tm = entry[:, i]
-            meta.append(OrderedDict([(nb_keys[j], (None if np.isnan(tm[j]) else tm[j])) for j in range(len(nb_keys))]))
-        sweep_entries[swid] = meta
+    # Older files may be missing EntrySourceType. In this case, we can identify TP blocks
+    # as two records containing a "TP Peak Resistance" value in the first record followed
+    # by a "TP Pulse Duration" value in the second record.
+    old_tp = np.zeros(n_rows, dtype=bool)
+    if n_rows > 1 and not np.all(has_source_type[:-1]):
+        tp_peak = np.isfinite(nb[:-1, nb_fields['TP Peak Resistance']]).any(axis=1)
+        tp_dur = np.isfinite(nb[1:, nb_fields['TP Pulse Duration']]).any(axis=1)
+        old_tp[:-1] = ~has_source_type[:-1] & tp_peak & tp_dur
 
-    # Load textual keys in a similar way 
-    text_nb_keys = hdf['general']['labnotebook'][device]['textualKeys'][0]
+    # TP records absorb the record that follows them (old-style TP blocks skip one more),
+    # so those records are never considered on their own
+    skip = np.where(has_source_type & (source_type != 0), 1, 0)
+    skip[old_tp] = 2
+    visited = np.ones(n_rows, dtype=bool)
+    for i in np.flatnonzero(skip).tolist():
+        if visited[i]:
+            visited[i+1:i+1+skip[i]] = False
+
+    # without EntrySourceType, the last record is never treated as a sweep record
+    is_sweep_record = np.where(has_source_type, source_type == 0, ~old_tp & (np.arange(n_rows) < n_rows - 1))
+    rows = np.flatnonzero(visited & is_sweep_record & np.isfinite(sweep_nums))
+
+    # each sweep gets multiple nb records; for each field we use the last non-nan value in any record
+    sweep_ids, values, _ = _group_fill(nb[rows], sweep_nums[rows].astype(int), last=True)
+
+    # last column is "global"; applies to all channels
+    values = np.where(np.isnan(values[:, :, 8:9]), values, values[:, :, 8:9])
+
+    # first 4 fields of first column apply to all channels
+    values[:, :4] = values[:, :4, 0:1]
+
+    # async AD fields (notably used to record temperature) appear
+    # only in column 0, but might move to column 8 later? Since these
+    # are not channel-specific, we'll copy them to all channels
+    async_ad = [i for i,k in enumerate(nb_keys) if k.startswith('Async AD ')]
+    values[:, async_ad] = values[:, async_ad, 0:1]
+
+    return sweep_ids, values
+
+
+def _parse_textual_notebook(text_nb, text_nb_keys, sweep_ids, numerical_keys):
     text_nb_fields = OrderedDict([(k, i) for i,k in enumerate(text_nb_keys)])
-    text_nb = np.array(hdf['general']['labnotebook'][device]['textualValues'])
     entry_source_type_index = text_nb_fields.get('EntrySourceType', None)
 
-    for rec in text_nb:
-        if entry_source_type_index is None:
-            # older nwb files lack EntrySourceType; fake it for now
-            source_type = 0
-        else:
+    rows = []
+    row_sweeps = []
+    for i,rec in enumerate(text_nb):
+        if entry_source_type_index is not None:
             try:
                 source_type = int(rec[entry_source_type_index, 0])
             except ValueError:
                 # No entry source type recorded here; skip for now.
                 continue
-
-        if source_type != 0:
-            # Select only sweep records for now.
-            continue
+            if source_type != 0:
+                # Select only sweep records for now.
+                continue
+        # (older nwb files lack EntrySourceType; treat them as sweep records for now)
 
         try:
             sweep_id = int(rec[0,0])
         except ValueError:
             # Not sure how to handle records with no sweep ID; skip for now.
             continue
-        sweep_entry = sweep_entries[sweep_id]
-
-        for k,i in text_nb_fields.items():                    
-            for j, val in enumerate(rec[i, :-1]):
-                if k in sweep_entry[j]:
-                    # already have a value here; don't overwrite.
-                    continue
-
-                if val == '':
-                    # take value from last column if this one is empty
-                    val == rec[i, -1]
-                if val == '':
-                    # no value here; skip.
-                    continue
-                
-                sweep_entry[j][k] = val
+        rows.append(i)
+        row_sweeps.append(sweep_id)
+
+    # text values never overwrite numerical values (or earlier text values) for the same key,
+    # and only the first 8 columns are used
+    fields = [i for k,i in text_nb_fields.items() if k not in numerical_keys]
+    records = text_nb[np.array(rows, dtype=int)][:, fields, :-1]
+    text_sweeps, values, source = _group_fill(records, np.array(row_sweeps, dtype=int), last=False)
+
+    sweep_index = {sweep_id:i for i,sweep_id in enumerate(sweep_ids.tolist())}
+    text_sweep_index = np.array([sweep_index[sweep_id] for sweep_id in text_sweeps.tolist()], dtype=int)
+
+    # entries are added to each channel in the order of the record they came from, then by key
+    sweep, field, chan = np.nonzero(source >= 0)
+    order = np.lexsort((field, source[sweep, field, chan], chan, text_sweep_index[sweep]))
+    sweep, field, chan = sweep[order], field[order], chan[order]
+    index = np.column_stack([text_sweep_index[sweep], chan, np.array(fields, dtype=int)[field]])
+    return index, values[sweep, field, chan].tolist()
+
+
+def _group_fill(records, group_ids, last=True):
+    """Merge records (along axis 0) that share a group id.
+
+    Each element of a merged record is taken from the last (or first) record in its group
+    that has a value there (not NaN for float records, not '' otherwise).
+
+    Returns the unique group ids in order of first appearance, the merged records, and the
+    index into *records* that each merged element was taken from (-1 if no record has a value).
+    """
+    uniq, first_index, inverse = np.unique(group_ids, return_index=True, return_inverse=True)
+    order = np.argsort(first_index)
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
+    groups = rank[inverse]
+
+    # stable sort keeps the records of each group in their original order
+    perm = np.argsort(groups, kind='stable')
+    starts = np.searchsorted(groups[perm], np.arange(len(uniq)))
+    n = len(records)
+    if records.dtype.kind == 'f':
+        valid = ~np.isnan(records[perm])
+    else:
+        valid = records[perm] != ''
+    positions = np.arange(n).reshape((-1,) + (1,) * (records.ndim - 1))
+
+    if n == 0:
+        source = np.empty((0,) + records.shape[1:], dtype=int)
+    elif last:
+        source = np.maximum.reduceat(np.where(valid, positions, -1), starts, axis=0)
+    else:
+        source = np.minimum.reduceat(np.where(valid, positions, n), starts, axis=0)
+        source[source == n] = -1
+
+    missing = source < 0
+    source = np.where(missing, -1, perm[np.clip(source, 0, None)])
+    merged = records[(np.clip(source, 0, None),) + np.ix_(*[np.arange(k) for k in records.shape[1:]])]
+    if records.dtype.kind == 'f':
+        merged[missing] = np.nan
+    return uniq[order], merged, source
+
+
+_notebook_cache_version = 1
+
+
+def _notebook_cache_file(file_name, cache):
+    """Return the cache file path and the (path, mtime, size) key for an HDF5 file.
+    """
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    file_key = (path, stat.st_mtime_ns, stat.st_size)
+    if cache is True:
+        cache_file = path + '.notebook.npz'
+    else:
+        cache_file = os.path.join(cache, hashlib.sha1(path.encode('utf8')).hexdigest() + '.notebook.npz')
+    return cache_file, file_key
+
+
+def _read_notebook_cache(cache_file, file_key):
+    """Return the cached notebook arrays if *cache_file* exists and matches *file_key*, otherwise None.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as data:
+            key = (str(data['path']), int(data['mtime']), int(data['size']))
+            if int(data['version']) != _notebook_cache_version or key != file_key:
+                return None
+            return {
+                'sweep_ids': data['sweep_ids'],
+                'keys': _unpack_strings(data, 'keys'),
+                'values': data['values'],
+                'text_keys': _unpack_strings(data, 'text_keys'),
+                'text': (data['text_index'], _unpack_strings(data, 'text_values')),
+            }
+    except (OSError, KeyError, ValueError):
+        # unreadable or incomplete cache; just parse again
+        return None
+
+
+def _write_notebook_cache(cache_file, file_key, nb):
+    arrays = {
+        'version': _notebook_cache_version,
+        'path': file_key[0],
+        'mtime': file_key[1],
+        'size': file_key[2],
+        'sweep_ids': nb['sweep_ids'],
+        'values': nb['values'],
+        'text_index': nb['text'][0],
+    }
+    arrays.update(_pack_strings('keys', nb['keys']))
+    arrays.update(_pack_strings('text_keys', nb['text_keys']))
+    arrays.update(_pack_strings('text_values', nb['text'][1]))
+
+    # write to a temporary file first so that readers never see a partial cache
+    tmp_file = cache_file + '.%d.tmp' % os.getpid()
+    try:
+        with open(tmp_file, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # cache location is not writable; carry on without caching
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _pack_strings(name, strings):
+    """Pack a list of str / bytes into one utf8 buffer plus offsets, so they can be stored
+    without pickling.
+    """
+    is_bytes = np.array([isinstance(s, bytes) for s in strings], dtype=bool)
+    encoded = [s if isinstance(s, bytes) else s.encode('utf8') for s in strings]
+    offsets = np.cumsum([0] + [len(s) for s in encoded])
+    return {
+        name + '_buffer': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        name + '_offsets': offsets,
+        name + '_is_bytes': is_bytes,
+    }
+
+
+def _unpack_strings(data, name):
+    buf = data[name + '_buffer'].tobytes()
+    offsets = data[name + '_offsets'].tolist()
+    strings = []
+    for i,is_bytes in enumerate(data[name + '_is_bytes'].tolist()):
+        s = buf[offsets[i]:offsets[i+1]]
+        strings.append(s if is_bytes else s.decode('utf8'))
+    return strings
 
-    return sweep_entries
-    #self._tp_notebook = tp_entries
-    #self._notebook_keys = nb_fields
-    #self._tp_entries = None
 
 def igorpro_date(timestamp):
     """Convert an IgorPro timestamp (seconds since 1904-01-01) to a datetime
@@ -163,8 +429,9 @@ def parse_stim_wave_note(rec_notebook):
 
     Paramenters:
     ------------
-    rec_notebook : dict
+    rec_notebook : dict | NotebookEntry
         A labnotebook dict for a recording, as returned by parse_lab_notebook(hdf)[sweep_id][channel]
+        or read_lab_notebook(hdf)[sweep_id][channel]
 
     Returns:
     --------